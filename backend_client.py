@@ -0,0 +1,98 @@
+# backend_client.py
+#
+# Thin client of backend_service.py for the Streamlit app and the CLI. One
+# client keeps a pool of keep-alive connections and is safe to share between
+# threads (i.e. between Streamlit sessions).
+
+import json
+import os
+from typing import Iterator
+
+import httpx
+
+BACKEND_URL = os.environ.get("BACKEND_URL", "http://127.0.0.1:" + os.environ.get("BACKEND_PORT", "8765"))
+BACKEND_SOCKET = os.environ.get("BACKEND_SOCKET")  # Connect over this Unix socket instead of TCP
+MAX_CONNECTIONS = 16
+CONNECT_TIMEOUT_SECONDS = 5
+READ_TIMEOUT_SECONDS = 600  # selecting a book may download and ingest it first
+
+class BackendError(RuntimeError):
+    pass
+
+class BackendClient:
+    def __init__(self, base_url: str = BACKEND_URL, socket_path: str | None = BACKEND_SOCKET):
+        transport = httpx.HTTPTransport(uds=socket_path) if socket_path else None
+        self.client = httpx.Client(
+            base_url=base_url if not socket_path else "http://backend",
+            transport=transport,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+            timeout=httpx.Timeout(READ_TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS),
+        )
+
+    def _post(self, path: str, payload: dict) -> dict:
+        try:
+            response = self.client.post(path, json=payload)
+        except httpx.HTTPError as e:
+            raise BackendError(f"Book assistant backend unreachable: {e}") from e
+        if response.status_code != 200:
+            raise BackendError(f"Backend error {response.status_code}: {response.text}")
+        return response.json()
+
+    def is_available(self) -> bool:
+        try:
+            return self.client.get("/health", timeout=CONNECT_TIMEOUT_SECONDS).status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    def search_books(self, title: str) -> list[dict]:
+        return self._post("/search", {"title": title})["books"]
+
+    def select_book(self, book_info: dict) -> str | None:
+        """Downloads and ingests the book if needed; returns its title, or None on failure."""
+        return self._post("/select", {"book": book_info})["title"]
+
+    def stats(self) -> dict:
+        return self.client.get("/stats").json()
+
+    def ask_stream(self, user_input: str, current_title: str | None) -> tuple[Iterator[str], str | None]:
+        """
+        Same contract as orchestrate_request_stream: returns (iterator over
+        response text pieces, new remembered title). Pieces arrive as the
+        backend's LLM produces them.
+        """
+        try:
+            request = self.client.build_request("POST", "/ask", json={"input": user_input, "title": current_title})
+            response = self.client.send(request, stream=True)
+        except httpx.HTTPError as e:
+            raise BackendError(f"Book assistant backend unreachable: {e}") from e
+        if response.status_code != 200:
+            response.read()
+            response.close()
+            raise BackendError(f"Backend error {response.status_code}: {response.text}")
+
+        lines = (json.loads(line) for line in response.iter_lines() if line)
+        try:
+            first = next(lines, {"error": "empty response"})
+        except httpx.HTTPError as e:
+            response.close()
+            raise BackendError(f"Connection to the backend lost: {e}") from e
+        if "error" in first:
+            response.close()
+            raise BackendError(first["error"])
+
+        def pieces():
+            try:
+                for message in lines:
+                    if "error" in message:
+                        raise BackendError(message["error"])
+                    if "text" in message:
+                        yield message["text"]
+            except httpx.HTTPError as e:
+                raise BackendError(f"Connection to the backend lost: {e}") from e
+            finally:
+                response.close()  # Returns the connection to the pool
+
+        return pieces(), first["title"]
+
+    def close(self):
+        self.client.close()
@@ -0,0 +1,112 @@
+# backend_service.py
+#
+# Long-lived backend for the Streamlit app and the CLI. It loads the LLM, the
+# embedding model and the vector store once and serves every UI process over
+# local HTTP (or a Unix socket), so adding Streamlit workers doesn't add model
+# copies and a slow answer never blocks a rerun. Answers are streamed as
+# newline-delimited JSON: {"title": ...} first, then {"text": ...} pieces, then
+# {"done": true} (or {"error": ...}).
+#
+#   python backend_service.py                      # http://127.0.0.1:8765
+#   python backend_service.py --socket /tmp/books.sock
+
+import argparse
+import json
+import os
+import traceback
+from contextlib import asynccontextmanager
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from mcp_agents.vector_store import DATA_DIR
+from mcp_hub import hub, prewarm_models
+from orchestrator.orchestrator_agent import ensure_book_available_and_ingested, orchestrate_request_stream
+
+BACKEND_HOST = os.environ.get("BACKEND_HOST", "127.0.0.1")
+BACKEND_PORT = int(os.environ.get("BACKEND_PORT", "8765"))
+BACKEND_SOCKET = os.environ.get("BACKEND_SOCKET")  # Unix socket path; overrides host and port
+
+async def _json_body(request: Request) -> dict:
+    try:
+        body = await request.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+async def health(request: Request):
+    return JSONResponse({"status": "ok"})
+
+async def search(request: Request):
+    body = await _json_body(request)
+    if not body.get("title"):
+        return JSONResponse({"error": "title is required"}, status_code=400)
+    books = await hub.acall("search_books", {"title": body["title"]})
+    return JSONResponse({"books": books})
+
+async def select_book(request: Request):
+    body = await _json_body(request)
+    if not isinstance(body.get("book"), dict):
+        return JSONResponse({"error": "book is required"}, status_code=400)
+    # Downloading and ingesting can take minutes; other requests keep being served meanwhile
+    title = await run_in_threadpool(ensure_book_available_and_ingested, body["book"])
+    return JSONResponse({"title": title})
+
+def _answer_lines(user_input: str, title: str | None):
+    """NDJSON lines of one answer. Runs in the threadpool, one LLM token at a time."""
+    try:
+        response_stream, new_title = orchestrate_request_stream(user_input, title)
+        yield json.dumps({"title": new_title}) + "\n"
+        for piece in response_stream:
+            yield json.dumps({"text": piece}) + "\n"
+        yield json.dumps({"done": True}) + "\n"
+    except Exception as e:
+        traceback.print_exc()
+        yield json.dumps({"error": f"{type(e).__name__}: {e}"}) + "\n"
+
+async def ask(request: Request):
+    body = await _json_body(request)
+    if not body.get("input"):
+        return JSONResponse({"error": "input is required"}, status_code=400)
+    # Starlette iterates a sync generator in its threadpool, so concurrent answers don't block the event loop
+    return StreamingResponse(_answer_lines(body["input"], body.get("title")), media_type="application/x-ndjson")
+
+async def stats(request: Request):
+    names = ("llm_scheduler_stats", "query_encoder_stats", "reranker_stats", "response_cache_stats",
+             "intent_tier_stats")
+    return JSONResponse({"agents": hub.stats(), **{name: hub.call(name) for name in names if name in hub.registry}})
+
+@asynccontextmanager
+async def lifespan(app):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    prewarm_models()  # Background threads; requests are accepted while the models load
+    yield
+
+app = Starlette(routes=[
+    Route("/health", health),
+    Route("/search", search, methods=["POST"]),
+    Route("/select", select_book, methods=["POST"]),
+    Route("/ask", ask, methods=["POST"]),
+    Route("/stats", stats),
+], lifespan=lifespan)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the book assistant to the Streamlit app and the CLI.")
+    parser.add_argument("--host", default=BACKEND_HOST)
+    parser.add_argument("--port", type=int, default=BACKEND_PORT)
+    parser.add_argument("--socket", default=BACKEND_SOCKET, help="Listen on a Unix socket instead of host:port")
+    args = parser.parse_args()
+    # A single process on purpose: more workers would each load their own models
+    if args.socket:
+        print(f"📡 Book assistant backend on unix:{args.socket}")
+        uvicorn.run(app, uds=args.socket, log_level="warning")
+    else:
+        print(f"📡 Book assistant backend on http://{args.host}:{args.port}")
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
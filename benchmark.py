@@ -0,0 +1,252 @@
+# benchmark.py
+#
+# Measures ingestion, retrieval and end-to-end latency on the bundled books:
+#   python benchmark.py --output bench_results.json
+#   python benchmark.py --compare bench_results.json   # flag regressions vs. a saved run
+# Everything runs against a temporary data directory, the LLM is replaced by a
+# deterministic stub, and the reranker and background summary builds are off,
+# so runs are reproducible offline.
+
+import argparse
+import atexit
+import glob
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BUNDLED_BOOKS = os.path.join(ROOT, "data", "*.txt")
+EVAL_INPUT = os.path.join(ROOT, "eval_input.json")
+
+TOP_K_VALUES = (1, 5, 10, 20)
+QUERY_REPEATS = 3
+IMPORT_TIME_BUDGET_SECONDS = 2.0  # `import mcp_hub` must not load any model
+IMPORT_RSS_BUDGET_MB = 250
+DEFAULT_TOLERANCE = 0.10  # relative slowdown that counts as a regression
+# Read when the modules are imported: no cross-encoder download or background LLM work mixed into the timings
+BENCHMARK_ENV = {"RERANK_ENABLED": "0", "SUMMARY_TREE_AUTO_BUILD": "0"}
+
+QUERIES = [
+    "who is the main character",
+    "describe the house where they live",
+    "a letter arrives with bad news",
+    "the weather was cold and dark",
+    "what does she think of him",
+    "a journey by night",
+    "money and inheritance",
+    "a ghost appears",
+    "the trial and the punishment",
+    "a wedding is announced",
+]
+
+# Metrics where a larger value is better; everything else is a latency
+HIGHER_IS_BETTER = ("ingest.chunks_per_second",)
+
+
+class DeterministicLLM:
+    """Stand-in for llama_cpp.Llama: the answer depends only on the prompt."""
+
+    def __init__(self, tokens_per_answer: int = 64, seconds_per_token: float = 0.0):
+        self.tokens_per_answer = tokens_per_answer
+        self.seconds_per_token = seconds_per_token
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> list[int]:
+        return [hash(word) & 0xFFFF for word in text.split()]
+
+    def _answer(self, prompt: str) -> list[str]:
+        if "Return a JSON object" in prompt:
+            return ['{"intent": "question", "title": null}']
+        seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return [f"w{seed[i % 64]}{i} " for i in range(self.tokens_per_answer)]
+
+    def create_chat_completion(self, messages, stream=False, **params):
+        tokens = self._answer(messages[-1]["content"])[:params.get("max_tokens", self.tokens_per_answer)]
+        if not stream:
+            return {"choices": [{"message": {"content": "".join(tokens)}}]}
+        return self._stream(tokens)
+
+    def _stream(self, tokens):
+        for token in tokens:
+            if self.seconds_per_token:
+                time.sleep(self.seconds_per_token)
+            yield {"choices": [{"delta": {"content": token}}]}
+
+
+def _percentiles(samples: list[float]) -> dict:
+    import numpy as np
+    values = np.array(samples) * 1000  # milliseconds
+    return {"p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95)),
+            "p99": float(np.percentile(values, 99))}
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+def _unique_books() -> list[str]:
+    """Bundled books, skipping byte-identical copies."""
+    seen, books = set(), []
+    for path in sorted(glob.glob(BUNDLED_BOOKS)):
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        if os.path.getsize(path) and digest not in seen:
+            seen.add(digest)
+            books.append(path)
+    return books
+
+def bench_import_budget() -> dict:
+    """Times `import mcp_hub` in a fresh interpreter and records its peak RSS."""
+    probe = (
+        "import time, resource, sys; start = time.perf_counter(); import mcp_hub; "
+        "elapsed = time.perf_counter() - start; "
+        "rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss; "
+        "print(elapsed, rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024)"
+    )
+    output = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True, check=True)
+    seconds, rss_mb = (float(x) for x in output.stdout.split()[-2:])
+    return {
+        "import.mcp_hub_seconds": seconds,
+        "import.mcp_hub_rss_mb": rss_mb,
+        "import.within_budget": seconds <= IMPORT_TIME_BUDGET_SECONDS and rss_mb <= IMPORT_RSS_BUDGET_MB,
+    }
+
+def run_benchmarks(books: list[str], skip_perplexity: bool = False) -> dict:
+    from mcp_agents import llm_gateway, vector_store
+    from orchestrator import orchestrator_agent
+
+    llm_gateway.use_llm_loader(DeterministicLLM)
+    # The cache's data directory is gone by the time atexit would save it
+    atexit.unregister(orchestrator_agent.response_cache.save)
+    metrics = {}
+
+    # --- ingestion, in stages so retrieval is measured at several corpus sizes ---
+    stages = sorted({1, max(1, len(books) // 2), len(books)})
+    titles, ingested, chunks, ingest_seconds = [], 0, 0, 0.0
+    for stage in stages:
+        for path in books[ingested:stage]:
+            title = os.path.splitext(os.path.basename(path))[0]
+            seconds, ok = _timed(vector_store.ingest_book_file, title, path)
+            if ok:
+                titles.append(title)
+                chunks += vector_store.load_manifest(title)["chunk_count"]
+                ingest_seconds += seconds
+        ingested = stage
+
+        for top_k in TOP_K_VALUES:
+            samples = []
+            for _ in range(QUERY_REPEATS):
+                for i, query in enumerate(QUERIES):
+                    seconds, _ = _timed(vector_store.query_book, titles[i % len(titles)], query, top_k)
+                    samples.append(seconds)
+            for name, value in _percentiles(samples).items():
+                metrics[f"query_book.books_{stage}.top_k_{top_k}.{name}_ms"] = value
+
+    metrics["ingest.books"] = len(titles)
+    metrics["ingest.chunks"] = chunks
+    metrics["ingest.chunks_per_second"] = chunks / ingest_seconds if ingest_seconds else 0.0
+
+    samples = [_timed(vector_store.get_last_chunk, title)[0] for title in titles for _ in range(QUERY_REPEATS)]
+    for name, value in _percentiles(samples).items():
+        metrics[f"get_last_chunk.{name}_ms"] = value
+
+    # --- end-to-end requests per intent (stub LLM) ---
+    def run_request(user_input, title):
+        stream, _ = orchestrator_agent.orchestrate_request_stream(user_input, title)
+        first_token = None
+        start = time.perf_counter()
+        for _ in stream:
+            if first_token is None:
+                first_token = time.perf_counter() - start
+        return first_token
+
+    requests_by_intent = {
+        "summary": ["summarize the book"],
+        "question": [f"{query}?" for query in QUERIES],
+        "continuation": ["continue the story"],
+    }
+    for intent, inputs in requests_by_intent.items():
+        samples = []
+        for title in titles:
+            for user_input in inputs:
+                seconds, _ = _timed(run_request, user_input, title)
+                samples.append(seconds)
+        for name, value in _percentiles(samples).items():
+            metrics[f"orchestrate.{intent}.{name}_ms"] = value
+
+    # --- perplexity on the eval_input.json document/summary pair ---
+    if not skip_perplexity and os.path.exists(EVAL_INPUT):
+        from orchestrator.metrics import compute_perplexity
+        with open(EVAL_INPUT, "r", encoding="utf-8") as f:
+            eval_input = json.load(f)
+        for field in ("document", "summary"):
+            seconds, value = _timed(compute_perplexity, eval_input[field])
+            metrics[f"perplexity.{field}.value"] = value
+            metrics[f"perplexity.{field}.seconds"] = seconds
+
+    return metrics
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Returns a description of every metric that got worse by more than `tolerance`."""
+    regressions = []
+    for name, old in baseline["metrics"].items():
+        new = current["metrics"].get(name)
+        if not isinstance(old, (int, float)) or isinstance(old, bool) or not isinstance(new, (int, float)) or not old:
+            continue
+        if name.startswith(("ingest.books", "ingest.chunks")) and name not in HIGHER_IS_BETTER:
+            continue  # Corpus size, not performance
+        if name.startswith("perplexity.") and name.endswith(".value"):
+            continue  # Quality score, only meaningful when it changes at all
+        change = (new - old) / old
+        worse = change < -tolerance if name in HIGHER_IS_BETTER else change > tolerance
+        if worse:
+            regressions.append(f"{name}: {old:.3f} -> {new:.3f} ({change:+.1%})")
+    if current["metrics"].get("import.within_budget") is False:
+        regressions.append("import.within_budget: `import mcp_hub` exceeds its time or memory budget")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, retrieval and request latency.")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the results")
+    parser.add_argument("--compare", help="Baseline results to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--max-books", type=int, default=None, help="Only use the first N bundled books")
+    parser.add_argument("--skip-perplexity", action="store_true", help="Don't load GPT-2")
+    args = parser.parse_args()
+
+    books = _unique_books()[:args.max_books]
+    results = {
+        "meta": {"python": platform.python_version(), "machine": platform.machine(),
+                 "books": [os.path.basename(path) for path in books], "timestamp": time.time()},
+        "metrics": bench_import_budget(),
+    }
+
+    with tempfile.TemporaryDirectory(prefix="books_bench_") as data_dir:
+        # Must be set before vector_store is imported
+        os.environ["BOOKS_DATA_DIR"] = data_dir
+        os.environ.update(BENCHMARK_ENV)
+        results["metrics"].update(run_benchmarks(books, args.skip_perplexity))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    for name, value in sorted(results["metrics"].items()):
+        print(f"{name:55s} {value:.3f}" if isinstance(value, float) else f"{name:55s} {value}")
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) against {args.compare}:")
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print(f"\n✅ No regressions against {args.compare} (tolerance {args.tolerance:.0%}).")
+
+if __name__ == "__main__":
+    main()
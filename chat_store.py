@@ -0,0 +1,136 @@
+# chat_store.py
+#
+# Chat threads and their messages in SQLite (WAL mode). Every message is one
+# INSERT, so saving costs the same however many threads exist, and concurrent
+# Streamlit sessions append to the same database without overwriting each
+# other. Threads are loaded a page of messages at a time. The first time the
+# store is opened, the threads in chat_history.json are imported once.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CHAT_DB_FILE = "chat_history.db"
+LEGACY_CHAT_HISTORY_FILE = "chat_history.json"
+MESSAGES_PAGE_SIZE = 50
+BUSY_TIMEOUT_MS = 5000  # how long a writer waits for another session's transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    thread_id INTEGER NOT NULL REFERENCES threads(id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_thread ON messages(thread_id, id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class ChatStore:
+    """
+    Chat history shared by all sessions of the app. Messages are returned as
+    `{"id", "role", "content"}` dicts, oldest first. Connections are per thread,
+    since Streamlit runs every session in its own thread.
+    """
+
+    def __init__(self, path: str = CHAT_DB_FILE, legacy_path: str | None = LEGACY_CHAT_HISTORY_FILE):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+        if legacy_path:
+            self.migrate_json(legacy_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")  # WAL stays consistent; only the last commits can be lost on power failure
+            db.execute("PRAGMA foreign_keys=ON")
+            self._local.db = db
+        return db
+
+    def migrate_json(self, legacy_path: str) -> int:
+        """Imports the threads of the old chat_history.json once; returns the number of messages imported."""
+        db = self._connect()
+        if db.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone() or not os.path.exists(legacy_path):
+            return 0
+        try:
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                threads = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[!] Could not read {legacy_path} for migration: {e}")
+            threads = {}
+        imported = 0
+        now = time.time()
+        with db:  # One transaction, so a crash never leaves a half-imported history
+            db.execute("BEGIN IMMEDIATE")  # Take the write lock before checking again
+            if db.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone():
+                return 0  # Another session migrated in the meantime
+            for name, messages in (threads.items() if isinstance(threads, dict) else []):
+                db.execute("INSERT OR IGNORE INTO threads (name, created, updated) VALUES (?, ?, ?)", (name, now, now))
+                thread_id = db.execute("SELECT id FROM threads WHERE name = ?", (name,)).fetchone()[0]
+                rows = [(thread_id, m.get("role", "user"), m.get("content", ""), now) for m in messages if isinstance(m, dict)]
+                db.executemany("INSERT INTO messages (thread_id, role, content, created) VALUES (?, ?, ?, ?)", rows)
+                imported += len(rows)
+            db.execute("INSERT INTO meta (key, value) VALUES ('migrated_json', ?)", (legacy_path,))
+        print(f"✅ Imported {imported} messages from {legacy_path} into {self.path}.")
+        return imported
+
+    # --- threads ---
+
+    def list_threads(self) -> list[str]:
+        """Thread names in creation order."""
+        return [name for (name,) in self._connect().execute("SELECT name FROM threads ORDER BY id")]
+
+    def create_thread(self, name: str) -> bool:
+        """Creates a thread; False if one with that name exists already."""
+        now = time.time()
+        with self._connect() as db:
+            cursor = db.execute("INSERT OR IGNORE INTO threads (name, created, updated) VALUES (?, ?, ?)", (name, now, now))
+        return cursor.rowcount == 1
+
+    def delete_thread(self, name: str):
+        with self._connect() as db:
+            db.execute("DELETE FROM threads WHERE name = ?", (name,))
+
+    # --- messages ---
+
+    def append_message(self, thread: str, role: str, content: str) -> int | None:
+        """Appends one message to a thread; returns its ID, or None if the thread doesn't exist (any more)."""
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute("SELECT id FROM threads WHERE name = ?", (thread,)).fetchone()
+            if row is None:
+                return None
+            cursor = db.execute("INSERT INTO messages (thread_id, role, content, created) VALUES (?, ?, ?, ?)",
+                                (row[0], role, content, now))
+            db.execute("UPDATE threads SET updated = ? WHERE id = ?", (now, row[0]))
+        return cursor.lastrowid
+
+    def load_messages(self, thread: str, limit: int = MESSAGES_PAGE_SIZE, before_id: int | None = None) -> list[dict]:
+        """The latest `limit` messages of a thread (or the ones before message `before_id`), oldest first."""
+        rows = self._connect().execute(
+            "SELECT m.id, m.role, m.content FROM messages m JOIN threads t ON t.id = m.thread_id "
+            "WHERE t.name = ? AND m.id < ? ORDER BY m.id DESC LIMIT ?",
+            (thread, before_id if before_id is not None else 2 ** 63 - 1, limit)).fetchall()
+        return [{"id": id_, "role": role, "content": content} for id_, role, content in reversed(rows)]
+
+    def has_messages_before(self, thread: str, message_id: int) -> bool:
+        return self._connect().execute(
+            "SELECT 1 FROM messages m JOIN threads t ON t.id = m.thread_id WHERE t.name = ? AND m.id < ? LIMIT 1",
+            (thread, message_id)).fetchone() is not None
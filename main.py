@@ -1,10 +1,8 @@
 # main.py
 
-import os
-from mcp_agents.gutenberg_api import GutenbergAPI
-from orchestrator.orchestrator_agent import ensure_book_available_and_ingested, orchestrate_request # Import new orchestrator function
+from backend_client import BackendClient, BackendError
 
-DATA_FOLDER = "data"
+backend = BackendClient() # The models live in backend_service.py
 remembered_title = None  # Keep current book title across queries
 
 def search_and_select_book():
@@ -15,7 +13,11 @@ def search_and_select_book():
             print("Please enter something.")
             continue
 
-        results = GutenbergAPI.search_books({"title": query})
+        try:
+            results = backend.search_books(query)
+        except BackendError as e:
+            print(f"❌ {e}")
+            continue
         if not results:
             print("No results found. Try again.")
             continue
@@ -39,6 +41,9 @@ def search_and_select_book():
 def main():
     global remembered_title
     print("📚 Welcome to the Book Assistant!")
+    if not backend.is_available():
+        print("❌ The book assistant backend isn't running. Start it with `python backend_service.py`.")
+        return
 
     # Search and pick book at start
     while not remembered_title:
@@ -47,7 +52,11 @@ def main():
             print("Exiting...")
             return
 
-        verified_title = ensure_book_available_and_ingested(book_info_from_search)
+        try:
+            verified_title = backend.select_book(book_info_from_search)
+        except BackendError as e:
+            print(f"❌ {e}")
+            verified_title = None
         if verified_title:
             remembered_title = verified_title
         else:
@@ -69,11 +78,16 @@ def main():
         print(f"DEBUG MAIN: remembered_title BEFORE orchestrate_request: '{remembered_title}'")
         
         try:
-            response, updated_remembered_title = orchestrate_request(user_input, remembered_title)
+            response_stream, updated_remembered_title = backend.ask_stream(user_input, remembered_title)
             remembered_title = updated_remembered_title # Update the global remembered_title
 
-            print("\n🧠 Answer:\n", response)
+            print("\n🧠 Answer:\n", end=" ", flush=True)
+            for token in response_stream: # Print tokens as soon as the model produces them
+                print(token, end="", flush=True)
+            print()
 
+        except BackendError as e:
+            print(f"\n❌ {e}")
         except Exception as e:
             print(f"❌ An unexpected error occurred: {e}")
             import traceback # Add traceback for detailed error location
@@ -83,5 +97,4 @@ def main():
 
 
 if __name__ == "__main__":
-    os.makedirs(DATA_FOLDER, exist_ok=True)
     main()
\ No newline at end of file
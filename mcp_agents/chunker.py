@@ -0,0 +1,165 @@
+# mcp_agents/chunker.py
+#
+# Structural chunker for Gutenberg books. Chunks end at paragraph boundaries
+# where possible (never mid-word), never straddle a chapter heading, and
+# overlap the previous chunk by a few words. Word, line and paragraph
+# boundaries are found with numpy over the raw bytes in a single pass, so
+# multi-megabyte books chunk in milliseconds; only the chunk texts themselves
+# are decoded.
+
+import bisect
+import re
+
+import numpy as np
+
+CHUNKER_VERSION = 3  # version 1 cut the cleaned text every 1000 characters, version 2 didn't record parts
+CHUNK_TOKENS = 240  # MiniLM only embeds the first 256 word pieces of a chunk
+CHUNK_OVERLAP_TOKENS = 32
+TOKENS_PER_WORD = 1.3  # word pieces per word in English prose
+MIN_FILL = 0.5  # cut at a paragraph end only if the chunk is at least this full
+MIN_SECTION_BYTES = 2000  # headings closer together than this are a table of contents
+PART_KINDS = ("part", "book")  # headings whose chapters may restart their numbering
+
+START_MARKER_RE = re.compile(rb"\*\*\* start of", re.I)
+END_MARKER_RE = re.compile(rb"\*\*\* end of", re.I)
+NUMBER_WORDS = {word: i for i, word in enumerate(
+    "one two three four five six seven eight nine ten eleven twelve thirteen fourteen fifteen "
+    "sixteen seventeen eighteen nineteen twenty".split(), start=1)}
+ROMAN_VALUES = {"i": 1, "v": 5, "x": 10, "l": 50, "c": 100, "d": 500, "m": 1000}
+# A short line on its own such as "CHAPTER XII.", "Chapter 3: The Ball" or "STAVE ONE."
+HEADING_PATTERN = r"^[ \t]*(CHAPTER|Chapter|STAVE|Stave|BOOK|Book|PART|Part|ACT|Act)[ \t]+([IVXLCDM]+|\d+|[A-Za-z]+)\b[^\r\n]{0,40}\r*$"
+HEADING_RE = re.compile(HEADING_PATTERN, re.M)
+HEADING_BYTES_RE = re.compile(HEADING_PATTERN.encode("ascii"), re.M)
+PARAGRAPH_BREAK_RE = re.compile(r"\n[ \t\r]*\n\s*")
+
+def parse_number(token: str) -> int | None:
+    """Chapter number from "12", "XII" or "twelve"."""
+    token = token.lower()
+    if token.isdigit():
+        return int(token)
+    if token in NUMBER_WORDS:
+        return NUMBER_WORDS[token]
+    if token and all(c in ROMAN_VALUES for c in token):
+        total = 0
+        for i, c in enumerate(token):
+            value = ROMAN_VALUES[c]
+            total += -value if i + 1 < len(token) and ROMAN_VALUES[token[i + 1]] > value else value
+        return total
+    return None
+
+def find_headings(text, start: int = 0, end: int | None = None) -> list[dict]:
+    """Chapter headings in `text` (str or bytes-like) as dicts with position, kind, number and label."""
+    pattern = HEADING_RE if isinstance(text, str) else HEADING_BYTES_RE
+    headings = []
+    for match in pattern.finditer(text, start, len(text) if end is None else end):
+        kind, number, label = (g if isinstance(g, str) else g.decode("ascii", errors="replace")
+                               for g in (match.group(1), match.group(2), match.group(0)))
+        number = parse_number(number)
+        if number is not None:
+            headings.append({"position": match.start(), "kind": kind.lower(), "number": number,
+                             "label": " ".join(label.split())})
+    return headings
+
+def filter_headings(headings: list[dict], min_gap: int = MIN_SECTION_BYTES) -> list[dict]:
+    """Drops table-of-contents entries and headings directly above a subheading."""
+    headings = [heading for heading, following in zip(headings, headings[1:] + [None])
+                if following is None or following["position"] - heading["position"] >= min_gap]
+    # The last contents entry survives that; drop anything before the real first chapter
+    first_positions = {}
+    for heading in headings:
+        if heading["number"] == 1:
+            first_positions.setdefault(heading["kind"], heading["position"])
+    return [heading for heading in headings
+            if heading["position"] >= first_positions.get(heading["kind"], 0) or heading["number"] == 1]
+
+def assign_parts(headings: list[dict], found: list[dict]) -> list[dict]:
+    """
+    Sets the "part" of every kept heading: the number of the PART or BOOK
+    heading it falls under, or 0. filter_headings drops a PART heading directly
+    above its first CHAPTER, so parts are looked up among all `found` headings.
+    """
+    if not headings:
+        return headings
+    contents_end = headings[0]["position"] - MIN_SECTION_BYTES  # Part entries before this are a table of contents
+    parts = [heading for heading in found if heading["kind"] in PART_KINDS and heading["position"] >= contents_end]
+    positions = [heading["position"] for heading in parts]
+    for heading in headings:
+        i = bisect.bisect_right(positions, heading["position"]) - 1
+        heading["part"] = parts[i]["number"] if i >= 0 else 0
+    return headings
+
+def content_span(data) -> tuple[int, int]:
+    """Byte range between the Gutenberg start and end marker lines (the whole text without them)."""
+    start = START_MARKER_RE.search(data)
+    finish = END_MARKER_RE.search(data, start.end()) if start else None
+    if not start or not finish:
+        return 0, len(data)
+    line_end = data.find(b"\n", start.end())
+    line_start = data.rfind(b"\n", 0, finish.start())
+    return (len(data) if line_end < 0 else line_end + 1), (0 if line_start < 0 else line_start + 1)
+
+def normalize_chunk(raw: str) -> str:
+    """Paragraphs separated by blank lines, the lines of each paragraph joined with spaces."""
+    return "\n\n".join(" ".join(paragraph.split()) for paragraph in PARAGRAPH_BREAK_RE.split(raw) if paragraph.strip())
+
+def iter_chunks(data, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+    """
+    Chunks a book given as bytes (or a memory-mapped file). Yields
+    `(text, byte_start, byte_end, metadata)`, where the byte span locates the
+    chunk in `data` and metadata holds its chapter and paragraph indexes.
+    Chunk sizes are estimated from word counts (TOKENS_PER_WORD).
+    """
+    begin, end = content_span(data)
+    raw = np.frombuffer(data, dtype=np.uint8)[begin:end] if end > begin else np.zeros(0, dtype=np.uint8)
+    space = raw <= 32  # ASCII whitespace and control bytes
+    if space.all():
+        return
+
+    previous_space = np.concatenate(([True], space[:-1]))
+    next_space = np.concatenate((space[1:], [True]))
+    word_starts = np.flatnonzero(~space & previous_space)
+    word_ends = np.flatnonzero(~space & next_space) + 1
+
+    # A paragraph break is a line with nothing but whitespace between two newlines
+    newlines = np.flatnonzero(raw == 10)
+    nonspace_before = np.concatenate(([0], np.cumsum(~space)))
+    breaks = newlines[1:][nonspace_before[newlines[1:]] == nonspace_before[newlines[:-1]]]
+    raw_paragraph = np.searchsorted(breaks, word_starts)
+    new_paragraph = np.diff(raw_paragraph, prepend=-1) > 0
+    paragraph_of_word = np.cumsum(new_paragraph) - 1
+    paragraph_starts = np.flatnonzero(new_paragraph)  # word index where each paragraph begins
+
+    found = find_headings(data, begin, end)
+    headings = assign_parts(filter_headings(found), found)
+    heading_positions = np.array([heading["position"] - begin for heading in headings], dtype=np.int64)
+    chapter_of_word = np.searchsorted(heading_positions, word_starts, side="right") - 1
+    # Chunks never cross these word indexes
+    section_ends = np.union1d(np.searchsorted(word_starts, heading_positions), [len(word_starts)])
+
+    target = max(1, int(chunk_tokens / TOKENS_PER_WORD))
+    overlap = min(int(overlap_tokens / TOKENS_PER_WORD), target // 2)
+    word = 0
+    while word < len(word_starts):
+        section_end = int(section_ends[np.searchsorted(section_ends, word, side="right")])
+        cut = min(word + target, section_end)
+        if cut < section_end:
+            paragraph_start = paragraph_starts[np.searchsorted(paragraph_starts, cut, side="right") - 1]
+            if paragraph_start >= word + target * MIN_FILL:
+                cut = int(paragraph_start)
+
+        byte_start, byte_end = begin + int(word_starts[word]), begin + int(word_ends[cut - 1])
+        chapter = int(chapter_of_word[word])
+        heading = headings[chapter] if chapter >= 0 else None
+        yield normalize_chunk(bytes(data[byte_start:byte_end]).decode("utf-8", errors="replace")), byte_start, byte_end, {
+            "chapter_index": chapter,  # -1 before the first heading; unique within the book, unlike the number
+            "chapter": heading["label"] if heading else "",
+            "chapter_kind": heading["kind"] if heading else "",
+            "chapter_number": heading["number"] if heading else 0,
+            "chapter_part": heading["part"] if heading else 0,
+            "paragraph_start": int(paragraph_of_word[word]),
+            "paragraph_end": int(paragraph_of_word[cut - 1]),
+            "byte_start": byte_start,
+            "byte_end": byte_end,
+            "chunker_version": CHUNKER_VERSION,
+        }
+        word = max(cut - overlap, word + 1) if cut < section_end else cut
@@ -0,0 +1,171 @@
+# mcp_agents/embedding_cache.py
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = 200_000  # ~300 MB of float32 vectors for a 384-dim model
+_MIN_CAPACITY = 1024
+
+def normalize_chunk_text(text: str) -> str:
+    """Collapses whitespace so re-wrapped or re-stripped copies of a chunk share one key."""
+    return re.sub(r"\s+", " ", text).strip()
+
+def chunk_hash(text: str) -> str:
+    return hashlib.blake2b(normalize_chunk_text(text).encode("utf-8"), digest_size=16).hexdigest()
+
+class EmbeddingCache:
+    """
+    On-disk, content-addressed cache of chunk embeddings for one embedding model.
+
+    Vectors live in a memory-mapped float32 matrix (`vectors.f32`), one row per
+    entry. `index.json` maps chunk hashes to rows and keeps them in LRU order;
+    once `max_entries` is reached the least recently used rows are reused.
+    """
+
+    def __init__(self, model_name: str, cache_dir: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.directory = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.index_path = os.path.join(self.directory, "index.json")
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # chunk hash -> row, least recently used first
+        self._free_rows = []
+        self._dim = None
+        self._capacity = 0
+        self._vectors = None
+        self._dirty = False
+        self._evicted = False  # The index on disk still maps evicted keys to their rows
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path) or not os.path.exists(self.vectors_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: Ignoring unreadable embedding cache index '{self.index_path}': {e}")
+            return
+        if index.get("model") != self.model_name:
+            return
+
+        self._dim = index["dim"]
+        self._capacity = os.path.getsize(self.vectors_path) // (self._dim * 4)
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(self._capacity, self._dim))
+        for key, row in index["entries"]:
+            if row < self._capacity:
+                self._entries[key] = row
+        used = set(self._entries.values())
+        self._free_rows = [row for row in range(self._capacity - 1, -1, -1) if row not in used]
+
+    def _ensure_capacity(self, rows_needed: int):
+        if rows_needed <= self._capacity:
+            return
+        new_capacity = min(max(rows_needed, self._capacity * 2, _MIN_CAPACITY), self.max_entries)
+        os.makedirs(self.directory, exist_ok=True)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None  # Release the mapping before resizing the file
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(new_capacity * self._dim * 4)
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(new_capacity, self._dim))
+        self._free_rows = list(range(new_capacity - 1, self._capacity - 1, -1)) + self._free_rows
+        self._capacity = new_capacity
+
+    def _allocate_row(self) -> int:
+        if not self._free_rows:
+            if self._capacity < self.max_entries:
+                self._ensure_capacity(self._capacity + 1)
+            else:
+                _, row = self._entries.popitem(last=False)  # Evict the least recently used entry
+                self._evicted = True
+                return row
+        return self._free_rows.pop()
+
+    def encode(self, texts: list[str], encoder) -> np.ndarray:
+        """
+        Returns embeddings for `texts`, calling `encoder(list_of_texts)` only for
+        chunks that are not cached yet (each distinct chunk is encoded once).
+        """
+        keys = [chunk_hash(text) for text in texts]
+        result = [None] * len(texts)
+        missing = {}  # chunk hash -> positions in `texts`
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                row = self._entries.get(key)
+                if row is not None:
+                    self._entries.move_to_end(key)
+                    result[i] = np.array(self._vectors[row])
+                    self.hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+                    self.misses += 1
+
+        if missing:
+            to_encode = [texts[positions[0]] for positions in missing.values()]
+            encoded = np.asarray(encoder(to_encode), dtype=np.float32)
+            with self._lock:
+                if self._dim is None:
+                    self._dim = encoded.shape[1]
+                new_rows = []
+                for key, vector in zip(missing, encoded):
+                    for i in missing[key]:
+                        result[i] = vector
+                    if key in self._entries:
+                        continue  # Stored concurrently by another caller
+                    new_rows.append((key, vector, self._allocate_row()))
+                if self._evicted:
+                    # Drop the evicted keys from the index on disk before their rows are overwritten,
+                    # so a crash in between can't map an old key to a new vector
+                    self._write_index()
+                for key, vector, row in new_rows:
+                    self._vectors[row] = vector
+                    self._entries[key] = row
+                self._dirty = True
+
+        return np.stack(result) if result else np.zeros((0, self._dim or 0), dtype=np.float32)
+
+    def flush(self):
+        """Writes the vectors and the LRU index to disk."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._vectors.flush()
+            self._write_index()
+            self._dirty = False
+
+    def _write_index(self):
+        """Writes the LRU index; the caller holds the lock."""
+        index = {
+            "model": self.model_name,
+            "dim": self._dim,
+            "entries": [[key, row] for key, row in self._entries.items()],
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+        self._evicted = False
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -1,19 +1,35 @@
 # mcp_agents/gutenberg_api.py
 
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from bs4 import BeautifulSoup
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import re 
+from mcp_agents import gutenberg_catalog
+from mcp_agents.http_cache import MAX_CONNECTIONS_PER_HOST, HttpCache
+from mcp_agents.vector_store import DATA_DIR
 
 # Ensure these imports are correct relative to your project structure
 # from .vector_store import get_book_path, is_book_downloaded # These imports are not used directly in GutenbergAPI class
 # They are used in orchestrator_agent which calls GutenbergAPI methods,
 # so we don't need them here to fix the current error.
 
-GUTENBERG_SEARCH_URL = "https://www.gutenberg.org/ebooks/search/?query="
-GUTENBERG_BASE_URL = "https://www.gutenberg.org"
+# Point at a local mirror (or a stand-in server in tests) with GUTENBERG_BASE_URL=http://localhost:8000
+GUTENBERG_BASE_URL = os.environ.get("GUTENBERG_BASE_URL", "https://www.gutenberg.org").rstrip("/")
+GUTENBERG_SEARCH_URL = GUTENBERG_BASE_URL + "/ebooks/search/?query="
+HTTP_CACHE_DIR = os.path.join(DATA_DIR, "http_cache")
+SEARCH_TTL_SECONDS = 24 * 3600  # search pages served from the cache without asking Gutenberg
+BOOK_TTL_SECONDS = 7 * 24 * 3600  # after this, a cached book is revalidated (ETag / Last-Modified)
+SEARCH_RESULTS_CACHE_SIZE = 256
+DOWNLOAD_WORKERS = 8
+CATALOG_MIN_SCORE = 0.75  # best offline catalog match needed to skip the online search
+# With 0, searches only use the offline catalog (built with `python -m mcp_agents.gutenberg_catalog`)
+CATALOG_ONLINE_FALLBACK = os.environ.get("GUTENBERG_CATALOG_ONLINE_FALLBACK", "1") == "1"
 
 # --- NEW: Configure Session with Retries ---
 def requests_retry_session(
@@ -21,8 +37,10 @@ def requests_retry_session(
     backoff_factor=0.3,
     status_forcelist=(500, 502, 503, 504), # HTTP statuses to retry on
     session=None,
+    pool_size=MAX_CONNECTIONS_PER_HOST,
 ):
     session = session or requests.Session()
+    session.headers["Accept-Encoding"] = "gzip, deflate"  # requests decompresses transparently
     retry = Retry(
         total=retries,
         read=retries,
@@ -31,7 +49,7 @@ def requests_retry_session(
         status_forcelist=status_forcelist,
         allowed_methods=frozenset(['GET', 'POST']) # Only retry GET and POST
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = HTTPAdapter(max_retries=retry, pool_maxsize=pool_size)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
     return session
@@ -40,18 +58,49 @@ def requests_retry_session(
 gutenberg_session = requests_retry_session()
 # --- END NEW ---
 
+# Search pages and book texts are cached on disk and revalidated with conditional requests
+http_cache = HttpCache(gutenberg_session, HTTP_CACHE_DIR)
+
+# Parsed search results by normalized query, least recently used first, so
+# repeated searches (every Streamlit rerun) skip the HTML parsing as well
+_search_results = OrderedDict()
+_search_results_lock = threading.Lock()
+
 class GutenbergAPI:
 
     @staticmethod
     def search_books(payload: dict) -> list[dict]:
+        """
+        Searches the offline catalog index first; Gutenberg's online search is
+        only asked when the index is missing or has no good match (and the
+        fallback is enabled). The online results win when there are any.
+        """
         title = payload.get("title")
         if not title:
             return []
 
-        query_url = GUTENBERG_SEARCH_URL + title.replace(" ", "+")
+        query = " ".join(title.lower().split())
+        local_books = [dict(book, link=f"{GUTENBERG_BASE_URL}/ebooks/{book['gutenberg_id']}")
+                       for book in gutenberg_catalog.search(query, limit=10)]
+        if local_books and (local_books[0]["score"] >= CATALOG_MIN_SCORE or not CATALOG_ONLINE_FALLBACK):
+            return local_books
+        if not CATALOG_ONLINE_FALLBACK:
+            return []
+        return GutenbergAPI.search_books_online(query) or local_books
+
+    @staticmethod
+    def search_books_online(query: str) -> list[dict]:
+        """Gutenberg's own search page, parsed into the top 10 results."""
+        with _search_results_lock:
+            cached = _search_results.get(query)
+            if cached and time.time() - cached[0] < SEARCH_TTL_SECONDS:
+                _search_results.move_to_end(query)
+                return [dict(book) for book in cached[1]]
+
+        query_url = GUTENBERG_SEARCH_URL + query.replace(" ", "+")
         
         try:
-            response = gutenberg_session.get(query_url, timeout=10) # Added timeout
+            response = http_cache.get(query_url, max_age=SEARCH_TTL_SECONDS, timeout=10) # Added timeout
             response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
 
             soup = BeautifulSoup(response.text, "html.parser")
@@ -83,7 +132,12 @@ class GutenbergAPI:
                     "gutenberg_id": book_id # Renamed 'id' to 'gutenberg_id' for clarity
                 })
 
-            return books
+            with _search_results_lock:
+                _search_results[query] = (time.time(), books)
+                _search_results.move_to_end(query)
+                while len(_search_results) > SEARCH_RESULTS_CACHE_SIZE:
+                    _search_results.popitem(last=False)
+            return [dict(book) for book in books]
         except requests.exceptions.RequestException as e:
             print(f"Network error during search: {e}")
             return []
@@ -110,8 +164,10 @@ class GutenbergAPI:
         
         try:
             print(f"Attempting direct download from: {text_url}")
-            response = gutenberg_session.get(text_url, timeout=60) # Longer timeout for download
+            response = http_cache.get(text_url, max_age=BOOK_TTL_SECONDS, timeout=60) # Longer timeout for download
             response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
+            if response.from_cache:
+                print(f"Using the cached copy of book ID {book_id}.")
             
             # Check if the content type is text/plain, otherwise it might be an error page
             if 'text/plain' not in response.headers.get('Content-Type', ''):
@@ -128,6 +184,15 @@ class GutenbergAPI:
             print(f"Error during direct download or processing of book ID {book_id}: {e}")
             return None
 
+    @staticmethod
+    def download_books(book_ids: list, workers: int = DOWNLOAD_WORKERS) -> dict:
+        """
+        Downloads several books concurrently (at most MAX_CONNECTIONS_PER_HOST
+        requests to Gutenberg at a time). Returns {book_id: text or None}.
+        """
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return dict(zip(book_ids, pool.map(GutenbergAPI.download_book, book_ids)))
+
     @staticmethod
     def get_book_details(gutenberg_id: int) -> dict | None:
         # This static method is currently not used in your orchestrator,
@@ -0,0 +1,206 @@
+# mcp_agents/gutenberg_catalog.py
+#
+# Offline index of the Project Gutenberg catalog, so book search works without
+# the network and title mentions resolve to Gutenberg IDs in milliseconds.
+# Build it once from the CSV catalog dump (pg_catalog.csv):
+#   python -m mcp_agents.gutenberg_catalog pg_catalog.csv
+#   python -m mcp_agents.gutenberg_catalog --download   # fetches the dump first
+# Titles and authors are indexed by character trigrams in flat numpy arrays:
+# a lookup counts the query's trigrams per entry with one bincount over the
+# matching postings and only scores the best candidates further.
+
+import argparse
+import csv
+import difflib
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+from mcp_agents.vector_store import DATA_DIR
+
+CATALOG_PATH = os.path.join(DATA_DIR, "catalog", "gutenberg_catalog.npz")
+CATALOG_INDEX_VERSION = 1
+CATALOG_FEED_PATH = "/cache/epub/feeds/pg_catalog.csv"
+CANDIDATES = 50  # entries scored in full per lookup
+CONTAINMENT_WEIGHT = 0.7  # share of the query's trigrams an entry contains, vs. trigram Jaccard similarity
+RESOLVE_CANDIDATES = 10  # best search results compared with a title mention
+RESOLVE_MIN_SIMILARITY = 0.85  # title similarity for resolving a mention to a book
+AUTHOR_DATES_RE = re.compile(r",\s*(?:\d{3,4}\??|BC)?\s*-\s*(?:\d{3,4}\??)?\s*(?:BC)?\s*$|\s*\[[^\]]*\]")
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r"['’]", "", text)  # "Alice's" -> "alices"
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+def main_title(title: str) -> str:
+    """The title without its subtitle: "Moby Dick; Or, The Whale" -> "Moby Dick"."""
+    return re.split(r"[;:(\n]", title)[0].strip()
+
+def display_author(authors: str) -> str:
+    """ "Shelley, Mary Wollstonecraft, 1797-1851; ..." -> "Mary Wollstonecraft Shelley" (the first author)."""
+    first = AUTHOR_DATES_RE.sub("", authors.split(";")[0]).strip()
+    last, _, given = first.partition(", ")
+    return f"{given} {last}".strip() if given else first or "Unknown"
+
+def _trigrams(text: str) -> np.ndarray:
+    padded = f"  {text} "
+    codes = {(ord(padded[i]) << 42) | (ord(padded[i + 1]) << 21) | ord(padded[i + 2]) for i in range(len(padded) - 2)}
+    return np.fromiter(codes, dtype=np.int64, count=len(codes))
+
+def _pack(strings: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+def read_catalog_csv(path: str) -> list[dict]:
+    """Text entries of pg_catalog.csv as dicts with gutenberg_id, title, author and language."""
+    entries = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            if row.get("Type", "Text") != "Text" or not row.get("Text#", "").isdigit():
+                continue
+            entries.append({
+                "gutenberg_id": int(row["Text#"]),
+                "title": " ".join(row.get("Title", "").split()),
+                "author": display_author(row.get("Authors", "")),
+                "language": row.get("Language", ""),
+            })
+    return entries
+
+def build_index(entries: list[dict], path: str = CATALOG_PATH):
+    """Writes the trigram index of catalog entries to `path`."""
+    codes, owners, sizes = [], [], []
+    for i, entry in enumerate(entries):
+        trigrams = _trigrams(normalize(f"{entry['title']} {entry['author']}"))
+        codes.append(trigrams)
+        owners.append(np.full(len(trigrams), i, dtype=np.int32))
+        sizes.append(len(trigrams))
+    codes = np.concatenate(codes) if codes else np.zeros(0, dtype=np.int64)
+    owners = np.concatenate(owners) if owners else np.zeros(0, dtype=np.int32)
+    order = np.argsort(codes, kind="stable")
+    codes, owners = codes[order], owners[order]
+    terms, starts = np.unique(codes, return_index=True)
+
+    titles, title_offsets = _pack([entry["title"] for entry in entries])
+    authors, author_offsets = _pack([entry["author"] for entry in entries])
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, version=CATALOG_INDEX_VERSION, terms=terms, offsets=np.append(starts, len(codes)), postings=owners,
+                 trigram_counts=np.array(sizes, dtype=np.int32),
+                 ids=np.array([entry["gutenberg_id"] for entry in entries], dtype=np.int32),
+                 english=np.array(["en" in entry["language"].split("; ") for entry in entries], dtype=bool),
+                 titles=titles, title_offsets=title_offsets, authors=authors, author_offsets=author_offsets)
+    os.replace(path + ".tmp", path)
+
+class CatalogIndex:
+    def __init__(self, arrays):
+        for name in ("terms", "offsets", "postings", "trigram_counts", "ids", "english",
+                     "titles", "title_offsets", "authors", "author_offsets"):
+            setattr(self, name, arrays[name])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _text(self, blob, offsets, i) -> str:
+        return blob[offsets[i]:offsets[i + 1]].tobytes().decode("utf-8")
+
+    def entry(self, i: int) -> dict:
+        return {"gutenberg_id": str(int(self.ids[i])), "title": self._text(self.titles, self.title_offsets, i),
+                "author": self._text(self.authors, self.author_offsets, i)}
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        """Entries whose title and author best match `query`, each with a score in [0, 1]."""
+        trigrams = _trigrams(normalize(query))
+        positions = np.searchsorted(self.terms, trigrams)
+        positions = positions[positions < len(self.terms)]
+        positions = positions[np.isin(self.terms[positions], trigrams)]
+        if not len(positions) or not len(self):
+            return []
+        hits = np.concatenate([self.postings[self.offsets[p]:self.offsets[p + 1]] for p in positions])
+        counts = np.bincount(hits, minlength=len(self)).astype(np.float32)
+        candidates = np.flatnonzero(counts)
+        if len(candidates) > CANDIDATES:
+            candidates = candidates[np.argpartition(-counts[candidates], CANDIDATES - 1)[:CANDIDATES]]
+        matched = counts[candidates]
+        containment = matched / len(trigrams)
+        jaccard = matched / (len(trigrams) + self.trigram_counts[candidates] - matched)
+        scores = CONTAINMENT_WEIGHT * containment + (1 - CONTAINMENT_WEIGHT) * jaccard
+        # English editions first among equal scores, then the oldest (lowest) ID
+        order = np.lexsort((self.ids[candidates], ~self.english[candidates], -scores))[:limit]
+        return [dict(self.entry(candidates[i]), score=float(scores[i])) for i in order]
+
+    def resolve_title(self, mention: str) -> dict | None:
+        """The book a title mention refers to ("moby dik" -> Moby Dick; Or, The Whale), or None."""
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(normalize(mention))
+        best = None
+        for entry in self.search(mention, limit=RESOLVE_CANDIDATES):
+            matcher.set_seq1(normalize(main_title(entry["title"])))
+            if matcher.real_quick_ratio() < RESOLVE_MIN_SIMILARITY or matcher.quick_ratio() < RESOLVE_MIN_SIMILARITY:
+                continue
+            similarity = matcher.ratio()
+            if similarity >= RESOLVE_MIN_SIMILARITY and (best is None or similarity > best["similarity"]):
+                best = dict(entry, similarity=similarity)
+        return best
+
+_loaded = {"mtime": None, "index": None}
+_loaded_lock = threading.Lock()
+
+def get_catalog(path: str = CATALOG_PATH) -> CatalogIndex | None:
+    """The catalog index (reloaded when the file changes), or None if it hasn't been built."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    with _loaded_lock:
+        if _loaded["mtime"] != mtime:
+            try:
+                with np.load(path) as arrays:
+                    index = CatalogIndex(arrays) if int(arrays["version"]) == CATALOG_INDEX_VERSION else None
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[!] Could not load the Gutenberg catalog {path}: {e}")
+                index = None
+            _loaded.update(mtime=mtime, index=index)
+        return _loaded["index"]
+
+def search(query: str, limit: int = 10) -> list[dict]:
+    catalog = get_catalog()
+    return catalog.search(query, limit) if catalog else []
+
+def resolve_title(mention: str) -> dict | None:
+    catalog = get_catalog()
+    return catalog.resolve_title(mention) if catalog else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline index of the Project Gutenberg catalog.")
+    parser.add_argument("csv_path", nargs="?", help="pg_catalog.csv from gutenberg.org/cache/epub/feeds/")
+    parser.add_argument("--download", action="store_true", help="Download the current catalog dump first")
+    parser.add_argument("--output", default=CATALOG_PATH)
+    args = parser.parse_args()
+
+    csv_path = args.csv_path
+    if args.download:
+        from mcp_agents.gutenberg_api import GUTENBERG_BASE_URL, http_cache
+        response = http_cache.get(GUTENBERG_BASE_URL + CATALOG_FEED_PATH, timeout=120)
+        response.raise_for_status()
+        csv_path = csv_path or os.path.join(os.path.dirname(args.output), "pg_catalog.csv")
+        os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
+        with open(csv_path, "wb") as f:
+            f.write(response.content)
+    if not csv_path:
+        parser.error("give the path of pg_catalog.csv or --download")
+
+    started = time.perf_counter()
+    entries = read_catalog_csv(csv_path)
+    build_index(entries, args.output)
+    print(f"📚 Indexed {len(entries)} Gutenberg books in {time.perf_counter() - started:.1f}s -> {args.output}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# mcp_agents/http_cache.py
+#
+# On-disk HTTP cache for the Gutenberg fetches. Responses are stored gzipped
+# with their ETag / Last-Modified validators; a cached response younger than
+# `max_age` is served without touching the network, and an older one is
+# revalidated with a conditional request (a 304 costs a few hundred bytes
+# instead of the whole book). Requests to one host are limited to
+# MAX_CONNECTIONS_PER_HOST at a time however many threads download.
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+MAX_CONNECTIONS_PER_HOST = 4
+
+class CachedResponse:
+    """The parts of a `requests.Response` the Gutenberg client uses, for fresh and cached responses alike."""
+
+    def __init__(self, url: str, status_code: int, headers: dict, content: bytes, from_cache: bool):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.from_cache = from_cache
+
+    @property
+    def text(self) -> str:
+        content_type = self.headers.get("Content-Type", "")
+        charset = content_type.split("charset=")[-1].split(";")[0].strip() if "charset=" in content_type else "utf-8"
+        try:
+            return self.content.decode(charset, errors="replace")
+        except LookupError:
+            return self.content.decode("utf-8", errors="replace")
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error for url: {self.url}")
+
+class HttpCache:
+    def __init__(self, session: requests.Session, cache_dir: str, max_connections_per_host: int = MAX_CONNECTIONS_PER_HOST):
+        self.session = session
+        self.cache_dir = cache_dir
+        self.max_connections_per_host = max_connections_per_host
+        self._host_slots = {}
+        self._host_slots_lock = threading.Lock()
+        self._stats = {"fresh_hits": 0, "revalidated": 0, "fetched": 0}
+        self._stats_lock = threading.Lock()
+
+    def _paths(self, url: str) -> tuple[str, str]:
+        base = os.path.join(self.cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest())
+        return base + ".json", base + ".gz"
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._host_slots_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_connections_per_host)
+            return self._host_slots[host]
+
+    def _load(self, url: str) -> tuple[dict, bytes] | None:
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                content = gzip.decompress(f.read())
+        except (OSError, ValueError, EOFError):
+            return None
+        if meta.get("sha256") != hashlib.sha256(content).hexdigest():
+            return None  # The body of another response (two sessions stored this URL at once)
+        return meta, content
+
+    def _write_atomic(self, path: str, data: bytes):
+        # A unique temporary file per writer, so concurrent stores of one URL don't collide
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _store(self, url: str, meta: dict, content: bytes | None = None):
+        """Stores a response; a failed write only costs the cache entry, never the response."""
+        meta_path, body_path = self._paths(url)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            if content is not None:
+                meta = dict(meta, sha256=hashlib.sha256(content).hexdigest())
+                self._write_atomic(body_path, gzip.compress(content, compresslevel=6))
+            # Written last; the digest tells _load whether the body on disk is this response's
+            self._write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+        except OSError as e:
+            print(f"[!] Could not cache {url}: {e}")
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def get(self, url: str, max_age: float | None = None, timeout: float = 10) -> CachedResponse:
+        """
+        GETs `url` through the cache. A cached copy fetched less than `max_age`
+        seconds ago is returned as is; otherwise it is revalidated. Only 200
+        responses are cached. Network errors propagate as `requests` exceptions.
+        """
+        cached = self._load(url)
+        if cached:
+            meta, content = cached
+            if max_age is not None and time.time() - meta["fetched"] < max_age:
+                self._count("fresh_hits")
+                return CachedResponse(url, 200, meta["headers"], content, from_cache=True)
+
+        headers = {}
+        if cached and cached[0]["headers"].get("ETag"):
+            headers["If-None-Match"] = cached[0]["headers"]["ETag"]
+        if cached and cached[0]["headers"].get("Last-Modified"):
+            headers["If-Modified-Since"] = cached[0]["headers"]["Last-Modified"]
+        with self._host_slot(url):
+            response = self.session.get(url, headers=headers, timeout=timeout)
+
+        if response.status_code == 304 and cached:
+            meta, content = cached
+            meta["fetched"] = time.time()
+            self._store(url, meta)
+            self._count("revalidated")
+            return CachedResponse(url, 200, meta["headers"], content, from_cache=True)
+
+        self._count("fetched")
+        kept_headers = {name: response.headers[name] for name in ("Content-Type", "ETag", "Last-Modified")
+                        if name in response.headers}
+        if response.status_code == 200:
+            self._store(url, {"url": url, "fetched": time.time(), "headers": kept_headers}, response.content)
+        return CachedResponse(url, response.status_code, kept_headers, response.content, from_cache=False)
@@ -0,0 +1,284 @@
+# mcp_agents/intent_engine.py
+
+import difflib
+import os
+import re
+import threading
+
+import numpy as np
+
+from mcp_agents import gutenberg_catalog, vector_store
+from mcp_agents.chunker import parse_number
+
+RULES_CONFIDENCE_THRESHOLD = 0.75
+EMBEDDING_MIN_SIMILARITY = 0.45
+EMBEDDING_MIN_MARGIN = 0.08
+FUZZY_TITLE_THRESHOLD = 0.85
+
+SUMMARY_RE = re.compile(r"\b(summar(y|ies|i[sz]e|i[sz]ing)|synopsis|overview|recap|tl;?dr|gist|what('s| is) (it|this book|the book|the story) about)\b", re.I)
+CONTINUATION_RE = re.compile(r"\b(continu(e|ation)|what happens next|what comes next|next (part|chapter|scene)|keep going|go on|carry on|write more|resume)\b", re.I)
+QUESTION_RE = re.compile(r"^\s*(who|whom|whose|what|which|when|where|why|how|is|are|was|were|does|do|did|can|could|tell me|explain|describe)\b|\?\s*$", re.I)
+SWITCH_RE = re.compile(r"\b(switch|change|move)\s+(to|over to|books?)\b|\binstead\b|\banother book\b", re.I)
+# Capitalized phrases after these words are probably book titles, e.g. "summarize Moby Dick"
+TITLE_MENTION_RE = re.compile(r"\b(?:in|from|about|[Ss]ummari[sz]e|[Cc]ontinue|[Rr]ead)\s+((?:[A-Z][\w'’-]*)(?:\s+(?:of|and|the|in|a|an|[A-Z][\w'’-]*))*)")
+# Mentions that ask for a book itself; "what happened in Paris" may just name a place
+TITLE_REQUEST_RE = re.compile(r"\b(?:[Ss]ummari[sz]e|[Rr]ead)\s+((?:[A-Z][\w'’-]*)(?:\s+(?:of|and|the|in|a|an|[A-Z][\w'’-]*))*)")
+# Quoted or capitalized phrases: a title named explicitly, unlike "persuasion" as an ordinary word
+QUOTED_RE = re.compile(r"[\"“”]([^\"“”]{3,})[\"“”]|(?:^|\s)'([^']{3,})'")
+# "Chapter III", "Part Two": a section of the current book, not a title
+SECTION_MENTION_RE = re.compile(r"^(?:Chapter|Part|Book|Volume|Stave|Act)\s+(\w+)")
+CAPITALIZED_PHRASE_RE = re.compile(r"\b[A-Z][\w'’-]*(?:\s+(?:of|and|the|in|a|an|[A-Z][\w'’-]*))*")
+AMBIGUOUS_TITLE_CONFIDENCE = 0.5  # a title word without a switch cue; a later tier decides
+_ARTICLES = ("the ", "a ", "an ")
+
+# Example requests whose embeddings form one centroid per intent
+INTENT_PROTOTYPES = {
+    "summary": [
+        "summarize the book", "give me a summary", "what is this book about",
+        "an overview of the story", "recap the plot for me",
+    ],
+    "continuation": [
+        "continue the story", "what happens next", "write the next part of the story",
+        "keep going with the story", "go on from where it stopped",
+    ],
+    "question": [
+        "who is the main character", "why did he leave the house", "where does the story take place",
+        "what does she think about him", "how does the book end",
+    ],
+}
+
+def _normalize(text: str) -> str:
+    text = re.sub(r"['’]", "", text.lower())  # "Alice's" -> "alices", like the downloaded file names
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+def _strip_article(text: str) -> str:
+    for article in _ARTICLES:
+        if text.startswith(article):
+            return text[len(article):]
+    return text
+
+class LocalCatalog:
+    """Titles of the books available locally (downloaded files and ingested manifests)."""
+
+    def __init__(self, data_dir: str, manifest_dir: str):
+        self.data_dir = data_dir
+        self.manifest_dir = manifest_dir
+        self._signature = None
+        self._aliases = []  # (normalized alias, display title)
+        self._lock = threading.Lock()
+
+    def _listing(self, directory):
+        try:
+            return sorted(os.listdir(directory))
+        except OSError:
+            return []
+
+    def _read_title(self, path: str) -> str:
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                header = f.read(4096)
+        except OSError:
+            header = ""
+        return vector_store.extract_gutenberg_title(header) or os.path.splitext(os.path.basename(path))[0].replace("_", " ")
+
+    def _refresh(self):
+        data_files = [name for name in self._listing(self.data_dir) if name.endswith(".txt")]
+        manifest_files = [name for name in self._listing(self.manifest_dir) if name.endswith(".json")]
+        signature = (tuple(data_files), tuple(manifest_files))
+        if signature == self._signature:
+            return
+
+        titles = {self._read_title(os.path.join(self.data_dir, name)) for name in data_files}
+        for name in manifest_files:
+            manifest = vector_store.load_manifest_file(os.path.join(self.manifest_dir, name))
+            if manifest:
+                titles.add(manifest["title"])
+
+        aliases = set()
+        for title in titles:
+            normalized = _normalize(title)
+            for alias in (normalized, _strip_article(normalized), _normalize(re.split(r"[;:(]", title)[0])):
+                alias = _strip_article(alias) if len(alias.split()) > 2 else alias
+                if len(alias) >= 4:
+                    aliases.add((alias, title))
+        # Longest aliases first, so "pride and prejudice" wins over shorter overlapping titles
+        self._aliases = sorted(aliases, key=lambda item: -len(item[0]))
+        self._signature = signature
+
+    def match(self, user_input: str):
+        """Returns `(title, score)` for the catalog title mentioned in the input, or None."""
+        with self._lock:
+            self._refresh()
+            aliases = self._aliases
+        text = f" {_normalize(user_input)} "
+        for alias, title in aliases:
+            if f" {alias} " in text:
+                return title, 1.0
+
+        words = text.split()
+        best = None
+        for alias, title in aliases:
+            matcher = difflib.SequenceMatcher(None, b=alias)  # The alias side is preprocessed once
+            size = len(alias.split())
+            for width in {max(1, size - 1), size, size + 1}:
+                for i in range(len(words) - width + 1):
+                    matcher.set_seq1(" ".join(words[i:i + width]))
+                    # Cheap upper bounds first, the full ratio only for plausible windows
+                    if matcher.real_quick_ratio() < FUZZY_TITLE_THRESHOLD or matcher.quick_ratio() < FUZZY_TITLE_THRESHOLD:
+                        continue
+                    score = matcher.ratio()
+                    if score >= FUZZY_TITLE_THRESHOLD and (best is None or score > best[1]):
+                        best = (title, score)
+        return best
+
+catalog = LocalCatalog(vector_store.DATA_DIR, vector_store.MANIFEST_DIR)
+
+def _same_title(a: str | None, b: str | None) -> bool:
+    if not a or not b:
+        return False
+    a, b = _normalize(a), _normalize(b)
+    return a in b or b in a or difflib.SequenceMatcher(None, a, b).ratio() >= FUZZY_TITLE_THRESHOLD
+
+def _names_title(user_input: str, title: str) -> bool:
+    """True if the input names `title` explicitly, in quotes or as a capitalized phrase."""
+    wanted = _strip_article(_normalize(title))
+    phrases = [a or b for a, b in QUOTED_RE.findall(user_input)] + CAPITALIZED_PHRASE_RE.findall(user_input)
+    for phrase in phrases:
+        words = _normalize(phrase).split()
+        if f" {wanted} " in f" {' '.join(words)} ":
+            return True
+        # Also without the first word, which may just start the sentence ("Summarize Dracul")
+        for candidate in {_strip_article(" ".join(words)), _strip_article(" ".join(words[1:]))}:
+            if candidate and difflib.SequenceMatcher(None, candidate, wanted).ratio() >= FUZZY_TITLE_THRESHOLD:
+                return True
+    return False
+
+def _unresolved_titles(user_input: str, matched_title: str | None, current_title: str | None) -> list[str]:
+    """Phrases in the input that seem to name a book that is neither the current nor a known local one."""
+    mentions = []
+    for mention in TITLE_MENTION_RE.findall(user_input):
+        if mention in ("I", "Chapter") or len(mention) < 3:
+            continue
+        section = SECTION_MENTION_RE.match(mention)
+        if section and parse_number(section.group(1)) is not None:
+            continue
+        if _same_title(mention, current_title) or _same_title(mention, matched_title):
+            continue
+        mentions.append(mention)
+    return mentions
+
+def _catalog_candidates(user_input: str, mentions: list[str], current_title: str | None) -> list[str]:
+    """
+    The mentions worth resolving through the offline Gutenberg catalog: with a
+    switch cue every capitalized phrase ("switch to Moby Dick"), otherwise only
+    titles asked for by name ("summarize Moby Dick").
+    """
+    if not SWITCH_RE.search(user_input):
+        return _requested_titles(user_input, mentions)
+    candidates = list(mentions)
+    for match in CAPITALIZED_PHRASE_RE.finditer(user_input):
+        phrase = match.group(0)
+        if match.start() == 0 or user_input[:match.start()].rstrip().endswith((".", "!", "?")):
+            phrase = phrase.partition(" ")[2]  # The first word is capitalized because it starts the sentence
+        if len(phrase) >= 3 and phrase not in candidates and not _same_title(phrase, current_title):
+            candidates.append(phrase)
+    return candidates
+
+def _requested_titles(user_input: str, mentions: list[str]) -> list[str]:
+    """The mentions asked for by name ("summarize Moby Dick"), unlike places and people ("what happened in London")."""
+    requested = set(TITLE_REQUEST_RE.findall(user_input))
+    return [mention for mention in mentions if mention in requested]
+
+def _needs_title_extraction(user_input: str, mentions: list[str], current_title: str | None) -> bool:
+    """
+    True if the input probably asks for a book the cheap tiers couldn't
+    resolve: with a switch cue, a title asked for by name, or any mention
+    while no book is selected. Only the LLM can extract it then.
+    """
+    if SWITCH_RE.search(user_input) or _requested_titles(user_input, mentions):
+        return True
+    return bool(mentions) and current_title is None
+
+def classify_with_rules(user_input: str, current_title: str | None) -> dict:
+    """Tier 1: compiled keyword/regex patterns plus a fuzzy match against the local catalog."""
+    title_match = catalog.match(user_input)
+    matched_title = title_match[0] if title_match else None
+    result = {"intent": "question", "title": None, "tier": "rules", "confidence": 0.0}
+
+    if matched_title and not _same_title(matched_title, current_title):
+        explicit = SWITCH_RE.search(user_input) or _names_title(user_input, matched_title)
+        # "does Elizabeth feel any persuasion?" is about the current book, not a request for "Persuasion"
+        result.update(intent="switch_book", title=matched_title,
+                      confidence=title_match[1] * 0.95 if explicit else AMBIGUOUS_TITLE_CONFIDENCE)
+        return result
+    mentions = _unresolved_titles(user_input, matched_title, current_title)
+    for mention in _catalog_candidates(user_input, mentions, current_title):
+        # Not downloaded yet, but maybe in the offline Gutenberg catalog
+        book = gutenberg_catalog.resolve_title(mention)
+        if book and not _same_title(book["title"], current_title):
+            result.update(intent="switch_book", title=book["title"], gutenberg_id=book["gutenberg_id"],
+                          confidence=book["similarity"] * 0.9)
+            return result
+    if _needs_title_extraction(user_input, mentions, current_title):
+        return result  # A title we can't resolve locally; let a later tier extract it
+
+    matched = [intent for intent, pattern in (("summary", SUMMARY_RE), ("continuation", CONTINUATION_RE))
+               if pattern.search(user_input)]
+    if len(matched) == 1:
+        result.update(intent=matched[0], confidence=0.9)
+    elif not matched and QUESTION_RE.search(user_input):
+        result.update(intent="question", confidence=0.8)
+    return result
+
+_centroids = None
+_centroids_lock = threading.Lock()
+
+def _get_centroids():
+    global _centroids
+    if _centroids is None:
+        with _centroids_lock:
+            if _centroids is None:
+                model = vector_store.get_embedding_model()
+                labels = list(INTENT_PROTOTYPES)
+                rows = []
+                for label in labels:
+                    vectors = model.encode(INTENT_PROTOTYPES[label], normalize_embeddings=True)
+                    centroid = vectors.mean(axis=0)
+                    rows.append(centroid / np.linalg.norm(centroid))
+                _centroids = (labels, np.stack(rows))
+    return _centroids
+
+def classify_with_embeddings(user_input: str) -> dict | None:
+    """
+    Tier 2: nearest intent centroid using the MiniLM embedding model.
+    Only runs when the model is already loaded, so it never pays the load time itself.
+    """
+    if not vector_store.is_embedding_model_loaded():
+        return None
+    labels, centroids = _get_centroids()
+    vector = np.asarray(vector_store.encode_query(user_input), dtype=np.float32)
+    similarities = centroids @ (vector / np.linalg.norm(vector))
+    order = np.argsort(similarities)[::-1]
+    best, runner_up = similarities[order[0]], similarities[order[1]]
+    confident = best >= EMBEDDING_MIN_SIMILARITY and best - runner_up >= EMBEDDING_MIN_MARGIN
+    return {
+        "intent": labels[order[0]],
+        "title": None,
+        "tier": "embedding",
+        "confidence": float(best) if confident else 0.0,
+    }
+
+def classify_fast(user_input: str, current_title: str | None) -> dict | None:
+    """
+    Runs the cheap tiers in order and returns the first confident result,
+    or None when the LLM has to decide.
+    """
+    result = classify_with_rules(user_input, current_title)
+    if result["confidence"] >= RULES_CONFIDENCE_THRESHOLD:
+        return result
+    if _needs_title_extraction(user_input, _unresolved_titles(user_input, None, current_title), current_title):
+        return None  # Only the LLM can extract an unknown title
+    result = classify_with_embeddings(user_input)
+    if result and result["confidence"] > 0:
+        return result
+    return None
@@ -0,0 +1,40 @@
+# mcp_agents/lazy.py
+
+import threading
+
+class LazyResource:
+    """
+    Thread-safe holder for an expensive object (a model, a DB client) that is
+    only built on first use. `prewarm()` starts loading it in a background
+    thread so the first real request does not pay the load time.
+    """
+
+    def __init__(self, name: str, loader):
+        self.name = name
+        self._loader = loader
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._loaded:  # Fast path once loaded, no locking
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                print(f"⏳ Loading {self.name}...")
+                self._value = self._loader()
+                self._loaded = True
+        return self._value
+
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    def prewarm(self) -> threading.Thread:
+        def _load():
+            try:
+                self.get()
+            except Exception as e:
+                print(f"[!] Background loading of {self.name} failed: {e}")
+        thread = threading.Thread(target=_load, name=f"prewarm-{self.name}", daemon=True)
+        thread.start()
+        return thread
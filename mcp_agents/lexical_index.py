@@ -0,0 +1,132 @@
+# mcp_agents/lexical_index.py
+#
+# BM25 index over the chunks of one book, built during ingestion from the same
+# chunks that are embedded and stored next to the book's manifest. Postings are
+# flat numpy arrays (term offsets, chunk indexes, term frequencies), so a query
+# is one binary search over the vocabulary plus one vectorized score update per
+# query term, and names and rare words that MiniLM embeds poorly still match.
+
+import os
+import re
+import threading
+from array import array
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+LEXICAL_INDEX_VERSION = 2  # version 1 stored chapter numbers, which repeat across parts
+BM25_K1 = 1.2
+BM25_B = 0.75
+LOADED_INDEXES = 32  # per-book indexes kept in memory
+TOKEN_RE = re.compile(r"[^\W_]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from had has have he her him his i in is it its me my no not of on or "
+    "she so that the their them then there they this to was we were what when where which who whom why will "
+    "with you your".split())
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased words without stopwords or one-letter tokens ("Raskolnikov's" -> "raskolnikov")."""
+    return [token for token in TOKEN_RE.findall(text.lower()) if len(token) > 1 and token not in STOPWORDS]
+
+class LexicalIndexBuilder:
+    """Collects the postings of a book's chunks, in chunk order, and saves them as one .npz file."""
+
+    def __init__(self):
+        self.postings = {}  # term -> (chunk indexes, term frequencies)
+        self.lengths = array("i")
+        self.chapters = array("i")
+
+    def add(self, text: str, chapter: int = -1):
+        index = len(self.lengths)
+        counts = Counter(tokenize(text))
+        for term, frequency in counts.items():
+            chunks, frequencies = self.postings.setdefault(term, (array("i"), array("i")))
+            chunks.append(index)
+            frequencies.append(frequency)
+        self.lengths.append(sum(counts.values()))
+        self.chapters.append(chapter)
+
+    def save(self, path: str):
+        terms = sorted(self.postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(self.postings[term][0]) for term in terms], out=offsets[1:])
+        chunks = np.zeros(int(offsets[-1]), dtype=np.int32)
+        frequencies = np.zeros(int(offsets[-1]), dtype=np.uint16)
+        for term, start, end in zip(terms, offsets[:-1], offsets[1:]):
+            term_chunks, term_frequencies = self.postings[term]
+            chunks[start:end] = term_chunks
+            frequencies[start:end] = np.minimum(term_frequencies, np.iinfo(np.uint16).max)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, version=LEXICAL_INDEX_VERSION, terms=np.array(terms, dtype=str), offsets=offsets,
+                     chunks=chunks, frequencies=frequencies, lengths=np.frombuffer(self.lengths, dtype=np.int32),
+                     chapters=np.frombuffer(self.chapters, dtype=np.int32))
+        os.replace(tmp_path, path)
+
+class LexicalIndex:
+    """A loaded BM25 index; `search` returns `(chunk index, score)` pairs, best first."""
+
+    def __init__(self, arrays):
+        self.terms = arrays["terms"]
+        self.offsets = arrays["offsets"]
+        self.chunks = arrays["chunks"]
+        self.frequencies = arrays["frequencies"].astype(np.float32)
+        self.chapters = arrays["chapters"]
+        lengths = arrays["lengths"].astype(np.float32)
+        chunk_count = len(lengths)
+        document_frequency = np.diff(self.offsets)
+        self.idf = np.log1p((chunk_count - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        average_length = lengths.mean() if chunk_count else 1.0
+        # The per-chunk part of the BM25 denominator, computed once
+        self.length_norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(average_length, 1.0))
+
+    def search(self, query: str, top_k: int, chapters: list[int] | None = None) -> list[tuple[int, float]]:
+        terms = np.array(sorted(set(tokenize(query))), dtype=str)
+        if not len(terms) or not len(self.terms):
+            return []
+        positions = np.searchsorted(self.terms, terms)
+        found = positions < len(self.terms)
+        found[found] = self.terms[positions[found]] == terms[found]
+        scores = np.zeros(len(self.length_norm), dtype=np.float32)
+        for position in positions[found]:
+            start, end = self.offsets[position], self.offsets[position + 1]
+            chunks, frequencies = self.chunks[start:end], self.frequencies[start:end]
+            scores[chunks] += self.idf[position] * frequencies * (BM25_K1 + 1) / (frequencies + self.length_norm[chunks])
+        if chapters is not None:
+            scores[~np.isin(self.chapters, chapters)] = 0
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(int(i), float(scores[i])) for i in hits]
+
+# Loaded indexes by path, least recently used first; reloaded when the file changes
+_loaded = OrderedDict()
+_loaded_lock = threading.Lock()
+
+def load_index(path: str) -> LexicalIndex | None:
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    with _loaded_lock:
+        cached = _loaded.get(path)
+        if cached and cached[0] == mtime:
+            _loaded.move_to_end(path)
+            return cached[1]
+    try:
+        with np.load(path) as arrays:
+            if int(arrays["version"]) != LEXICAL_INDEX_VERSION:
+                return None
+            index = LexicalIndex(arrays)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[!] Could not load the lexical index {path}: {e}")
+        return None
+    with _loaded_lock:
+        _loaded[path] = (mtime, index)
+        _loaded.move_to_end(path)
+        while len(_loaded) > LOADED_INDEXES:
+            _loaded.popitem(last=False)
+    return index
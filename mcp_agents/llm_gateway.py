@@ -1,23 +1,92 @@
-from llama_cpp import Llama
+import os
+from typing import Iterator
+from mcp_agents.lazy import LazyResource
+from mcp_agents.llm_scheduler import LLMScheduler, PRIORITY_ANSWER, PRIORITY_INTERACTIVE
 
-llm = Llama(model_path="models/capybarahermes-2.5-mistral-7b.Q4_K_M.gguf", n_ctx=2048)
+LLM_MODEL_PATH = "models/capybarahermes-2.5-mistral-7b.Q4_K_M.gguf"
+LLM_CONTEXT_WINDOW = 2048
+LLM_MAX_TOKENS = 500
+LLM_TEMPERATURE = 0.7
+LLM_POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", "1"))  # model instances serving requests in parallel
+LLM_MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", "32"))  # waiting requests before new ones are rejected
+LLM_REQUEST_TIMEOUT = 300  # seconds from submission until a request is abandoned
 
-def call_llm(prompt: str) -> str:
-    response = llm.create_chat_completion(
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7,
-        max_tokens=500
+def _load_llm():
+    from llama_cpp import Llama
+    return Llama(model_path=LLM_MODEL_PATH, n_ctx=LLM_CONTEXT_WINDOW)
+
+_llm_loader = _load_llm
+
+# The llama.cpp model is loaded on first use (or in the background via prewarm())
+_llm = LazyResource("LLM", lambda: _llm_loader())
+
+def use_llm_loader(loader):
+    """
+    Replaces how model instances are created, e.g. with a deterministic stub for
+    offline benchmarks. Must be called before the LLM is first used.
+    """
+    global _llm_loader
+    if _llm.is_loaded():
+        raise RuntimeError("The LLM is already loaded; call use_llm_loader() before first use.")
+    _llm_loader = loader
+
+def get_llm():
+    return _llm.get()
+
+def prewarm():
+    """Starts loading the LLM in the background."""
+    return _llm.prewarm()
+
+def count_tokens(text: str) -> int:
+    """Number of tokens `text` takes up in the model's context window."""
+    return len(get_llm().tokenize(text.encode("utf-8"), add_bos=False))
+
+def _model_for_worker(worker_index: int):
+    # The first worker shares the lazily loaded model; extra workers get their own instances
+    return get_llm() if worker_index == 0 else _llm_loader()
+
+# All generations go through one scheduler, so concurrent sessions never share a model instance
+scheduler = LLMScheduler(_model_for_worker, pool_size=LLM_POOL_SIZE, max_queue=LLM_MAX_QUEUE)
+
+def _submit(prompt: str, priority: int, timeout: float | None):
+    return scheduler.submit(
+        [{"role": "user", "content": prompt}],
+        priority=priority,
+        timeout=timeout,
+        temperature=LLM_TEMPERATURE,
+        max_tokens=LLM_MAX_TOKENS
     )
-    return response["choices"][0]["message"]["content"].strip()
+
+def call_llm(prompt: str, priority: int = PRIORITY_ANSWER, timeout: float | None = LLM_REQUEST_TIMEOUT) -> str:
+    return _submit(prompt, priority, timeout).result().strip()
+
+def stream_llm(prompt: str, priority: int = PRIORITY_ANSWER, timeout: float | None = LLM_REQUEST_TIMEOUT) -> Iterator[str]:
+    """
+    Like call_llm, but yields the answer piece by piece as llama.cpp generates it.
+    Leading whitespace is dropped, matching the stripped output of call_llm.
+    Closing the iterator early cancels the generation.
+    """
+    request = _submit(prompt, priority, timeout)
+    started = False
+    try:
+        for token in request:
+            if not started:
+                token = token.lstrip()
+                if not token:
+                    continue
+                started = True
+            yield token
+    finally:
+        request.cancel()  # No-op once finished; stops generation if the consumer went away
 
 def call_llm_for_title_extraction(user_input: str) -> str:
     prompt = f"What is the book title mentioned here: '{user_input}'? Only return the book name. If none, say 'None'."
-    response = call_llm(prompt)
+    response = call_llm(prompt, priority=PRIORITY_INTERACTIVE)
     return response.strip() if response else None
 
 def call_llm_for_intent_classification(user_input: str) -> str:
     prompt = f"""Classify the user's intent in this message: '{user_input}'
 Your answer must be one of: question, summary, continue, unknown.
 Only return one word."""
-    response = call_llm(prompt)
+    response = call_llm(prompt, priority=PRIORITY_INTERACTIVE)
     return response.strip().lower() if response else "unknown"
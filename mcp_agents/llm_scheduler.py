@@ -0,0 +1,186 @@
+# mcp_agents/llm_scheduler.py
+
+import itertools
+import queue
+import threading
+import time
+
+# Lower numbers are served first
+PRIORITY_INTERACTIVE = 0  # short classification / extraction calls
+PRIORITY_ANSWER = 1       # question answering
+PRIORITY_LONG = 2         # summaries and story continuations
+PRIORITY_BACKGROUND = 3   # precomputation nobody is waiting for
+
+_DONE = object()
+
+class LLMSchedulerError(Exception):
+    pass
+
+class SchedulerQueueFull(LLMSchedulerError):
+    pass
+
+class RequestDeadlineExceeded(LLMSchedulerError):
+    pass
+
+class RequestCancelled(LLMSchedulerError):
+    pass
+
+class RequestPreempted(LLMSchedulerError):
+    pass
+
+class LLMRequest:
+    """
+    Handle for one queued chat completion. Iterate over it to receive tokens as
+    they are generated, or call result() for the whole answer.
+    """
+
+    def __init__(self, messages: list[dict], params: dict, priority: int, deadline: float | None):
+        self.messages = messages
+        self.params = params
+        self.priority = priority
+        self.deadline = deadline
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self._tokens = queue.Queue()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Stops the request; a running generation stops at the next token."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    def __iter__(self):
+        while True:
+            timeout = None if self.deadline is None else max(self.deadline - time.monotonic(), 0) + 1
+            try:
+                item = self._tokens.get(timeout=timeout)
+            except queue.Empty:
+                self.cancel()
+                raise RequestDeadlineExceeded("LLM request exceeded its deadline while waiting for tokens.")
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def result(self) -> str:
+        return "".join(self)
+
+class LLMScheduler:
+    """
+    Serves chat completions from a bounded pool of model instances.
+
+    Requests wait in a priority queue (FIFO within a priority), so cheap
+    interactive calls overtake long generations. Each worker thread owns one
+    model instance, created by `model_factory(worker_index)` on first use.
+    When `max_queue` requests are already waiting, new ones are rejected with
+    SchedulerQueueFull instead of piling up. A background request that is
+    generating stops with RequestPreempted as soon as a more urgent request is
+    waiting for a model instance; its caller submits it again.
+    """
+
+    def __init__(self, model_factory, pool_size: int = 1, max_queue: int = 32):
+        self.model_factory = model_factory
+        self.pool_size = pool_size
+        self.max_queue = max_queue
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._waiting = 0
+        self._active = 0
+        self._urgent_waiting = 0  # waiting requests that preempt background generations
+        self._counters = {"completed": 0, "failed": 0, "rejected": 0, "cancelled": 0, "expired": 0, "preempted": 0}
+        self._wait_times = {}  # priority -> (count, total seconds waited in the queue)
+
+    def _start_workers(self):
+        with self._lock:
+            if self._workers:
+                return
+            for index in range(self.pool_size):
+                worker = threading.Thread(target=self._run_worker, args=(index,), name=f"llm-worker-{index}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, messages: list[dict], priority: int = PRIORITY_ANSWER, timeout: float | None = None, **params) -> LLMRequest:
+        """Queues a chat completion; `timeout` (seconds) sets the request's deadline."""
+        self._start_workers()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        request = LLMRequest(messages, params, priority, deadline)
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                self._counters["rejected"] += 1
+                raise SchedulerQueueFull(f"The LLM is busy ({self._waiting} requests waiting). Please try again shortly.")
+            self._waiting += 1
+            self._urgent_waiting += priority < PRIORITY_BACKGROUND
+        self._queue.put((priority, next(self._sequence), request))
+        return request
+
+    def _finish(self, counter: str):
+        with self._lock:
+            self._active -= 1
+            self._counters[counter] += 1
+
+    def _run_worker(self, index: int):
+        model = None
+        while True:
+            _, _, request = self._queue.get()
+            with self._lock:
+                self._waiting -= 1
+                self._urgent_waiting -= request.priority < PRIORITY_BACKGROUND
+                self._active += 1
+                count, total = self._wait_times.get(request.priority, (0, 0.0))
+                self._wait_times[request.priority] = (count + 1, total + time.monotonic() - request.submitted_at)
+
+            if request.cancelled:
+                request._tokens.put(RequestCancelled("LLM request was cancelled."))
+                self._finish("cancelled")
+                continue
+            if request.expired():
+                request._tokens.put(RequestDeadlineExceeded("LLM request exceeded its deadline while queued."))
+                self._finish("expired")
+                continue
+
+            request.started_at = time.monotonic()
+            outcome = "completed"
+            preemptible = request.priority >= PRIORITY_BACKGROUND
+            try:
+                if model is None:
+                    model = self.model_factory(index)
+                stream = model.create_chat_completion(messages=request.messages, stream=True, **request.params)
+                for chunk in stream:
+                    if request.cancelled or request.expired() or (preemptible and self._urgent_waiting):
+                        outcome = "cancelled" if request.cancelled else "expired" if request.expired() else "preempted"
+                        stream.close()  # Stops llama.cpp from generating further tokens
+                        break
+                    token = chunk["choices"][0]["delta"].get("content")
+                    if token:
+                        request._tokens.put(token)
+                if outcome == "expired":
+                    request._tokens.put(RequestDeadlineExceeded("LLM request exceeded its deadline during generation."))
+                elif outcome == "preempted":
+                    request._tokens.put(RequestPreempted("Background LLM request gave way to an interactive one."))
+                request._tokens.put(_DONE)
+            except Exception as e:
+                outcome = "failed"
+                request._tokens.put(e)
+            self._finish(outcome)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pool_size": self.pool_size,
+                "waiting": self._waiting,
+                "active": self._active,
+                "max_queue": self.max_queue,
+                **self._counters,
+                "avg_wait_seconds": {
+                    priority: total / count for priority, (count, total) in sorted(self._wait_times.items())
+                },
+            }
@@ -2,6 +2,8 @@
 
 import json
 from mcp_agents.llm_gateway import call_llm
+from mcp_agents.llm_scheduler import PRIORITY_INTERACTIVE
+from mcp_agents.intent_engine import classify_fast
 
 def build_summary_prompt(title: str, text_content: str) -> str:
     """
@@ -21,6 +23,38 @@ Summary:
 """
 
 
+def build_passage_summary_prompt(title: str, passage: str) -> str:
+    """
+    Build a prompt for summarizing one consecutive passage of a book
+    (the leaves of the summary tree).
+    """
+    return f"""You are a helpful assistant that summarizes books.
+Summarize the following passage from the book '{title}' in a few sentences. Keep the names of characters and places, and the events in the order they happen.
+
+--- Begin Passage ---
+{passage}
+--- End Passage ---
+
+Summary:
+"""
+
+
+def build_combine_summaries_prompt(title: str, section: str, summaries: str) -> str:
+    """
+    Build a prompt that merges consecutive summaries into one summary of `section`
+    (e.g. "Chapter III" or "the whole book").
+    """
+    return f"""You are a helpful assistant that summarizes books.
+Below are summaries of consecutive parts of {section} of the book '{title}', in order. Combine them into one concise summary of {section}. Focus on the main plot, key characters, and overarching themes.
+
+--- Begin Summaries ---
+{summaries}
+--- End Summaries ---
+
+Summary:
+"""
+
+
 def build_continuation_prompt(title: str, last_chunk: str) -> str:
     """
     Build a prompt for story continuation based on the last paragraph.
@@ -59,6 +93,57 @@ def parse_intent_and_title(user_input: str, current_book_title: str = None) -> d
     # DEBUG PRINT AT START OF FUNCTION
     print(f"DEBUG PROMPT: parse_intent_and_title called with current_book_title: '{current_book_title}'")
 
+    # Cheap tiers first (regex rules + local catalog, then embedding centroids); the LLM is the last resort
+    result = classify_fast(user_input, current_book_title)
+    if result is None:
+        result = _parse_intent_and_title_with_llm(user_input, current_book_title)
+        result["tier"] = "llm"
+    print(f"DEBUG PROMPT: intent '{result.get('intent')}' decided by the {result['tier']} tier")
+
+    # Basic validation
+    valid_intents = ("question", "summary", "continuation", "switch_book")
+    if result.get("intent") not in valid_intents:
+        result["intent"] = "question" # Default to question if intent is unknown
+
+    # --- MODIFICATION START ---
+    # Retrieve the title, if it's None, set it to an empty string before calling .lower()
+    raw_extracted_title = result.get("title")
+    extracted_title_lower = ""
+    if raw_extracted_title is not None:
+        extracted_title_lower = str(raw_extracted_title).lower().strip()
+    # --- MODIFICATION END ---
+
+    # THIS LINE IS CRITICAL - ENSURE IT HAS THE GUARD
+    current_book_title_lower = (current_book_title.lower().strip() if current_book_title else '')
+
+    # Calculate is_same_book_by_contains unconditionally if there's an extracted title
+    is_same_book_by_contains = False # Initialize to False
+    if extracted_title_lower: # Now extracted_title_lower is guaranteed to be a string
+        is_same_book_by_contains = (extracted_title_lower in current_book_title_lower) or \
+                                   (current_book_title_lower and current_book_title_lower in extracted_title_lower)
+    
+    # Force 'switch_book' intent if a genuinely new/different title is detected by string comparison
+    if extracted_title_lower and not is_same_book_by_contains:
+        if result["intent"] != "switch_book":
+            print(f"Debug: Forcing 'switch_book' intent for new title '{result['title']}' vs current '{current_book_title}'")
+            result["intent"] = "switch_book"
+    
+    # If the LLM returned a title that IS the current book (or similar variant), set it to None
+    # This prevents `orchestrate_request` from trying to switch to the same book.
+    # This should only happen if the user isn't explicitly trying to switch (intent != "switch_book").
+    if extracted_title_lower and is_same_book_by_contains and result["intent"] != "switch_book":
+        # Keep this logic if you want to explicitly clear the title if it's the same as the current book
+        # and not a switch intent. This makes orchestrator rely on remembered_title.
+        result["title"] = None # Clear the title, as it's not a new book
+
+    # If the intent is switch_book but no title was extracted (e.g., "switch books"), keep title as None
+    if result.get("intent") == "switch_book" and not result.get("title"):
+         result["title"] = None
+
+    return result
+
+
+def _parse_intent_and_title_with_llm(user_input: str, current_book_title: str = None) -> dict:
     prompt = f"""
 You are a helpful assistant that extracts the user's intent and, if a new book is explicitly mentioned, the book title they are asking about.
 
@@ -98,7 +183,7 @@ Output: {{ "intent": "question", "title": null }}
 
 Now analyze the user input and provide only the JSON output.
 """
-    response = call_llm(prompt)
+    response = call_llm(prompt, priority=PRIORITY_INTERACTIVE) # Short call, served ahead of long generations
 
     try:
         start = response.find("{")
@@ -108,45 +193,4 @@ Now analyze the user input and provide only the JSON output.
     except Exception:
         print(f"Warning: Could not parse LLM response to JSON: {response}")
         result = {"intent": "question", "title": None} # Fallback
-
-    # Basic validation
-    valid_intents = ("question", "summary", "continuation", "switch_book")
-    if result.get("intent") not in valid_intents:
-        result["intent"] = "question" # Default to question if intent is unknown
-
-    # --- MODIFICATION START ---
-    # Retrieve the title, if it's None, set it to an empty string before calling .lower()
-    raw_extracted_title = result.get("title")
-    extracted_title_lower = ""
-    if raw_extracted_title is not None:
-        extracted_title_lower = str(raw_extracted_title).lower().strip()
-    # --- MODIFICATION END ---
-
-    # THIS LINE IS CRITICAL - ENSURE IT HAS THE GUARD
-    current_book_title_lower = (current_book_title.lower().strip() if current_book_title else '')
-
-    # Calculate is_same_book_by_contains unconditionally if there's an extracted title
-    is_same_book_by_contains = False # Initialize to False
-    if extracted_title_lower: # Now extracted_title_lower is guaranteed to be a string
-        is_same_book_by_contains = (extracted_title_lower in current_book_title_lower) or \
-                                   (current_book_title_lower and current_book_title_lower in extracted_title_lower)
-    
-    # Force 'switch_book' intent if a genuinely new/different title is detected by string comparison
-    if extracted_title_lower and not is_same_book_by_contains:
-        if result["intent"] != "switch_book":
-            print(f"Debug: Forcing 'switch_book' intent for new title '{result['title']}' vs current '{current_book_title}'")
-            result["intent"] = "switch_book"
-    
-    # If the LLM returned a title that IS the current book (or similar variant), set it to None
-    # This prevents `orchestrate_request` from trying to switch to the same book.
-    # This should only happen if the user isn't explicitly trying to switch (intent != "switch_book").
-    if extracted_title_lower and is_same_book_by_contains and result["intent"] != "switch_book":
-        # Keep this logic if you want to explicitly clear the title if it's the same as the current book
-        # and not a switch intent. This makes orchestrator rely on remembered_title.
-        result["title"] = None # Clear the title, as it's not a new book
-
-    # If the intent is switch_book but no title was extracted (e.g., "switch books"), keep title as None
-    if result.get("intent") == "switch_book" and not result.get("title"):
-         result["title"] = None
-
-    return result
\ No newline at end of file
+    return result
@@ -0,0 +1,113 @@
+# mcp_agents/query_encoder.py
+#
+# Embeds search queries. Repeated queries (the summary query of a book, the same
+# question asked again) are answered from an LRU cache, and queries arriving
+# from several sessions at once are merged into one batched `encode` call: the
+# first query of a batch waits BATCH_WINDOW_SECONDS for others to join.
+
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+QUERY_CACHE_SIZE = 4096
+BATCH_WINDOW_SECONDS = 0.003
+MAX_BATCH_SIZE = 64
+
+def normalize_query(text: str) -> str:
+    # MiniLM's tokenizer lower-cases anyway, so case variants share one embedding
+    return " ".join(text.split()).lower()
+
+class QueryEncoder:
+    """
+    Cached, micro-batched query embeddings. `encode_fn(texts)` returns one
+    vector per text. Cached vectors are read-only and shared between callers.
+    """
+
+    def __init__(self, encode_fn, cache_size: int = QUERY_CACHE_SIZE,
+                 window_seconds: float = BATCH_WINDOW_SECONDS, max_batch_size: int = MAX_BATCH_SIZE):
+        self.encode_fn = encode_fn
+        self.cache_size = cache_size
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._stats = {"hits": 0, "misses": 0, "batches": 0, "batched_queries": 0}
+
+    def encode(self, text: str):
+        return self.encode_many([text])[0]
+
+    def encode_many(self, texts: list[str]) -> list:
+        """Embeddings of several queries; the uncached ones are encoded together with other sessions' queries."""
+        keys = [normalize_query(text) for text in texts]
+        results = [None] * len(keys)
+        futures = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._cache.get(key)
+                if vector is not None:
+                    self._cache.move_to_end(key)
+                    results[i] = vector
+                    self._stats["hits"] += 1
+                else:
+                    self._stats["misses"] += 1
+        for i, key in enumerate(keys):
+            if results[i] is None and key not in futures:
+                futures[key] = Future()
+                self._queue.put((key, futures[key]))
+        if futures:
+            self._ensure_worker()
+        for i, key in enumerate(keys):
+            if results[i] is None:
+                results[i] = futures[key].result()
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            batches = self._stats["batches"]
+            return dict(self._stats, cached=len(self._cache),
+                        mean_batch_size=self._stats["batched_queries"] / batches if batches else 0.0)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="query-encoder", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                # Let queries from other sessions join the batch
+                while len(batch) < self.max_batch_size:
+                    batch.append(self._queue.get(timeout=self.window_seconds))
+            except queue.Empty:
+                pass
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch: list[tuple[str, Future]]):
+        waiting = {}
+        for key, future in batch:
+            waiting.setdefault(key, []).append(future)
+        keys = list(waiting)
+        try:
+            vectors = list(self.encode_fn(keys))  # One array object per row, shared by cache and callers
+        except Exception as e:
+            for futures in waiting.values():
+                for future in futures:
+                    future.set_exception(e)
+            return
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["batched_queries"] += len(batch)
+            for key, vector in zip(keys, vectors):
+                vector.setflags(write=False)
+                self._cache[key] = vector
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        for key, vector in zip(keys, vectors):
+            for future in waiting[key]:
+                future.set_result(vector)
@@ -0,0 +1,100 @@
+# mcp_agents/reranker.py
+#
+# Optional second retrieval stage: query_book over-fetches candidates, a small
+# cross-encoder scores every (query, chunk) pair in one batch on the CPU, and
+# only the best few go into the prompt. Scores are cached per (query, chunk ID),
+# and reranking is skipped when scoring the uncached pairs would take longer
+# than the latency budget (or while the model is still loading).
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from mcp_agents.lazy import LazyResource
+
+RERANKER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_ENABLED = os.environ.get("RERANK_ENABLED", "1") == "1"
+RERANK_CANDIDATES = 20  # hits fetched from query_book before reranking
+RERANK_BUDGET_SECONDS = float(os.environ.get("RERANK_BUDGET_SECONDS", "0.5"))
+RERANK_MAX_LENGTH = 384  # word pieces per (query, chunk) pair; chunks are ~240
+RERANK_CACHE_SIZE = 20_000
+INITIAL_SECONDS_PER_PAIR = 0.01  # until the first batch has been timed
+TIMING_SMOOTHING = 0.2  # weight of the newest batch in the per-pair time estimate
+SKIP_DECAY = 0.9  # the estimate shrinks on every skip, so one slow batch doesn't disable reranking for good
+
+def _load_model():
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(RERANKER_MODEL_NAME, max_length=RERANK_MAX_LENGTH)
+
+_model = LazyResource("reranker model", _load_model)
+_loading = threading.Event()
+
+# Scores keyed by (query, chunk ID, chunk text hash), least recently used first
+_scores = OrderedDict()
+_scores_lock = threading.Lock()
+_seconds_per_pair = INITIAL_SECONDS_PER_PAIR
+_stats = {"reranked": 0, "skipped_budget": 0, "skipped_loading": 0, "cached_pairs": 0, "scored_pairs": 0}
+
+def prewarm():
+    """Starts loading the cross-encoder in the background."""
+    _loading.set()
+    return _model.prewarm()
+
+def stats() -> dict:
+    with _scores_lock:
+        return dict(_stats, seconds_per_pair=_seconds_per_pair, cached_scores=len(_scores))
+
+def rerank(query: str, hits: list[tuple[str, str]], top_k: int,
+           budget_seconds: float = RERANK_BUDGET_SECONDS) -> tuple[list[tuple[str, str]], bool]:
+    """
+    Orders `(chunk_id, chunk)` hits by cross-encoder score and keeps the best
+    `top_k`. Returns `(hits, reranked)`; when reranking is skipped the hits
+    keep their retrieval order.
+    """
+    global _seconds_per_pair
+    keys = [(query, chunk_id, hash(chunk)) for chunk_id, chunk in hits]
+    scores = [None] * len(hits)
+    with _scores_lock:
+        for i, key in enumerate(keys):
+            if key in _scores:
+                _scores.move_to_end(key)
+                scores[i] = _scores[key]
+    todo = [i for i, score in enumerate(scores) if score is None]
+
+    if todo:
+        if not _model.is_loaded():
+            if not _loading.is_set():
+                prewarm()  # Loading takes seconds; later requests get reranked
+            _count("skipped_loading")
+            return hits[:top_k], False
+        with _scores_lock:
+            over_budget = len(todo) * _seconds_per_pair > budget_seconds
+            if over_budget:
+                # Once the decayed estimate fits the budget again, the next batch re-measures the real cost
+                _seconds_per_pair *= SKIP_DECAY
+                _stats["skipped_budget"] += 1
+        if over_budget:
+            return hits[:top_k], False
+
+        started = time.perf_counter()
+        new_scores = _model.get().predict([(query, hits[i][1]) for i in todo], batch_size=len(todo))
+        elapsed = time.perf_counter() - started
+        with _scores_lock:
+            _seconds_per_pair += TIMING_SMOOTHING * (elapsed / len(todo) - _seconds_per_pair)
+            for i, score in zip(todo, new_scores):
+                scores[i] = float(score)
+                _scores[keys[i]] = scores[i]
+            while len(_scores) > RERANK_CACHE_SIZE:
+                _scores.popitem(last=False)
+
+    with _scores_lock:
+        _stats["reranked"] += 1
+        _stats["cached_pairs"] += len(hits) - len(todo)
+        _stats["scored_pairs"] += len(todo)
+    order = sorted(range(len(hits)), key=lambda i: scores[i], reverse=True)
+    return [hits[i] for i in order[:top_k]], True
+
+def _count(name: str):
+    with _scores_lock:
+        _stats[name] += 1
@@ -1,124 +1,689 @@
 # mcp_agents/vector_store.py
 
+import hashlib
+import io
+import json
+import mmap
 import os
-from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.config import Settings
+import re
+import tempfile
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from mcp_agents import chunker, lexical_index
+from mcp_agents.chunker import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, CHUNKER_VERSION
+from mcp_agents.embedding_cache import EmbeddingCache
+from mcp_agents.lazy import LazyResource
+from mcp_agents.query_encoder import QueryEncoder
 # from langchain.text_splitter import RecursiveCharacterTextSplitter # You might need this if you implement more advanced chunking
 
 
-DATA_DIR = "data"
+DATA_DIR = os.environ.get("BOOKS_DATA_DIR", "data")  # overridable, e.g. for benchmarks on a temporary store
+EMBED_BATCH_SIZE = 64  # chunks encoded and written to Chroma per batch
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+MANIFEST_DIR = os.path.join(DATA_DIR, "manifests")
+# Ingestion status recorded in each book's manifest
+STATUS_INGESTING = "ingesting"
+STATUS_COMPLETE = "complete"
+STATUS_FAILED = "failed"
+CHUNK_DIGEST_SIZE = 16
+GUTENBERG_TITLE_RE = re.compile(r"^Title:\s*(.+?)\s*$", re.M)
+GUTENBERG_AUTHOR_RE = re.compile(r"^Author:\s*(.+?)\s*$", re.M)
+HEADER_BYTES = 4096  # the Gutenberg header with the title and author lines
+LIBRARY_OVERFETCH = 4  # chunks fetched per wanted hit, so collapsing per book still fills the results
+# Weights of the dense (embedding) and lexical (BM25) rankings in reciprocal rank fusion
+DENSE_WEIGHT = float(os.environ.get("RETRIEVAL_DENSE_WEIGHT", "1.0"))
+LEXICAL_WEIGHT = float(os.environ.get("RETRIEVAL_LEXICAL_WEIGHT", "1.0"))
+RRF_K = 60  # rank offset damping the difference between the first few ranks
+HYBRID_OVERFETCH = 2  # candidates taken from each ranking per wanted chunk
+FETCH_BATCH = 256
 
 def get_book_path(title):
     filename = title.lower().replace(" ", "_").replace(":", "").replace("'", "").replace(",", "") + ".txt"
     return os.path.join(DATA_DIR, filename)
 
+def save_book_text(title, text) -> str:
+    """
+    Writes a downloaded book to its path under a temporary name and renames it
+    into place, so a crash or a concurrent download never leaves a truncated
+    book that would be ingested as complete. Returns the path.
+    """
+    path = get_book_path(title)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
 def is_book_downloaded(title):
     return os.path.exists(get_book_path(title))
 
-# Initialize SentenceTransformer model once
-model = SentenceTransformer("all-MiniLM-L6-v2")
+def _load_embedding_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+def _load_collection():
+    import chromadb
+    from chromadb.config import Settings
+    # Initialize persistent ChromaDB client
+    chroma_client = chromadb.Client(Settings(
+        persist_directory=os.path.join(DATA_DIR, "db"), # Store DB inside data folder
+        anonymized_telemetry=False
+    ))
+    return chroma_client.get_or_create_collection("books")
+
+# The SentenceTransformer model and the Chroma collection are loaded on first use
+_embedding_model = LazyResource("embedding model", _load_embedding_model)
+_collection = LazyResource("Chroma collection", _load_collection)
+
+def get_embedding_model():
+    return _embedding_model.get()
 
-# Initialize persistent ChromaDB client
-chroma_client = chromadb.Client(Settings(
-    persist_directory=os.path.join(DATA_DIR, "db"), # Store DB inside data folder
-    anonymized_telemetry=False
-))
+def is_embedding_model_loaded():
+    return _embedding_model.is_loaded()
 
-collection = chroma_client.get_or_create_collection("books")
+def get_collection():
+    return _collection.get()
+
+def prewarm():
+    """Starts loading the embedding model and the Chroma collection in the background."""
+    return [_embedding_model.prewarm(), _collection.prewarm()]
+
+# Chunk embeddings are cached on disk by content, so duplicate or re-ingested books are not re-embedded
+embedding_cache = EmbeddingCache(EMBEDDING_MODEL_NAME, cache_dir=os.path.join(DATA_DIR, "embedding_cache"))
+
+# Query embeddings are cached, and concurrent queries are encoded in one batch
+query_encoder = QueryEncoder(lambda texts: get_embedding_model().encode(texts, batch_size=len(texts)))
 
 def is_book_ingested(title):
+    manifest = load_manifest(title)
+    if manifest:
+        # Books with a manifest are only ingested once every chunk was written,
+        # with the current chunker and embedding model
+        return manifest.get("status", STATUS_COMPLETE) == STATUS_COMPLETE and not is_manifest_outdated(manifest)
+
     # Check by counting documents for the title
     # Note: collection.count() is for the whole collection.
     # collection.get(where={"title": title}, limit=1) is better for checking existence.
-    results = collection.get(where={"title": title}, limit=1)
+    results = get_collection().get(where={"title": title}, limit=1)
     return bool(results and results["ids"])
 
-def clean_gutenberg_text(text):
-    lines = text.splitlines()
-    clean_lines = []
-    in_main_content = False
-    start_found = False
-    end_found = False
-
-    for line in lines:
-        if '*** start of' in line.lower():
-            in_main_content = True
-            start_found = True
-            continue
-        if '*** end of' in line.lower():
-            end_found = True
-            break
-        if in_main_content:
-            clean_lines.append(line.strip())
-
-    if start_found and end_found:
-        return "\n".join(clean_lines).strip()
-    else:
-        # fallback to return the entire text if markers not found
-        return text.strip()
-
-def ingest_book(title, raw_text):
-    clean_text = clean_gutenberg_text(raw_text)
-    if not clean_text.strip():
-        print("[!] No text chunks found to ingest.")
-        return False # Return False to indicate failure
+def _chunk_ids(title, start, count):
+    prefix = title.replace(' ', '_').replace(':', '')
+    return [f"{prefix}_chunk_{i}" for i in range(start, start + count)] # Ensure IDs are valid and unique
+
+def embed_chunks(chunks: list[str]):
+    """Embeds document chunks, only running the model on chunks missing from the embedding cache."""
+    return embedding_cache.encode(chunks, lambda texts: get_embedding_model().encode(texts, batch_size=len(texts)))
+
+def content_hash(data) -> str:
+    """Hash of a book's raw bytes (bytes or a memory-mapped file), recorded in its manifest."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def file_content_hash(path) -> str:
+    with open(path, "rb") as f:
+        data = _map_stream(f)
+        try:
+            return content_hash(data)
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+def _chunk_digest(chunk, metadata) -> bytes:
+    """Identifies what is stored for a chunk: its text and its metadata."""
+    payload = chunk + "\x1f" + json.dumps(metadata, sort_keys=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=CHUNK_DIGEST_SIZE).digest()
+
+def _manifest_paths(title):
+    slug = re.sub(r"[^a-z0-9]+", "_", title.lower()).strip("_")[:80]
+    digest = hashlib.blake2b(title.encode("utf-8"), digest_size=4).hexdigest()
+    base = os.path.join(MANIFEST_DIR, f"{slug}_{digest}")
+    return base + ".json", base + ".offsets.npy"
+
+def _hashes_path(title):
+    return _manifest_paths(title)[0][:-len(".json")] + ".hashes.npy"
+
+def _lexical_index_path(title):
+    return _manifest_paths(title)[0][:-len(".json")] + ".bm25.npz"
+
+def _write_manifest(title, manifest, offsets=None, chunk_hashes=None):
+    manifest_path, offsets_path = _manifest_paths(title)
+    os.makedirs(MANIFEST_DIR, exist_ok=True)
+    if offsets is not None:
+        np.save(offsets_path, np.frombuffer(offsets, dtype=np.int64).reshape(-1, 2))
+    if chunk_hashes is not None:
+        np.save(_hashes_path(title), np.frombuffer(bytes(chunk_hashes), dtype=np.uint8).reshape(-1, CHUNK_DIGEST_SIZE))
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+def load_manifest(title) -> dict | None:
+    """
+    Returns the ingestion manifest of a book (chunk count, last chunk ID, source
+    file), or None for books ingested before manifests existed.
+    """
+    manifest_path, _ = _manifest_paths(title)
+    return load_manifest_file(manifest_path)
+
+def load_manifest_file(manifest_path) -> dict | None:
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def is_manifest_outdated(manifest) -> bool:
+    """True if a book was chunked or embedded differently than ingestion would do now."""
+    return (manifest.get("chunker_version", 1) != CHUNKER_VERSION
+            or manifest.get("chunk_tokens", CHUNK_TOKENS) != CHUNK_TOKENS
+            or manifest.get("chunk_overlap_tokens", CHUNK_OVERLAP_TOKENS) != CHUNK_OVERLAP_TOKENS
+            or manifest.get("embedding_model", EMBEDDING_MODEL_NAME) != EMBEDDING_MODEL_NAME)
+
+def is_book_current(title, path) -> bool:
+    """True if the book was fully ingested from the current contents of `path` with the current settings."""
+    manifest = load_manifest(title)
+    return bool(manifest and manifest.get("status") == STATUS_COMPLETE and not is_manifest_outdated(manifest)
+                and manifest.get("content_hash") == file_content_hash(path))
+
+def get_chunk_hashes(title):
+    """The (chunk_count, CHUNK_DIGEST_SIZE) array of per-chunk hashes recorded for a book, or None."""
+    try:
+        return np.load(_hashes_path(title))
+    except (OSError, ValueError):
+        return None
+
+def get_chunk_offsets(title):
+    """Memory-maps the (chunk_count, 2) array of source byte spans recorded for a book."""
+    _, offsets_path = _manifest_paths(title)
+    if not os.path.exists(offsets_path):
+        return None
+    return np.load(offsets_path, mmap_mode="r")
+
+def read_chunk_source(title, chunk_index, manifest=None) -> str:
+    """Reads the source text a chunk was cut from by slicing the memory-mapped book file."""
+    manifest = manifest or load_manifest(title)
+    offsets = get_chunk_offsets(title)
+    if not manifest or offsets is None or not manifest.get("source_path"):
+        return ""
+    start, end = (int(x) for x in offsets[chunk_index])
+    with open(manifest["source_path"], "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return mm[start:end].decode("utf-8", errors="replace").strip()
+
+def list_manifests() -> list[dict]:
+    """Returns the manifests of every book that has (started) ingestion."""
+    try:
+        names = sorted(os.listdir(MANIFEST_DIR))
+    except OSError:
+        return []
+    manifests = (load_manifest_file(os.path.join(MANIFEST_DIR, name)) for name in names if name.endswith(".json"))
+    return [manifest for manifest in manifests if manifest]
+
+def delete_book_chunks(title):
+    get_collection().delete(where={"title": title})
+
+def delete_chunks_from(title, first_chunk):
+    """Deletes a book's chunks with an index of `first_chunk` or higher."""
+    get_collection().delete(where={"$and": [{"title": title}, {"chunk_id": {"$gte": first_chunk}}]})
+
+class BookIngestion:
+    """
+    Ingestion state of one book: assigns chunk IDs, collects the source byte
+    spans, chunk hashes and BM25 postings and writes the manifest and the
+    lexical index. The manifest is marked
+    "ingesting" until every chunk has been written, so an interrupted
+    ingestion is detected and redone instead of leaving the book half-indexed.
+
+    Re-ingesting a book diffs against the chunk hashes of its last complete
+    ingestion: chunks whose text and metadata are unchanged at the same index
+    are not written again, and chunks past the new chunk count are deleted.
+    """
+
+    def __init__(self, title, source_path=None, content_hash=None, **extra):
+        self.title = title
+        self.source_path = source_path
+        self.content_hash = content_hash
+        self.extra = extra  # e.g. gutenberg_id, recorded in the manifest
+        self.offsets = array("q")
+        self.chunk_hashes = bytearray()
+        self.lexical = lexical_index.LexicalIndexBuilder()
+        self.sections = []  # one entry per chapter heading, for resolving "chapter 3" to a chapter index
+        self.chunk_count = 0
+        self.written = 0
+        self.unchanged = 0
+        self.closed = False
+
+        previous = load_manifest(title)
+        self.previous_hashes = None
+        if previous and previous.get("status") != STATUS_COMPLETE:
+            # Chunks of the interrupted run may be anywhere; every chunk is rewritten
+            print(f"[!] Previous ingestion of '{title}' did not finish, rewriting its chunks.")
+        elif previous and previous.get("embedding_model", EMBEDDING_MODEL_NAME) == EMBEDDING_MODEL_NAME:
+            self.previous_hashes = get_chunk_hashes(title)
+        _write_manifest(title, self._manifest(STATUS_INGESTING))
+
+    def _manifest(self, status):
+        return {
+            "title": self.title,
+            "status": status,
+            "source_path": self.source_path,
+            "content_hash": self.content_hash,
+            "chunker_version": CHUNKER_VERSION,
+            "chunk_tokens": CHUNK_TOKENS,
+            "chunk_overlap_tokens": CHUNK_OVERLAP_TOKENS,
+            "embedding_model": EMBEDDING_MODEL_NAME,
+            "chunk_count": self.chunk_count,
+            "last_chunk_id": _chunk_ids(self.title, self.chunk_count - 1, 1)[0] if self.chunk_count else None,
+            "sections": self.sections,
+            **self.extra,
+        }
+
+    def add_chunk(self, start_byte, end_byte, chunk, metadata) -> int:
+        self.offsets.extend((start_byte, end_byte))
+        self.chunk_hashes += _chunk_digest(chunk, metadata)
+        chapter = metadata.get("chapter_index", -1)
+        self.lexical.add(chunk, chapter)
+        if chapter >= 0 and (not self.sections or self.sections[-1]["chapter_index"] != chapter):
+            self.sections.append({"chapter_index": chapter, "kind": metadata["chapter_kind"],
+                                  "number": metadata["chapter_number"], "part": metadata.get("chapter_part", 0)})
+        self.chunk_count += 1
+        return self.chunk_count - 1
+
+    def is_unchanged(self, index) -> bool:
+        """True if chunk `index` is stored exactly as the last complete ingestion wrote it."""
+        if self.previous_hashes is None or index >= len(self.previous_hashes):
+            return False
+        start = index * CHUNK_DIGEST_SIZE
+        return self.previous_hashes[index].tobytes() == bytes(self.chunk_hashes[start:start + CHUNK_DIGEST_SIZE])
+
+    def is_done(self) -> bool:
+        return self.closed and self.written == self.chunk_count
+
+    def finish(self) -> bool:
+        if self.chunk_count == 0:
+            print(f"[!] No text chunks found to ingest for '{self.title}'.")
+            _write_manifest(self.title, self._manifest(STATUS_FAILED))
+            return False
+        delete_chunks_from(self.title, self.chunk_count)  # Left over from a longer previous ingestion
+        self.lexical.save(_lexical_index_path(self.title))
+        _write_manifest(self.title, self._manifest(STATUS_COMPLETE), self.offsets, self.chunk_hashes)
+        return True
+
+class EmbeddingBatcher:
+    """
+    Collects chunks, possibly from several books, and embeds and writes them to
+    Chroma in full batches of `batch_size`. Peak memory is bounded by one batch.
+    `progress_callback(batch_index, chunks_written)` is called after every batch.
+    """
 
-    # Simple fixed-size chunking as you have it
-    # Consider using langchain's RecursiveCharacterTextSplitter for better chunking
-    chunks = [clean_text[i:i + 1000] for i in range(0, len(clean_text), 1000)]
-    embeddings = model.encode(chunks).tolist()
-    ids = [f"{title.replace(' ', '_').replace(':', '')}_chunk_{i}" for i in range(len(chunks))] # Ensure IDs are valid and unique
+    def __init__(self, batch_size=EMBED_BATCH_SIZE, progress_callback=None, on_book_done=None):
+        self.batch_size = batch_size
+        self.progress_callback = progress_callback
+        self.on_book_done = on_book_done
+        self.pending = []  # (book, chunk index, chunk text, chunk metadata)
+        self.batches_written = 0
+        self.chunks_written = 0
+        self._open_books = []
 
-    metadatas = []
-    for i in range(len(chunks)):
-        metadatas.append({"title": title, "chunk_id": i}) 
+    def add(self, book: BookIngestion, chunk, start_byte, end_byte, metadata=None):
+        if book not in self._open_books:
+            self._open_books.append(book)
+        metadata = metadata or {}
+        index = book.add_chunk(start_byte, end_byte, chunk, metadata)
+        if book.is_unchanged(index):
+            book.written += 1  # Already stored as is; nothing to embed or write
+            book.unchanged += 1
+            return
+        self.pending.append((book, index, chunk, metadata))
+        if len(self.pending) >= self.batch_size:
+            self._write_batch()
 
-    collection.add(
-        documents=chunks,
-        embeddings=embeddings,
-        ids=ids,
-        metadatas=metadatas 
-    )
+    def close_book(self, book: BookIngestion):
+        """Marks that all chunks of `book` were added; it is finished once they are written."""
+        if book not in self._open_books:
+            self._open_books.append(book)
+        book.closed = True
+        self._finish_done_books()
 
-    print(f"[✔] Book '{title}' ingested with {len(chunks)} chunks.")
+    def _write_batch(self):
+        batch, self.pending = self.pending, []
+        documents = [chunk for _, _, chunk, _ in batch]
+        get_collection().upsert(
+            documents=documents,
+            embeddings=embed_chunks(documents).tolist(),
+            ids=[_chunk_ids(book.title, index, 1)[0] for book, index, _, _ in batch],
+            metadatas=[{"title": book.title, "chunk_id": index, **metadata} for book, index, _, metadata in batch]
+        )
+        for book, _, _, _ in batch:
+            book.written += 1
+        self.batches_written += 1
+        self.chunks_written += len(batch)
+        if self.progress_callback:
+            self.progress_callback(self.batches_written - 1, self.chunks_written)
+        self._finish_done_books()
+
+    def _finish_done_books(self):
+        for book in [book for book in self._open_books if book.is_done()]:
+            self._open_books.remove(book)
+            success = book.finish()
+            if self.on_book_done:
+                self.on_book_done(book, success)
+
+    def flush(self):
+        if self.pending:
+            self._write_batch()
+        embedding_cache.flush()
+
+def _map_stream(stream):
+    """Memory-maps a file stream; other streams (e.g. BytesIO) are read into memory."""
+    try:
+        return mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return stream.read()  # Not a real file, or an empty one
+
+def ingest_stream(title, stream, batch_size=EMBED_BATCH_SIZE, progress_callback=None, source_path=None, **extra):
+    """
+    Cleans, chunks, embeds and stores a book from a seekable binary stream.
+    File streams are memory-mapped and split by the structural chunker, and
+    chunks are encoded and written to Chroma in batches of `batch_size`, so
+    peak memory is bounded by one batch regardless of the size of the book.
+    `progress_callback(batch_index, chunks_ingested)` is called after every
+    written batch. A manifest with the content hash, the chunk count, the last
+    chunk ID and the source byte span and hash of every chunk is written at
+    the end. A book whose content and ingestion settings are unchanged is
+    skipped; otherwise only chunks that differ from the manifest are written.
+    """
+    data = _map_stream(stream)
+    try:
+        digest = content_hash(data)
+        previous = load_manifest(title)
+        if (previous and previous.get("status") == STATUS_COMPLETE and previous.get("content_hash") == digest
+                and not is_manifest_outdated(previous)):
+            print(f"[✔] Book '{title}' is unchanged since it was ingested.")
+            return True
+
+        if "author" not in extra:
+            extra["author"] = extract_gutenberg_author(bytes(data[:HEADER_BYTES]).decode("utf-8", errors="replace"))
+        book = BookIngestion(title, source_path, digest, **extra)
+        results = []
+        batcher = EmbeddingBatcher(batch_size, progress_callback, on_book_done=lambda _, success: results.append(success))
+        for chunk, start_byte, end_byte, metadata in chunker.iter_chunks(data):
+            batcher.add(book, chunk, start_byte, end_byte, metadata)
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+    batcher.close_book(book)
+    batcher.flush()
+    if not results or not results[0]:
+        return False # Return False to indicate failure
+
+    cache_stats = embedding_cache.stats()
+    print(f"[✔] Book '{title}' ingested with {book.chunk_count} chunks, {book.unchanged} of them unchanged. "
+          f"(embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses)")
     return True # Indicate success
 
-def query_book(title: str, query: str, top_k: int = 5) -> list[str]:
+def ingest_book(title, raw_text, batch_size=EMBED_BATCH_SIZE, progress_callback=None, **extra):
+    return ingest_stream(title, io.BytesIO(raw_text.encode("utf-8")), batch_size, progress_callback, **extra)
+
+def ingest_book_file(title, path, batch_size=EMBED_BATCH_SIZE, progress_callback=None, **extra):
+    """Ingests a downloaded book straight from disk without reading it into memory."""
+    with open(path, "rb") as f:
+        return ingest_stream(title, f, batch_size, progress_callback, source_path=path, **extra)
+
+def chunk_book_file(path) -> list[tuple[str, int, int, dict]]:
+    """Cleans and chunks a book file; returns `(chunk, start_byte, end_byte, metadata)` tuples."""
+    with open(path, "rb") as f:
+        data = _map_stream(f)
+        try:
+            return list(chunker.iter_chunks(data))
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+def extract_gutenberg_title(header: str) -> str | None:
+    """Reads the title from the "Title:" line of a Gutenberg header."""
+    match = GUTENBERG_TITLE_RE.search(header)
+    return match.group(1) if match else None
+
+def extract_gutenberg_author(header: str) -> str | None:
+    """Reads the author from the "Author:" line of a Gutenberg header."""
+    match = GUTENBERG_AUTHOR_RE.search(header)
+    return match.group(1) if match else None
+
+def encode_query(query: str):
+    """Returns the embedding of a single query string (read-only; shared with other callers)."""
+    return query_encoder.encode(query)
+
+def reciprocal_rank_fusion(rankings: list[list], weights: list[float], k: int = RRF_K) -> list:
+    """Merges ranked lists of IDs: each ID scores the sum of weight / (k + rank) over the lists."""
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + weight / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+# Lexical searches run here while the query is embedded and searched in Chroma
+_lexical_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lexical-search")
+_lexical_builds = set()
+_lexical_builds_lock = threading.Lock()
+
+def _build_lexical_index_from_store(title, manifest):
+    """Builds the BM25 index of a book ingested before lexical indexes existed, from its stored chunks."""
+    try:
+        builder = lexical_index.LexicalIndexBuilder()
+        for start in range(0, manifest["chunk_count"], FETCH_BATCH):
+            ids = _chunk_ids(title, start, min(FETCH_BATCH, manifest["chunk_count"] - start))
+            result = get_collection().get(ids=ids, include=["documents", "metadatas"])
+            by_id = dict(zip(result["ids"], zip(result["documents"], result["metadatas"])))
+            for chunk_id in ids:
+                document, metadata = by_id.get(chunk_id, ("", {}))
+                builder.add(document, (metadata or {}).get("chapter_index", -1))
+        builder.save(_lexical_index_path(title))
+        print(f"[✔] Built the lexical index of '{title}' from its {manifest['chunk_count']} stored chunks.")
+    except Exception as e:
+        print(f"[!] Building the lexical index of '{title}' failed: {e}")
+    finally:
+        with _lexical_builds_lock:
+            _lexical_builds.discard(title)
+
+def _lexical_search(title, query, top_k, chapters=None) -> list[str]:
+    """Chunk IDs of the book's best BM25 matches; [] while the book has no lexical index yet."""
+    index = lexical_index.load_index(_lexical_index_path(title))
+    if index is None:
+        manifest = load_manifest(title)
+        if manifest and manifest.get("status") == STATUS_COMPLETE and manifest.get("chunk_count"):
+            with _lexical_builds_lock:
+                if title not in _lexical_builds:
+                    _lexical_builds.add(title)
+                    threading.Thread(target=_build_lexical_index_from_store, args=(title, manifest),
+                                     name="lexical-index-builder", daemon=True).start()
+        return []
+    return [_chunk_ids(title, i, 1)[0] for i, _ in index.search(query, top_k, chapters)]
+
+def find_chapters(title: str, kind: str, number: int, part: int | None = None) -> list[int] | None:
+    """
+    The chapter indexes a request like "chapter 3", "part 2" or "part 2,
+    chapter 3" refers to, from the sections in the book's manifest. Chapter
+    numbers restart in every part of books like Crime and Punishment; without
+    a part, "chapter 3" is the first chapter 3. Returns [] if the book has no
+    such section, None if its manifest doesn't record sections.
     """
-    Queries the vector store for relevant chunks from a specific book.
+    manifest = load_manifest(title)
+    if not manifest or "sections" not in manifest:
+        return None
+    sections = manifest["sections"]
+    if kind in chunker.PART_KINDS and part is None:
+        within = [s["chapter_index"] for s in sections if s["part"] == number]
+        if within:
+            return within
+    matches = [s["chapter_index"] for s in sections
+               if s["kind"] == kind and s["number"] == number and part in (None, s["part"])]
+    return matches[:1]
+
+def query_book(title: str, query: str, top_k: int = 5, section: tuple | None = None,
+               dense_weight: float = DENSE_WEIGHT, lexical_weight: float = LEXICAL_WEIGHT) -> list[str]:
+    """
+    Queries the vector store for relevant chunks from a specific book, optionally
+    only from the `(kind, number, part)` section a request names (books
+    ingested by the structural chunker; see find_chapters).
     Returns a list of strings (chunks). Returns an empty list if no results.
     """
+    return [document for _, document in query_book_hits(title, query, top_k, section, dense_weight, lexical_weight)]
+
+def query_book_hits(title: str, query: str, top_k: int = 5, section: tuple | None = None,
+                    dense_weight: float = DENSE_WEIGHT, lexical_weight: float = LEXICAL_WEIGHT) -> list[tuple[str, str]]:
+    """
+    Like query_book, but returns `(chunk_id, chunk)` pairs. The embedding
+    search runs in parallel with a BM25 search of the book's lexical index,
+    and the two rankings are merged by weighted reciprocal rank fusion, so
+    names and rare words are found too.
+    """
+    where = {"title": title} # Filter by book title
+    chapters = None
+    if section is not None:
+        kind, number, part = section
+        chapters = find_chapters(title, kind, number, part)
+        if chapters is None:
+            # Chunked before manifests recorded sections: match the heading, and skip the lexical index
+            where = {"$and": [{"title": title}, {"chapter_kind": kind}, {"chapter_number": number}]}
+            lexical_weight = 0
+        elif not chapters:
+            return []
+        else:
+            where = {"$and": [{"title": title}, {"chapter_index": {"$in": chapters}}]}
+    candidates = top_k * HYBRID_OVERFETCH if lexical_weight else top_k
     try:
-        query_embedding = model.encode([query]).tolist()
-        results = collection.query(
+        lexical = _lexical_pool.submit(_lexical_search, title, query, candidates, chapters) if lexical_weight else None
+        query_embedding = [encode_query(query).tolist()]
+        results = get_collection().query(
             query_embeddings=query_embedding,
-            n_results=top_k,
-            where={"title": title}, # Filter by book title
+            n_results=candidates,
+            where=where,
             include=['documents']
         )
         
-        if results and results.get("documents"):
-            # results["documents"] is a list of lists, e.g., [['doc1'], ['doc2']]
-            # Flatten this into a single list of strings
-            flat_documents = [doc for sublist in results["documents"] for doc in sublist]
-            return flat_documents
-        else:
-            return [] # IMPORTANT: Return an empty list if no results
+        if not results or not results.get("documents"):
+            results = {"ids": [[]], "documents": [[]]}
+        # results["documents"] is a list of lists, e.g., [['doc1'], ['doc2']]
+        # Flatten this into a single list of strings
+        documents = dict(zip(results["ids"][0], results["documents"][0]))
+        lexical_ids = lexical.result() if lexical else []
+        if not lexical_ids:
+            return list(documents.items())[:top_k]
+
+        fused = reciprocal_rank_fusion([list(documents), lexical_ids], [dense_weight, lexical_weight])[:top_k]
+        missing = [chunk_id for chunk_id in fused if chunk_id not in documents]
+        if missing:
+            fetched = get_collection().get(ids=missing, include=['documents'])
+            documents.update(zip(fetched["ids"], fetched["documents"]))
+        return [(chunk_id, documents[chunk_id]) for chunk_id in fused if chunk_id in documents]
     except Exception as e:
         print(f"Error querying book '{title}': {e}")
         return [] # IMPORTANT: Return an empty list on error
 
+# title -> author of every book with a manifest, rebuilt when the manifest directory changes
+_library_index = {"mtime": None, "authors": {}}
+
+def _book_authors() -> dict:
+    try:
+        mtime = os.stat(MANIFEST_DIR).st_mtime_ns
+    except OSError:
+        return {}
+    if _library_index["mtime"] != mtime:
+        authors = {}
+        for manifest in list_manifests():
+            author = manifest.get("author")
+            if author is None and manifest.get("source_path"):
+                # Manifests written before authors were recorded; read the source header
+                try:
+                    with open(manifest["source_path"], "r", encoding="utf-8", errors="replace") as f:
+                        author = extract_gutenberg_author(f.read(HEADER_BYTES))
+                except OSError:
+                    pass
+            authors[manifest["title"]] = author or "Unknown"
+        _library_index.update(mtime=mtime, authors=authors)
+    return _library_index["authors"]
+
+def search_library(query: str, top_k: int = 10, titles: list[str] | None = None,
+                   authors: list[str] | None = None, per_book: int = 1) -> list[dict]:
+    """
+    Searches every ingested book at once (or only `titles`, or books whose
+    author contains one of `authors`). Hits are collapsed per book: returns up
+    to `top_k` books, best first, each as `{"title", "author", "score", "hits"}`
+    with its `per_book` best chunks as `{"chunk_id", "chapter", "score", "chunk"}`.
+    Scores are cosine similarities.
+    """
+    book_authors = _book_authors()
+    where = None
+    if titles is not None or authors is not None:
+        selected = set(titles if titles is not None else book_authors)
+        if authors is not None:
+            wanted = [author.lower() for author in authors]
+            selected = {title for title in selected
+                        if any(author in book_authors.get(title, "").lower() for author in wanted)}
+        if not selected:
+            return []
+        where = {"title": {"$in": sorted(selected)}} if len(selected) > 1 else {"title": next(iter(selected))}
+
+    try:
+        results = get_collection().query(
+            query_embeddings=[encode_query(query).tolist()],
+            n_results=top_k * per_book * LIBRARY_OVERFETCH,
+            where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+    except Exception as e:
+        print(f"Error searching the library for '{query}': {e}")
+        return []
+
+    books = {}  # Chroma returns hits best first, so each book's first hit is its best
+    for document, metadata, distance in zip(results["documents"][0], results["metadatas"][0], results["distances"][0]):
+        title = metadata.get("title", "")
+        book = books.setdefault(title, {"title": title, "author": book_authors.get(title, "Unknown"),
+                                        "score": None, "hits": []})
+        if len(book["hits"]) == per_book:
+            continue
+        score = 1 - distance / 2  # squared L2 distance between unit-length embeddings
+        book["hits"].append({"chunk_id": metadata.get("chunk_id"), "chapter": metadata.get("chapter", ""),
+                             "score": score, "chunk": document})
+        if book["score"] is None:
+            book["score"] = score
+    return list(books.values())[:top_k]
 
 
 def get_last_chunk(title: str) -> str:
     """
-    Retrieves the last ingested chunk for a specific book based on chunk_id.
+    Retrieves the last ingested chunk for a specific book.
+    Uses the book's manifest for a single ID lookup (or a slice of the source
+    file); books ingested without a manifest fall back to scanning their chunks.
     Returns a string. Returns an empty string if no chunks.
     """
+    manifest = load_manifest(title)
+    if manifest:
+        try:
+            result = get_collection().get(ids=[manifest["last_chunk_id"]], include=['documents'])
+            if result and result.get("documents"):
+                return result["documents"][0]
+        except Exception as e:
+            print(f"Error looking up last chunk for '{title}': {e}")
+        last_chunk_content = read_chunk_source(title, manifest["chunk_count"] - 1, manifest)
+        if last_chunk_content:
+            return last_chunk_content
+
+    return _scan_last_chunk(title)
+
+def _scan_last_chunk(title: str) -> str:
+    """
+    Finds the last chunk by scanning every chunk of the book for the highest chunk_id.
+    """
     try:
         # Fetch all chunks for the given title
-        all_chunks_data = collection.get(
+        all_chunks_data = get_collection().get(
             where={"title": title},
             include=['metadatas', 'documents']
         )
@@ -1,37 +1,254 @@
-class MCPHub:
+# mcp_hub.py
+#
+# Registry and dispatcher of the agents. Every call goes through `hub.call`
+# (or `acall` from async code), which times it per agent, counts the calls in
+# flight, and can coalesce identical concurrent calls into one execution, so
+# two sessions switching to the same book download and ingest it once.
+# Independent calls fan out with `gather` / `agather`.
+
+import asyncio
+import bisect
+import inspect
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+HUB_WORKERS = int(os.environ.get("HUB_WORKERS", "16"))
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+class AgentStats:
     def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.coalesced = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)  # The last one counts calls slower than every bound
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the given fraction of the calls."""
+        rank = fraction * self.calls
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return float(min(bound, self.max_ms))
+        return self.max_ms
+
+    def as_dict(self) -> dict:
+        histogram = {f"<={bound}ms": count for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets) if count}
+        if self.buckets[-1]:
+            histogram[f">{LATENCY_BUCKETS_MS[-1]}ms"] = self.buckets[-1]
+        return {
+            "calls": self.calls, "errors": self.errors, "coalesced": self.coalesced,
+            "in_flight": self.in_flight, "max_in_flight": self.max_in_flight,
+            "mean_ms": self.total_ms / self.calls if self.calls else 0.0,
+            "p50_ms": self.percentile(0.5) if self.calls else 0.0,
+            "p95_ms": self.percentile(0.95) if self.calls else 0.0,
+            "max_ms": self.max_ms, "histogram": histogram,
+        }
+
+def _default_call_key(*args, **kwargs):
+    return repr((args, sorted(kwargs.items())))
+
+class MCPHub:
+    def __init__(self, workers: int = HUB_WORKERS):
         self.registry = {}
+        self._coalesce_keys = {}
+        self._in_flight_calls = {}  # (agent, call key) -> Future shared by identical concurrent calls
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mcp-hub")
 
-    def register(self, name, func):
+    def register(self, name, func, coalesce=False):
+        """
+        Registers an agent. With `coalesce`, a call made while an identical one
+        is running waits for that call's result instead of running again.
+        `coalesce` may also be a function of the call's arguments returning the
+        key that makes calls identical (by default all arguments). Don't
+        coalesce agents that return generators.
+        """
         self.registry[name] = func
+        self._coalesce_keys[name] = (_default_call_key if coalesce is True else coalesce) or None
+        with self._lock:
+            self._stats.setdefault(name, AgentStats())
 
     def call(self, name, *args, **kwargs):
-        if name in self.registry:
-            return self.registry[name](*args, **kwargs)
-        raise Exception(f"Agent '{name}' not found")
+        if name not in self.registry:
+            raise Exception(f"Agent '{name}' not found")
+        key_fn = self._coalesce_keys[name]
+        if key_fn is None:
+            return self._run(name, args, kwargs)
+        try:
+            key = (name, key_fn(*args, **kwargs))
+            hash(key)
+        except TypeError:
+            return self._run(name, args, kwargs)
+
+        with self._lock:
+            shared = self._in_flight_calls.get(key)
+            if shared is not None:
+                self._stats[name].coalesced += 1
+            else:
+                self._in_flight_calls[key] = own = Future()
+        if shared is not None:
+            return shared.result()
+        try:
+            result = self._run(name, args, kwargs)
+            own.set_result(result)
+            return result
+        except BaseException as e:
+            own.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight_calls[key]
+
+    def submit(self, name, *args, **kwargs) -> Future:
+        """Starts a call in the hub's thread pool."""
+        return self._executor.submit(self.call, name, *args, **kwargs)
+
+    def gather(self, *calls) -> list:
+        """
+        Runs independent calls concurrently, each given as `(name, *args)`, and
+        returns their results in order. The last call runs in the calling thread.
+        """
+        if not calls:
+            return []
+        futures = [self.submit(*call) for call in calls[:-1]]
+        last = self.call(*calls[-1])
+        return [future.result() for future in futures] + [last]
+
+    async def acall(self, name, *args, **kwargs):
+        """`call` for async code: the agent runs in the hub's thread pool."""
+        return await asyncio.wrap_future(self.submit(name, *args, **kwargs))
+
+    async def agather(self, *calls) -> list:
+        return list(await asyncio.gather(*(self.acall(*call) for call in calls)))
+
+    def stats(self) -> dict:
+        """Per-agent call counts, errors, coalesced calls, calls in flight and latency histograms."""
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self._stats.items() if stats.calls or stats.in_flight}
+
+    def _run(self, name, args, kwargs):
+        with self._lock:
+            stats = self._stats[name]
+            stats.in_flight += 1
+            stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        started = time.perf_counter()
+        try:
+            result = self.registry[name](*args, **kwargs)
+        except BaseException:
+            self._record(name, started, error=True)
+            raise
+        if inspect.isgenerator(result):
+            return _TimedStream(self, name, started, result)  # A streamed agent is timed until it is exhausted or closed
+        self._record(name, started)
+        return result
+
+    def _record(self, name, started, error=False):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            stats = self._stats[name]
+            stats.in_flight -= 1
+            stats.calls += 1
+            stats.errors += error
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
 
     def serve(self):
         print("Serving MCPHub...")
 
+class _TimedStream:
+    """
+    Wraps a streamed agent's generator and records the call once: when it is
+    exhausted, fails, is closed, or is dropped, even before its first item.
+    """
+
+    def __init__(self, hub: MCPHub, name: str, started: float, stream):
+        self._hub, self._name, self._started, self._stream = hub, name, started, stream
+        self._recorded = False
+        self._record_lock = threading.Lock()
+
+    def _finish(self, error=False):
+        with self._record_lock:
+            if self._recorded:
+                return
+            self._recorded = True
+        self._hub._record(self._name, self._started, error)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._stream)
+        except StopIteration:
+            self._finish()
+            raise
+        except BaseException:
+            self._finish(error=True)
+            raise
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._finish()
+
+    def __del__(self):
+        if not self._recorded:
+            self.close()
+
 hub = MCPHub()
 
 # Import agent functions and register them here
 from mcp_agents.gutenberg_api import GutenbergAPI
-from mcp_agents.llm_gateway import call_llm
+from mcp_agents import gutenberg_catalog, llm_gateway, reranker, vector_store
+from mcp_agents.llm_gateway import call_llm, stream_llm
 from mcp_agents.prompt import build_summary_prompt, build_question_prompt, build_continuation_prompt
-from mcp_agents.vector_store import ingest_book, query_book, is_book_ingested, get_last_chunk # ADD THIS
+from mcp_agents.vector_store import ingest_book, ingest_book_file, query_book, query_book_hits, search_library, is_book_ingested, get_last_chunk # ADD THIS
+from orchestrator import summary_tree
 
 
-hub.register("search_books", GutenbergAPI.search_books)
-hub.register("download_book", GutenbergAPI.download_book)
+hub.register("search_books", GutenbergAPI.search_books, coalesce=True)
+hub.register("search_catalog", gutenberg_catalog.search)
+hub.register("resolve_title", gutenberg_catalog.resolve_title)
+hub.register("download_book", GutenbergAPI.download_book, coalesce=lambda book_id: str(book_id))
+hub.register("download_books", GutenbergAPI.download_books)
 hub.register("call_llm", call_llm)
+hub.register("stream_llm", stream_llm)
+hub.register("llm_scheduler_stats", llm_gateway.scheduler.stats)
 hub.register("ingest_book", ingest_book)
+# Keyed by title alone: a second session ingesting the same book waits for the first one
+hub.register("ingest_book_file", ingest_book_file, coalesce=lambda title, *args, **kwargs: title)
 hub.register("query_book", query_book)
+hub.register("query_book_hits", query_book_hits)
+hub.register("search_library", search_library)
+hub.register("query_encoder_stats", vector_store.query_encoder.stats)
+hub.register("rerank", reranker.rerank)
+hub.register("reranker_stats", reranker.stats)
 hub.register("is_book_ingested", is_book_ingested)
 hub.register("get_last_chunk", get_last_chunk)
+hub.register("build_summary_tree", summary_tree.build_tree, coalesce=lambda title, *args, **kwargs: title)
+hub.register("get_book_summary", summary_tree.get_book_summary)
 hub.register("build_summary_prompt", build_summary_prompt)
 hub.register("build_question_prompt", build_question_prompt)
 hub.register("build_continuation_prompt", build_continuation_prompt)
+hub.register("hub_stats", hub.stats)
+
+
+def prewarm_models():
+    """Loads the LLM, the embedding model, the vector store and the reranker in background threads."""
+    threads = [llm_gateway.prewarm(), *vector_store.prewarm()]
+    if reranker.RERANK_ENABLED:
+        threads.append(reranker.prewarm())
+    return threads
 
 
 if __name__ == "__main__":
@@ -0,0 +1,162 @@
+# orchestrator/bulk_ingest.py
+#
+# Pre-seeds the vector store with many books at once:
+#   python -m orchestrator.bulk_ingest 1342 84 11 "data/Jane Eyre.txt"
+# Gutenberg IDs are downloaded concurrently, books are cleaned and chunked in a
+# process pool, and all chunks go through one shared embedding batcher. The
+# per-book status in the manifests makes an interrupted run resumable: books
+# that completed are skipped, half-ingested ones are redone. After a chunker or
+# embedding model upgrade, re-ingest everything ingested from local files with
+#   python -m orchestrator.bulk_ingest --library
+# which only rewrites the chunks that actually changed.
+
+import argparse
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from mcp_agents.gutenberg_api import GutenbergAPI
+from mcp_agents.vector_store import (
+    EMBED_BATCH_SIZE, HEADER_BYTES, STATUS_COMPLETE, BookIngestion, EmbeddingBatcher, chunk_book_file,
+    extract_gutenberg_author, extract_gutenberg_title, file_content_hash, is_book_current,
+    is_manifest_outdated, list_manifests, save_book_text,
+)
+
+DOWNLOAD_WORKERS = 8
+
+def _header(path: str) -> str:
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read(HEADER_BYTES)
+
+def _title_from_file(path: str) -> str:
+    return extract_gutenberg_title(_header(path)) or os.path.splitext(os.path.basename(path))[0]
+
+def _download(gutenberg_id: str) -> dict | None:
+    """Downloads a book and stores it under its Gutenberg title. Runs in a thread."""
+    raw_text = GutenbergAPI.download_book(gutenberg_id)
+    if not raw_text:
+        return None
+    title = extract_gutenberg_title(raw_text[:HEADER_BYTES]) or f"Gutenberg {gutenberg_id}"
+    path = save_book_text(title, raw_text)
+    return {"title": title, "path": path, "gutenberg_id": gutenberg_id}
+
+def bulk_ingest(sources: list[str], download_workers: int = DOWNLOAD_WORKERS,
+                clean_workers: int | None = None, batch_size: int = EMBED_BATCH_SIZE, library: bool = False) -> dict:
+    """
+    Ingests every source (a Gutenberg ID or a local .txt path) that is not
+    ingested yet from its current contents with the current chunker and
+    embedding model. With `library`, every book that has a manifest is also
+    re-ingested from its source file under its recorded title. Returns a
+    report with per-book outcomes and throughput.
+    """
+    started = time.perf_counter()
+    report = {"ingested": [], "skipped": [], "failed": []}
+    completed_ids = {str(m.get("gutenberg_id")) for m in list_manifests()
+                     if m.get("status") == STATUS_COMPLETE and not is_manifest_outdated(m)}
+
+    def on_book_done(book, success):
+        (report["ingested"] if success else report["failed"]).append(book.title)
+        elapsed = time.perf_counter() - started
+        print(f"[✔] '{book.title}' done ({book.chunk_count} chunks, {book.unchanged} unchanged, "
+              f"{len(report['ingested'])} books in {elapsed:.0f}s)")
+
+    batcher = EmbeddingBatcher(batch_size, on_book_done=on_book_done)
+
+    with ThreadPoolExecutor(max_workers=download_workers) as downloads, \
+            ProcessPoolExecutor(max_workers=clean_workers) as cleaners:
+        download_futures = {}
+        chunk_futures = {}
+        scheduled_titles = set()
+
+        def schedule_chunking(book_info):
+            # The same book can come from several sources (e.g. an ID and a local copy)
+            if book_info["title"] in scheduled_titles or is_book_current(book_info["title"], book_info["path"]):
+                report["skipped"].append(book_info["title"])
+                return
+            scheduled_titles.add(book_info["title"])
+            chunk_futures[cleaners.submit(chunk_book_file, book_info["path"])] = book_info
+
+        if library:
+            for m in list_manifests():
+                if m.get("source_path") and os.path.exists(m["source_path"]):
+                    schedule_chunking({"title": m["title"], "path": m["source_path"], "gutenberg_id": m.get("gutenberg_id")})
+
+        for source in sources:
+            if source.isdigit():
+                if source in completed_ids:
+                    report["skipped"].append(f"Gutenberg {source}")
+                else:
+                    download_futures[downloads.submit(_download, source)] = source
+            elif os.path.exists(source):
+                schedule_chunking({"title": _title_from_file(source), "path": source, "gutenberg_id": None})
+            else:
+                print(f"[!] Not a Gutenberg ID or an existing file: {source}")
+                report["failed"].append(source)
+
+        # Download and chunking results are consumed as they complete, so
+        # embedding starts while other books are still downloading
+        while download_futures or chunk_futures:
+            done, _ = wait([*download_futures, *chunk_futures], return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in download_futures:
+                    source = download_futures.pop(future)
+                    try:
+                        book_info = future.result()
+                    except Exception as e:  # e.g. an OSError writing a title that isn't a valid file name
+                        print(f"[!] Failed to store Gutenberg book {source}: {e}")
+                        book_info = None
+                    if book_info is None:
+                        print(f"[!] Failed to download Gutenberg book {source}.")
+                        report["failed"].append(f"Gutenberg {source}")
+                    else:
+                        schedule_chunking(book_info)
+                    continue
+
+                book_info = chunk_futures.pop(future)
+                try:
+                    chunks = future.result()
+                except Exception as e:
+                    print(f"[!] Failed to clean '{book_info['title']}': {e}")
+                    report["failed"].append(book_info["title"])
+                    continue
+                extra = {"gutenberg_id": book_info["gutenberg_id"]} if book_info["gutenberg_id"] else {}
+                extra["author"] = extract_gutenberg_author(_header(book_info["path"]))
+                book = BookIngestion(book_info["title"], book_info["path"], file_content_hash(book_info["path"]), **extra)
+                for chunk, start_byte, end_byte, metadata in chunks:
+                    batcher.add(book, chunk, start_byte, end_byte, metadata)
+                batcher.close_book(book)
+
+    batcher.flush()
+    elapsed = time.perf_counter() - started
+    report["seconds"] = elapsed
+    report["chunks"] = batcher.chunks_written
+    report["books_per_minute"] = len(report["ingested"]) / elapsed * 60 if elapsed else 0.0
+    report["chunks_per_second"] = batcher.chunks_written / elapsed if elapsed else 0.0
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Download and ingest many Gutenberg books at once.")
+    parser.add_argument("sources", nargs="*", help="Gutenberg IDs or paths to local .txt books")
+    parser.add_argument("--from-file", help="File with one Gutenberg ID or path per line")
+    parser.add_argument("--library", action="store_true",
+                        help="Re-ingest every book with a manifest from its source file (e.g. after a chunker upgrade)")
+    parser.add_argument("--download-workers", type=int, default=DOWNLOAD_WORKERS)
+    parser.add_argument("--clean-workers", type=int, default=None, help="Processes for cleaning/chunking (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    args = parser.parse_args()
+
+    sources = list(args.sources)
+    if args.from_file:
+        with open(args.from_file, "r", encoding="utf-8") as f:
+            sources += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    if not sources and not args.library:
+        parser.error("no Gutenberg IDs or files given")
+
+    report = bulk_ingest(sources, args.download_workers, args.clean_workers, args.batch_size, args.library)
+    print(f"\n📚 Ingested {len(report['ingested'])} books, skipped {len(report['skipped'])}, failed {len(report['failed'])}.")
+    print(f"⏱️ {report['seconds']:.1f}s — {report['books_per_minute']:.1f} books/min, {report['chunks_per_second']:.1f} chunks/s")
+    if report["failed"]:
+        print("Failed: " + ", ".join(report["failed"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# orchestrator/context_packer.py
+
+import re
+from functools import lru_cache
+
+from mcp_agents.llm_gateway import LLM_CONTEXT_WINDOW, LLM_MAX_TOKENS, count_tokens
+
+CHAT_TEMPLATE_TOKENS = 32  # role markers the chat template wraps around the prompt
+CONTEXT_SEPARATOR = "\n\n"
+SHINGLE_SIZE = 5  # words per shingle when comparing chunks
+DUPLICATE_THRESHOLD = 0.8  # share of the smaller chunk's shingles found in a kept chunk
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+@lru_cache(maxsize=8192)
+def _tokens(text: str) -> int:
+    # Retrieved chunks come back again and again, so their counts are memoized
+    return count_tokens(text)
+
+def _shingles(text: str) -> set:
+    words = re.sub(r"[^\w\s]", " ", text.lower()).split()
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def drop_near_duplicates(chunks: list[str], threshold: float = DUPLICATE_THRESHOLD) -> list[str]:
+    """
+    Keeps chunks in rank order, dropping any that mostly overlap a higher-ranked
+    one (the same passage from another copy of the book, or a contained chunk).
+    """
+    kept, kept_shingles = [], []
+    for chunk in chunks:
+        shingles = _shingles(chunk)
+        if not shingles:
+            continue
+        if any(len(shingles & other) / min(len(shingles), len(other)) >= threshold for other in kept_shingles):
+            continue
+        kept.append(chunk)
+        kept_shingles.append(shingles)
+    return kept
+
+def _trim_to_budget(chunk: str, budget: int) -> str:
+    """Longest run of whole sentences from the start of `chunk` that fits `budget` tokens."""
+    sentences = SENTENCE_END_RE.split(chunk)
+    low, high = 0, len(sentences)  # Binary search over the number of sentences kept
+    while low < high:
+        middle = (low + high + 1) // 2
+        if _tokens(" ".join(sentences[:middle])) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(sentences[:low])
+
+def _budget(build_prompt, max_tokens: int, context_window: int) -> int:
+    """Tokens left for context once the prompt, the chat template and the answer are accounted for."""
+    return context_window - max_tokens - CHAT_TEMPLATE_TOKENS - _tokens(build_prompt(""))
+
+def pack_context(chunks: list[str], build_prompt, max_tokens: int = LLM_MAX_TOKENS,
+                 context_window: int = LLM_CONTEXT_WINDOW) -> tuple[str, list[str]]:
+    """
+    Fits retrieved chunks (best first) into the model's context window.
+
+    `build_prompt(context)` renders the final prompt; its size without any
+    context plus `max_tokens` for the answer is reserved, and the rest is
+    filled with whole chunks in rank order, skipping near-duplicates and any
+    chunk that no longer fits. If not even the best chunk fits, its leading
+    sentences are used instead. Returns `(context, packed_chunks)`.
+    """
+    budget = _budget(build_prompt, max_tokens, context_window)
+    if budget <= 0:
+        print(f"WARNING: Prompt leaves no room for context ({budget} tokens over budget).")
+        return "", []
+
+    separator_tokens = _tokens(CONTEXT_SEPARATOR)
+    packed, used = [], 0
+    for chunk in drop_near_duplicates(chunks):
+        cost = _tokens(chunk) + (separator_tokens if packed else 0)
+        if used + cost <= budget:
+            packed.append(chunk)
+            used += cost
+
+    if not packed and chunks:
+        trimmed = _trim_to_budget(chunks[0], budget)
+        packed = [trimmed] if trimmed else []
+    return CONTEXT_SEPARATOR.join(packed), packed
+
+def group_to_budget(texts: list[str], build_prompt, max_tokens: int = LLM_MAX_TOKENS,
+                    context_window: int = LLM_CONTEXT_WINDOW) -> list[list[str]]:
+    """
+    Splits consecutive texts into runs that each fit the context window when
+    joined into `build_prompt`, keeping their order. A text that is too long on
+    its own is cut to its leading sentences.
+    """
+    budget = _budget(build_prompt, max_tokens, context_window)
+    separator_tokens = _tokens(CONTEXT_SEPARATOR)
+    groups, current, used = [], [], 0
+    for text in texts:
+        cost = _tokens(text)
+        if cost > budget:
+            text = _trim_to_budget(text, budget)
+            cost = _tokens(text)
+        if current and used + separator_tokens + cost > budget:
+            groups.append(current)
+            current, used = [], 0
+        used += cost + (separator_tokens if current else 0)
+        current.append(text)
+    if current:
+        groups.append(current)
+    return groups
@@ -0,0 +1,250 @@
+# orchestrator/evaluation.py
+#
+# Runs summaries, continuations and questions through orchestrate_request for a
+# set of books and scores the answers:
+#   python -m orchestrator.evaluation "Pride and Prejudice" "data/Jane Eyre.txt" --output eval_run.jsonl
+# Every finished case is appended to the output file right away, so an
+# interrupted run picks up where it stopped when started again with the same
+# output. Re-run after changing chunk size, top_k or the context budget to
+# compare quality against latency.
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from mcp_agents.llm_gateway import LLM_CONTEXT_WINDOW, LLM_MAX_TOKENS
+from mcp_agents import reranker
+from mcp_agents.chunker import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, CHUNKER_VERSION
+from mcp_agents.vector_store import (
+    DENSE_WEIGHT, LEXICAL_WEIGHT, _chunk_ids, extract_gutenberg_title, get_collection, ingest_book_file, is_book_ingested, load_manifest,
+)
+from orchestrator import orchestrator_agent
+from orchestrator.metrics import compute_perplexities
+
+QUESTIONS_PER_BOOK = 5
+PERPLEXITY_BATCH = 16  # answers scored per compute_perplexities call
+SENTENCE_RE = re.compile(r"[^.!?]+[.!?]")
+MIN_EXCERPT_WORDS, MAX_EXCERPT_WORDS = 8, 30
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def _title_for(source: str) -> str:
+    """Book title for a local .txt path (ingested on demand) or an already ingested title."""
+    if not os.path.exists(source):
+        return source
+    with open(source, "r", encoding="utf-8", errors="replace") as f:
+        title = extract_gutenberg_title(f.read(4096)) or os.path.splitext(os.path.basename(source))[0]
+    if not is_book_ingested(title):
+        print(f"🧠 Ingesting '{title}' for evaluation...")
+        ingest_book_file(title, source)
+    return title
+
+def _excerpt(text: str) -> str | None:
+    # The first match may be the tail of a sentence cut by the chunk boundary
+    for sentence in SENTENCE_RE.findall(" ".join(text.split()))[1:]:
+        words = sentence.split()
+        if MIN_EXCERPT_WORDS <= len(words) <= MAX_EXCERPT_WORDS:
+            return " ".join(words)
+    return None
+
+def build_cases(titles: list[str], questions_per_book: int = QUESTIONS_PER_BOOK, seed: int = 0) -> list[dict]:
+    """
+    One summary and one continuation per book, plus questions quoting a sentence
+    from randomly chosen chunks. The quoted sentence is the expected passage, so
+    a question's retrieval is a hit when a retrieved chunk contains it.
+    """
+    rng = random.Random(seed)
+    cases = []
+    for title in titles:
+        cases.append({"id": f"{title}|summary", "title": title, "intent": "summary",
+                      "input": "Summarize the book.", "expected": None})
+        cases.append({"id": f"{title}|continuation", "title": title, "intent": "continuation",
+                      "input": "Continue the story.", "expected": None})
+
+        manifest = load_manifest(title)
+        if not manifest or not manifest.get("chunk_count"):
+            print(f"[!] No manifest for '{title}', skipping its questions.")
+            continue
+        indexes = list(range(manifest["chunk_count"]))
+        rng.shuffle(indexes)
+        added = 0
+        for index in indexes:
+            if added == questions_per_book:
+                break
+            stored = get_collection().get(ids=_chunk_ids(title, index, 1))["documents"]
+            excerpt = _excerpt(stored[0]) if stored else None
+            if not excerpt:
+                continue
+            # Lower-cased so names in the quote aren't taken for a request to switch books
+            cases.append({"id": f"{title}|question|{index}", "title": title, "intent": "question",
+                          "input": f'What is happening in the passage: "{excerpt.lower()}"?', "expected": excerpt})
+            added += 1
+    return cases
+
+def _retrieval_rank(expected: str | None, chunks: list[str]) -> int | None:
+    """1-based rank of the first retrieved chunk containing the expected passage, 0 if none."""
+    if expected is None:
+        return None
+    needle = _normalize(expected)
+    for rank, chunk in enumerate(chunks, start=1):
+        if needle in _normalize(chunk):
+            return rank
+    return 0
+
+def run_case(case: dict) -> dict:
+    """Runs one case through the orchestrator (bypassing the response cache) and times it."""
+    trace = {}
+    record = {"id": case["id"], "title": case["title"], "intent": case["intent"]}
+    start = time.perf_counter()
+    try:
+        stream, _ = orchestrator_agent.orchestrate_request_stream(case["input"], case["title"], trace, use_cache=False)
+        pieces, first_token = [], None
+        for piece in stream:
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            pieces.append(piece)
+        record["response"] = "".join(pieces).strip()
+        record["first_token_seconds"] = first_token
+    except Exception as e:
+        record["error"] = str(e)
+    record["seconds"] = time.perf_counter() - start
+    record["parsed_intent"] = trace.get("intent")
+    record["intent_tier"] = trace.get("tier")
+    record["context_chunks"] = len(trace.get("context_chunks", []))
+    record["packed_chunks"] = trace.get("packed_chunks")
+    record["summary_tree"] = trace.get("summary_tree", False)
+    record["reranked"] = trace.get("reranked", False)
+    record["retrieval_rank"] = _retrieval_rank(case["expected"], trace.get("context_chunks", []))
+    if case["intent"] == "continuation":
+        record["retrieval_rank"] = 1 if trace.get("context_chunks") else 0  # Did we find where the book stops?
+    return record
+
+class Checkpoint:
+    """Append-only JSONL of case records; a later line for the same case replaces an earlier one."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # A line cut short by an interrupted run
+                    self.records[record["id"]] = record
+
+    def write(self, record: dict):
+        with self._lock:
+            self.records[record["id"]] = record
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+
+def _score_perplexities(checkpoint: Checkpoint, cpu_budget: int):
+    pending = [r for r in checkpoint.records.values()
+               if r.get("response") and "perplexity" not in r and not r.get("error")]
+    for start in range(0, len(pending), PERPLEXITY_BATCH):
+        batch = pending[start:start + PERPLEXITY_BATCH]
+        values = compute_perplexities([r["response"] for r in batch], num_threads=cpu_budget)
+        for record, value in zip(batch, values):
+            checkpoint.write(dict(record, perplexity=None if np.isnan(value) else value))
+        print(f"   ... perplexity scored for {start + len(batch)}/{len(pending)} answers")
+
+def summarize(records: list[dict]) -> dict:
+    """Per-intent latency percentiles, retrieval hit rate / MRR and mean perplexity."""
+    summary = {}
+    for intent in sorted({r["intent"] for r in records}):
+        group = [r for r in records if r["intent"] == intent]
+        ok = [r for r in group if not r.get("error")]
+        seconds = [r["seconds"] for r in ok]
+        first_tokens = [r["first_token_seconds"] for r in ok if r.get("first_token_seconds") is not None]
+        ranks = [r["retrieval_rank"] for r in ok if r.get("retrieval_rank") is not None]
+        perplexities = [r["perplexity"] for r in ok if r.get("perplexity") is not None]
+        summary[intent] = {
+            "cases": len(group),
+            "errors": len(group) - len(ok),
+            "intent_accuracy": sum(r["parsed_intent"] == intent for r in ok) / len(ok) if ok else None,
+            "latency_p50_seconds": float(np.percentile(seconds, 50)) if seconds else None,
+            "latency_p95_seconds": float(np.percentile(seconds, 95)) if seconds else None,
+            "first_token_p50_seconds": float(np.percentile(first_tokens, 50)) if first_tokens else None,
+            "retrieval_hit_rate": sum(rank > 0 for rank in ranks) / len(ranks) if ranks else None,
+            "retrieval_mrr": sum(1 / rank for rank in ranks if rank) / len(ranks) if ranks else None,
+            "perplexity_mean": float(np.mean(perplexities)) if perplexities else None,
+        }
+    return summary
+
+def run_config() -> dict:
+    """The retrieval settings the results depend on, stored with every run."""
+    return {
+        "chunker_version": CHUNKER_VERSION,
+        "chunk_tokens": CHUNK_TOKENS,
+        "chunk_overlap_tokens": CHUNK_OVERLAP_TOKENS,
+        "summary_top_k": orchestrator_agent.SUMMARY_TOP_K,
+        "question_top_k": orchestrator_agent.QUESTION_TOP_K,
+        "dense_weight": DENSE_WEIGHT,
+        "lexical_weight": LEXICAL_WEIGHT,
+        "rerank_enabled": reranker.RERANK_ENABLED,
+        "rerank_candidates": reranker.RERANK_CANDIDATES,
+        "rerank_budget_seconds": reranker.RERANK_BUDGET_SECONDS,
+        "context_window": LLM_CONTEXT_WINDOW,
+        "max_tokens": LLM_MAX_TOKENS,
+    }
+
+def run_evaluation(sources: list[str], output: str, cpu_budget: int | None = None,
+                   questions_per_book: int = QUESTIONS_PER_BOOK, skip_perplexity: bool = False, seed: int = 0) -> dict:
+    """
+    Evaluates every case not already in `output`. At most `cpu_budget` requests
+    run at a time (they still queue for the LLM pool), and the perplexity
+    scoring afterwards uses the same number of torch threads.
+    """
+    cpu_budget = cpu_budget or os.cpu_count() or 1
+    titles = [_title_for(source) for source in sources]
+    cases = build_cases(titles, questions_per_book, seed)
+    checkpoint = Checkpoint(output)
+    # Cases that failed last time are retried; their new record replaces the error
+    todo = [case for case in cases
+            if case["id"] not in checkpoint.records or checkpoint.records[case["id"]].get("error")]
+    print(f"📋 {len(cases)} cases, {len(cases) - len(todo)} already done, running {len(todo)} with {cpu_budget} workers.")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=cpu_budget) as pool:
+        futures = [pool.submit(run_case, case) for case in todo]
+        for done, future in enumerate(as_completed(futures), start=1):
+            record = future.result()
+            checkpoint.write(record)
+            status = f"error: {record['error']}" if record.get("error") else f"{record['seconds']:.1f}s"
+            print(f"[{done}/{len(todo)}] {record['id']} ({status})")
+
+    if not skip_perplexity:
+        _score_perplexities(checkpoint, cpu_budget)
+
+    case_ids = {case["id"] for case in cases}
+    records = [record for record in checkpoint.records.values() if record["id"] in case_ids]
+    return {"config": run_config(), "wall_seconds": time.perf_counter() - started, "summary": summarize(records)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate summaries, continuations and answers over a set of books.")
+    parser.add_argument("books", nargs="+", help="Ingested book titles or paths to local .txt books")
+    parser.add_argument("--output", default="eval_run.jsonl", help="Per-case results; reused to resume a run")
+    parser.add_argument("--cpu-budget", type=int, default=None, help="Concurrent requests and torch threads (default: CPU count)")
+    parser.add_argument("--questions-per-book", type=int, default=QUESTIONS_PER_BOOK)
+    parser.add_argument("--seed", type=int, default=0, help="Chooses the chunks the questions are about")
+    parser.add_argument("--skip-perplexity", action="store_true", help="Don't load GPT-2")
+    args = parser.parse_args()
+
+    report = run_evaluation(args.books, args.output, args.cpu_budget, args.questions_per_book,
+                            args.skip_perplexity, args.seed)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
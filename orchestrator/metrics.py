@@ -1,22 +1,145 @@
 # orchestrator/metrics.py
 
+import hashlib
 import math
-import torch
-from transformers import GPT2LMHeadModel, GPT2TokenizerFast
+import os
+import threading
+from collections import Counter, OrderedDict
+from mcp_agents.lazy import LazyResource
 #from blanc import BlancHelp
 
-# Load GPT-2 model + tokenizer once (for perplexity)
-tokenizer = GPT2TokenizerFast.from_pretrained("gpt2")
-model = GPT2LMHeadModel.from_pretrained("gpt2").eval()
+def _load_gpt2():
+    from transformers import GPT2LMHeadModel, GPT2TokenizerFast
+    tokenizer = GPT2TokenizerFast.from_pretrained("gpt2")
+    model = GPT2LMHeadModel.from_pretrained("gpt2").eval()
+    return tokenizer, model
+
+# Load GPT-2 model + tokenizer once, on first use (for perplexity)
+_gpt2 = LazyResource("GPT-2 perplexity model", _load_gpt2)
+
+GPT2_MAX_LENGTH = 1024  # GPT-2's context window
+PERPLEXITY_STRIDE = 512  # tokens between window starts; the rest of each window is context
+PERPLEXITY_BATCH_SIZE = 4  # windows per forward pass (logits are ~200 MB per full window)
+PERPLEXITY_CACHE_SIZE = 4096
+
+# Perplexity results keyed by text hash (and window settings), least recently used first
+_perplexity_cache = OrderedDict()
+_perplexity_cache_lock = threading.Lock()
+
+def prewarm():
+    """Starts loading GPT-2 in the background."""
+    return _gpt2.prewarm()
+
+def _configure_threads(num_threads=None):
+    import torch
+    torch.set_num_threads(num_threads or os.cpu_count() or 1)
+
+def _cache_key(text, stride):
+    return hashlib.sha256(f"{GPT2_MAX_LENGTH}:{stride}:{text}".encode("utf-8")).hexdigest()
+
+def _windows(num_tokens, stride):
+    """
+    Strided windows over a token sequence: yields (begin, end, score_from) so that
+    every token after the first is scored exactly once, each with up to
+    GPT2_MAX_LENGTH - stride tokens of preceding context.
+    """
+    scored_until = 1  # The first token has no context and is never scored
+    for begin in range(0, max(num_tokens - 1, 1), stride):
+        end = min(begin + GPT2_MAX_LENGTH, num_tokens)
+        if end > scored_until:
+            yield begin, end, scored_until
+            scored_until = end
+        if end == num_tokens:
+            break
 
 # Compute Perplexity
-def compute_perplexity(text):
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=1024)
-    input_ids = inputs.input_ids
-    with torch.no_grad():
-        outputs = model(input_ids, labels=input_ids)
-        loss = outputs.loss
-    return math.exp(loss.item())
+def compute_perplexity(text, stride=PERPLEXITY_STRIDE):
+    """
+    Perplexity of `text` under GPT-2. Texts longer than the 1024-token window are
+    scored with a strided sliding window instead of being truncated.
+    """
+    return compute_perplexities([text], stride=stride)[0]
+
+def compute_perplexities(texts, stride=PERPLEXITY_STRIDE, batch_size=PERPLEXITY_BATCH_SIZE, num_threads=None):
+    """
+    Scores many texts at once: the sliding windows of all texts are sorted by
+    length and run through GPT-2 in padded batches, using all CPU cores.
+    Results are cached by text hash. Texts shorter than two tokens get NaN.
+    """
+    import torch
+    results = [None] * len(texts)
+    keys = [_cache_key(text, stride) for text in texts]
+    with _perplexity_cache_lock:
+        for i, key in enumerate(keys):
+            if key in _perplexity_cache:
+                _perplexity_cache.move_to_end(key)
+                results[i] = _perplexity_cache[key]
+
+    todo = {}  # cache key -> index of the first text with that key
+    for i, key in enumerate(keys):
+        if results[i] is None:
+            todo.setdefault(key, i)
+    if todo:
+        _configure_threads(num_threads)
+        tokenizer, model = _gpt2.get()
+        windows = []  # (text index, token ids, first scored position within the window)
+        for i in todo.values():
+            input_ids = tokenizer(texts[i]).input_ids
+            for begin, end, score_from in _windows(len(input_ids), stride):
+                windows.append((i, input_ids[begin:end], score_from - begin))
+        windows.sort(key=lambda window: len(window[1]))
+
+        nll = dict.fromkeys(todo.values(), 0.0)
+        counts = dict.fromkeys(todo.values(), 0)
+        pad_id = tokenizer.eos_token_id
+        with torch.no_grad():
+            for start in range(0, len(windows), batch_size):
+                batch = windows[start:start + batch_size]
+                width = len(batch[-1][1])
+                ids = torch.full((len(batch), width), pad_id, dtype=torch.long)
+                attention = torch.zeros((len(batch), width), dtype=torch.long)
+                target_mask = torch.zeros((len(batch), width - 1), dtype=torch.bool)
+                for row, (_, window_ids, first_scored) in enumerate(batch):
+                    ids[row, :len(window_ids)] = torch.tensor(window_ids)
+                    attention[row, :len(window_ids)] = 1
+                    # Logit j predicts token j + 1
+                    target_mask[row, first_scored - 1:len(window_ids) - 1] = True
+                logits = model(ids, attention_mask=attention).logits[:, :-1]
+                token_nll = torch.nn.functional.cross_entropy(
+                    logits.transpose(1, 2), ids[:, 1:], reduction="none"
+                ) * target_mask
+                for row, (i, _, _) in enumerate(batch):
+                    nll[i] += token_nll[row].sum().item()
+                    counts[i] += int(target_mask[row].sum())
+
+        values = {key: math.exp(nll[i] / counts[i]) if counts[i] else float("nan") for key, i in todo.items()}
+        with _perplexity_cache_lock:
+            for key, value in values.items():
+                _perplexity_cache[key] = value
+                while len(_perplexity_cache) > PERPLEXITY_CACHE_SIZE:
+                    _perplexity_cache.popitem(last=False)
+        for i, key in enumerate(keys):
+            if results[i] is None:
+                results[i] = values[key]
+    return results
+
+# Which tier of the intent engine decided each request ("rules", "embedding" or "llm")
+_intent_tiers = Counter()
+_intent_tiers_lock = threading.Lock()
+
+def record_intent_tier(tier):
+    with _intent_tiers_lock:
+        _intent_tiers[tier or "unknown"] += 1
+
+def get_intent_tier_stats():
+    with _intent_tiers_lock:
+        counts = dict(_intent_tiers)
+    total = sum(counts.values())
+    return {
+        "counts": counts,
+        "total": total,
+        "llm_calls_avoided": total - counts.get("llm", 0),
+    }
 
 # BLANC-help model
 #blanc = BlancHelp("roberta-base", device="cuda" if torch.cuda.is_available() else "cpu")
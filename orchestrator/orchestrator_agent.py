@@ -1,14 +1,34 @@
 # orchestrator/orchestrator_agent.py
 
+import atexit
 import os
-from mcp_agents.gutenberg_api import GutenbergAPI
-from mcp_agents.llm_gateway import call_llm
+from typing import Iterator
+from mcp_agents.llm_scheduler import PRIORITY_ANSWER, PRIORITY_LONG
 # Make sure your prompt.py has the build_summary_prompt that accepts a string, as modified above
 from mcp_agents.prompt import build_question_prompt, build_summary_prompt, build_continuation_prompt, parse_intent_and_title
-from mcp_agents.vector_store import is_book_ingested, ingest_book, query_book, get_last_chunk, get_book_path, is_book_downloaded
+from mcp_agents.vector_store import get_book_path, is_book_downloaded, save_book_text, encode_query, DATA_DIR
+from mcp_agents import reranker
+from orchestrator.context_packer import pack_context
+from orchestrator.response_cache import ResponseCache
+from orchestrator.metrics import get_intent_tier_stats, record_intent_tier
+from orchestrator import summary_tree
+from mcp_hub import hub # Agent calls go through the hub, which times and coalesces them
 
 
-DATA_FOLDER = "data"
+DATA_FOLDER = DATA_DIR
+CACHEABLE_INTENTS = ("summary", "question") # Continuations are meant to differ between calls
+SUMMARY_TOP_K = 10
+QUESTION_TOP_K = 5
+
+# Generated answers are reused for repeated and near-duplicate requests
+response_cache = ResponseCache(os.path.join(DATA_FOLDER, "response_cache.json"), embed_fn=encode_query,
+                               section_fn=summary_tree.parse_section_request)
+atexit.register(response_cache.save)
+hub.register("response_cache_stats", response_cache.stats)
+hub.register("intent_tier_stats", get_intent_tier_stats)
+
+def _print_ingest_progress(batch_index, chunks_ingested):
+    print(f"   ... batch {batch_index + 1} written ({chunks_ingested} chunks so far)")
 
 def ensure_book_available_and_ingested(book_info: dict) -> str | None:
     gutenberg_id = book_info.get('gutenberg_id')
@@ -21,45 +41,107 @@ def ensure_book_available_and_ingested(book_info: dict) -> str | None:
     # Step 1: Check if the book is downloaded
     if not is_book_downloaded(title):
         print(f"🔄 Downloading '{title}'...")
-        raw_text = GutenbergAPI.download_book(gutenberg_id) 
+        raw_text = hub.call("download_book", gutenberg_id)
         if not raw_text:
             print(f"[!] Failed to download '{title}'.")
             return None
-        with open(get_book_path(title), "w", encoding="utf-8") as f:
-            f.write(raw_text)
+        save_book_text(title, raw_text) # Never half-written, even while another session reads it
+        del raw_text # Ingestion streams the book back from disk
         print(f"✅ '{title}' downloaded.")
     else:
         print(f"✅ '{title}' already downloaded.")
-        # Ensure raw_text is loaded if already downloaded but not in memory
-        with open(get_book_path(title), "r", encoding="utf-8") as f:
-            raw_text = f.read() 
 
     # Step 2: Check if the book is ingested (embeddings in ChromaDB)
-    if not is_book_ingested(title):
+    if not hub.call("is_book_ingested", title):
         print(f"🧠 Ingesting '{title}' into vector store...")
-        if not raw_text: # Ensure raw_text is available if it was only downloaded previously
-            with open(get_book_path(title), "r", encoding="utf-8") as f:
-                raw_text = f.read()
-        
-        ingestion_success = ingest_book(title, raw_text)
+        ingestion_success = hub.call("ingest_book_file", title, get_book_path(title), progress_callback=_print_ingest_progress, gutenberg_id=gutenberg_id)
         if not ingestion_success:
             print(f"[!] Ingestion failed for '{title}'.")
             return None
         else:
             print(f"🧠 '{title}' ingested.")
+            if summary_tree.AUTO_BUILD:
+                summary_tree.schedule_build(title) # Precompute its summaries while the user asks questions
     else:
         print(f"🧠 '{title}' already ingested. Skipping ingestion.")
     
     return title
 
-def orchestrate_request(user_input: str, current_remembered_title: str | None) -> tuple[str, str | None]:
+def orchestrate_request(user_input: str, current_remembered_title: str | None,
+                        trace: dict | None = None, use_cache: bool = True) -> tuple[str, str | None]:
     """
     Orchestrates the user's request, handling intent, title extraction, and execution.
     Returns a tuple: (response_string, new_remembered_title)
     """
+    response_stream, active_title = orchestrate_request_stream(user_input, current_remembered_title, trace, use_cache)
+    return "".join(response_stream).strip(), active_title
+
+def _retrieve(title: str, search_query: str, top_k: int, trace: dict, section: tuple | None = None,
+              rerank_query: str | None = None) -> list[str]:
+    """
+    Retrieves the chunks for a prompt. With the reranker enabled, RERANK_CANDIDATES
+    hits are fetched and the cross-encoder keeps the best `top_k` for `rerank_query`.
+    """
+    if not reranker.RERANK_ENABLED:
+        return hub.call("query_book", title, search_query, top_k=top_k, section=section)
+    hits = hub.call("query_book_hits", title, search_query, top_k=max(top_k, reranker.RERANK_CANDIDATES), section=section)
+    hits, trace["reranked"] = hub.call("rerank", rerank_query or search_query, hits, top_k)
+    return [chunk for _, chunk in hits]
+
+def _generate(prompt: str, priority: int, cache_entry: tuple | None = None) -> Iterator[str]:
+    """
+    Streams the LLM answer for a prompt. If `cache_entry` is given, the complete
+    answer is stored in the response cache once the stream has been fully consumed.
+    """
+    pieces = []
+    for token in hub.call("stream_llm", prompt, priority=priority):
+        pieces.append(token)
+        yield token
+    if cache_entry:
+        intent, title, cache_query, query_embedding = cache_entry
+        response_cache.put(intent, title, cache_query, "".join(pieces).strip(), query_embedding)
+
+def _precomputed_summary(user_input: str, title: str) -> str | None:
+    """
+    Answers summary requests from the book's summary tree: the whole book, or a
+    chapter for requests like "summarize chapter 3". Returns None when the tree
+    can't answer yet (the caller falls back to retrieval).
+    """
+    tree = summary_tree.load_tree(title)
+    if tree is None or tree.get("status") != summary_tree.STATUS_COMPLETE:
+        if not summary_tree.AUTO_BUILD:
+            return None
+        summary_tree.schedule_build(title)
+
+    section_request = summary_tree.parse_section_request(user_input)
+    if section_request is None:
+        return tree["summary"] if tree and tree.get("status") == summary_tree.STATUS_COMPLETE else None
+    kind, number, part = section_request
+    section = summary_tree.find_section(tree, kind, number, part) if tree else None
+    if section and section.get("summary"):
+        return f"**{section['label']}**\n\n{section['summary']}"
+    if kind in summary_tree.PART_KINDS and tree and any(s.get("part") == number for s in tree["sections"]):
+        return None  # A part made of several chapter sections; retrieval over its chapters answers
+    if tree and tree.get("status") == summary_tree.STATUS_COMPLETE:
+        return f"I couldn't find {kind} {number} in '{title}'. It is divided into: {', '.join(s['label'] for s in tree['sections'])}."
+    return None  # Not summarized yet; chapter-filtered retrieval answers meanwhile
+
+def orchestrate_request_stream(user_input: str, current_remembered_title: str | None,
+                               trace: dict | None = None, use_cache: bool = True) -> tuple[Iterator[str], str | None]:
+    """
+    Streaming variant of orchestrate_request.
+    Returns a tuple: (iterator over response text pieces, new_remembered_title).
+    Intent parsing and retrieval happen before returning; LLM tokens are
+    produced while the iterator is consumed.
+    If `trace` is a dict it is filled with the parsed intent, the retrieved
+    context chunks and whether the response cache answered (for evaluation).
+    """
+    trace = trace if trace is not None else {}
     parsed_input = parse_intent_and_title(user_input, current_remembered_title)
+    record_intent_tier(parsed_input.get("tier"))
     intent = parsed_input.get("intent")
     extracted_title = parsed_input.get("title")
+    trace.update(intent=intent, tier=parsed_input.get("tier"), context_chunks=[], cache_hit=False)
 
     # Determine the book title to work with
     active_title = current_remembered_title
@@ -68,73 +150,104 @@ def orchestrate_request(user_input: str, current_remembered_title: str | None) -
     if intent == "switch_book":
         if extracted_title:
             print(f"Attempting to switch to '{extracted_title}'...")
-            books_found = GutenbergAPI.search_books({"title": extracted_title})
+            if parsed_input.get("gutenberg_id"):  # Already resolved through the offline catalog
+                books_found = [{"title": extracted_title, "gutenberg_id": parsed_input["gutenberg_id"]}]
+            else:
+                # Search while checking whether the title is a book we already have; then the search isn't waited for
+                search = hub.submit("search_books", {"title": extracted_title})
+                if hub.call("is_book_ingested", extracted_title):
+                    response = f"📖 Switched to '{extracted_title}'. How can I help you with this book?"
+                    return iter([response]), extracted_title
+                books_found = search.result()
             if books_found:
                 selected_book_info = books_found[0]
                 verified_title = ensure_book_available_and_ingested(selected_book_info)
                 if verified_title:
                     active_title = verified_title
                     response = f"📖 Switched to '{active_title}'. How can I help you with this book?"
-                    return response, active_title
+                    return iter([response]), active_title
                 else:
                     response = f"❌ Could not make '{extracted_title}' available. Continuing with '{current_remembered_title or 'no book'}'. Try another title for switching."
-                    return response, current_remembered_title
+                    return iter([response]), current_remembered_title
             else:
                 response = f"❌ Cannot find book '{extracted_title}' to switch to. Continuing with '{current_remembered_title or 'no book'}'. "
-                return response, current_remembered_title
+                return iter([response]), current_remembered_title
         else:
-            return "Please provide a book title or ID to switch to.", current_remembered_title
+            return iter(["Please provide a book title or ID to switch to."]), current_remembered_title
             
     if active_title is None:
-        return "Please specify which book you are asking about, or search for one first (e.g., 'Search for Moby Dick').", None
+        return iter(["Please specify which book you are asking about, or search for one first (e.g., 'Search for Moby Dick')."]), None
+
+    if intent == "summary":
+        precomputed = _precomputed_summary(user_input, active_title)
+        if precomputed is not None:
+            trace["summary_tree"] = True
+            return iter([precomputed]), active_title
+
+    # Summaries don't depend on the wording of the request, only on the section asked for; questions do
+    section_request = summary_tree.parse_section_request(user_input)
+    if intent == "summary":
+        cache_query = "summary" if section_request is None else "summary of {} {} in part {}".format(*section_request)
+    else:
+        cache_query = user_input
+    query_embedding = None
+    if use_cache and intent in CACHEABLE_INTENTS:
+        cached_response, query_embedding = response_cache.lookup(intent, active_title, cache_query)
+        if cached_response is not None:
+            trace["cache_hit"] = True
+            return iter([cached_response]), active_title
 
     if intent == "summary":
         search_query_for_vector_store = f"summary of the book {active_title}"
-        # Increased top_k for summary, since we're truncating anyway.
-        # This gives a broader initial context before trimming.
-        context_chunks = query_book(active_title, search_query_for_vector_store, top_k=10) 
-        
-        context = "\n\n".join(context_chunks)
-        
-        # --- SIMPLE TRUNCATION FOR SUMMARIZATION (PRIORITIZING SIMPLICITY OVER ACCURACY) ---
-        if len(context) > 3000:
-            print(f"WARNING: Summary context too long ({len(context)} chars), truncating to 3000 chars.")
-            context = context[:3000]
-        # ---------------------------------------------------------------------------------
+        # Increased top_k for summary; the packer keeps as many as fit in the context window.
+        # "Summarize chapter 3" without a summary tree only retrieves from that chapter
+        context_chunks = _retrieve(active_title, user_input, SUMMARY_TOP_K, trace,
+                                   section=section_request) if section_request else []
+        if not context_chunks:
+            context_chunks = _retrieve(active_title, search_query_for_vector_store, SUMMARY_TOP_K, trace)
+        trace["context_chunks"] = context_chunks
+
+        # As many whole chunks as fit in the LLM's context window next to the prompt and the answer
+        context, packed_chunks = pack_context(context_chunks, lambda text: build_summary_prompt(active_title, text))
+        trace["packed_chunks"] = len(packed_chunks)
 
         if not context.strip():
             response = f"I don't have enough information to summarize '{active_title}'. It might not be fully ingested or I couldn't retrieve relevant content."
         else:
             prompt = build_summary_prompt(active_title, context) # Pass context as string
-            response = call_llm(prompt)
+            response = _generate(prompt, PRIORITY_LONG, (intent, active_title, cache_query, query_embedding) if use_cache else None)
 
     elif intent == "continuation":
-        last_chunk = get_last_chunk(active_title)
+        last_chunk = hub.call("get_last_chunk", active_title)
+        trace["context_chunks"] = [last_chunk] if last_chunk else []
         if not last_chunk:
             response = f"I cannot find the last part of '{active_title}' to continue the story."
         else:
             prompt = build_continuation_prompt(active_title, last_chunk)
-            response = call_llm(prompt)
+            response = _generate(prompt, PRIORITY_LONG)
 
     elif intent == "question":
         search_query_for_vector_store = f"{user_input} from {active_title}" 
         
-        context_chunks = query_book(active_title, search_query_for_vector_store, top_k=5)
-        context = "\n\n".join(context_chunks)
-        
-        # --- SIMPLE TRUNCATION FOR QUESTION CONTEXT (PRIORITIZING SIMPLICITY OVER ACCURACY) ---
-        if len(context) > 3000: # Apply truncation here too for consistency and safety
-            print(f"WARNING: Question context too long ({len(context)} chars), truncating to 3000 chars.")
-            context = context[:3000]
-        # -------------------------------------------------------------------------------------
+        # "What happens in chapter 3?" only searches that chapter, if the book's chunks record chapters
+        context_chunks = _retrieve(active_title, search_query_for_vector_store, QUESTION_TOP_K, trace,
+                                   section=section_request, rerank_query=user_input) if section_request else []
+        if not context_chunks:
+            context_chunks = _retrieve(active_title, search_query_for_vector_store, QUESTION_TOP_K, trace,
+                                       rerank_query=user_input)
+        trace["context_chunks"] = context_chunks
+        context, packed_chunks = pack_context(context_chunks, lambda text: build_question_prompt(active_title, text, user_input))
+        trace["packed_chunks"] = len(packed_chunks)
 
         if not context.strip():
             response = f"I couldn't find specific information related to '{user_input}' in '{active_title}'. The book might not be fully ingested or the query is too specific for the available content."
         else:
             prompt = build_question_prompt(active_title, context, user_input)
-            response = call_llm(prompt)
+            response = _generate(prompt, PRIORITY_ANSWER, (intent, active_title, cache_query, query_embedding) if use_cache else None)
             
     else:
         response = "Sorry, I didn't understand your request."
 
+    if isinstance(response, str):
+        response = iter([response])
     return response, active_title
\ No newline at end of file
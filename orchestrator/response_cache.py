@@ -0,0 +1,212 @@
+# orchestrator/response_cache.py
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_SIMILARITY_THRESHOLD = 0.92  # cosine similarity for a near-duplicate query
+SAVE_EVERY = 10  # persist after this many new entries
+
+def normalize_prompt(text: str) -> str:
+    text = re.sub(r"\s+", " ", text.lower()).strip()
+    return text.rstrip("?!. ")
+
+def _exact_key(intent: str, title: str, query: str) -> str:
+    raw = f"{intent}\x1f{title.lower()}\x1f{normalize_prompt(query)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _digest(vectors: np.ndarray) -> str:
+    return hashlib.blake2b(np.ascontiguousarray(vectors, dtype=np.float32).tobytes(), digest_size=16).hexdigest()
+
+class ResponseCache:
+    """
+    Cache of generated answers in front of the LLM.
+
+    Exact hits are keyed by (intent, title, normalized prompt hash). On an exact
+    miss the query embedding is compared against the cached queries for the same
+    intent, book and section (a small in-memory index per bucket); a match above
+    `similarity_threshold` is a near hit. `section_fn(query)` names the section
+    a query is about ("chapter 3"), so queries that differ only in it never
+    answer each other. Entries expire after `ttl_seconds`,
+    the least recently used are evicted beyond `max_entries`, and the cache is
+    persisted to `path` (+ `.npy` for the query embeddings).
+    """
+
+    def __init__(self, path: str, embed_fn=None, section_fn=None, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD):
+        self.path = path
+        self.embed_fn = embed_fn
+        self.section_fn = section_fn
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._entries = OrderedDict()  # exact key -> entry dict, least recently used first
+        self._embeddings = {}  # exact key -> unit-length query embedding
+        self._buckets = {}  # (intent, title, section) -> (keys, matrix), rebuilt when the bucket changes
+        self._stats = {}
+        self._unsaved = 0
+        self._load()
+
+    # --- persistence ---
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            vectors = np.load(self.path + ".npy") if os.path.exists(self.path + ".npy") else None
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable response cache '{self.path}': {e}")
+            return
+        if vectors is not None and saved.get("embeddings_digest") != _digest(vectors):
+            vectors = None  # Written by another save than the entries; only exact hits are usable
+
+        now = time.time()
+        for entry in saved.get("entries", []):
+            if now - entry["created"] > self.ttl_seconds:
+                continue
+            key = entry.pop("key")
+            row = entry.pop("embedding_row", None)
+            entry.setdefault("section", self._section(entry["query"]))
+            self._entries[key] = entry
+            if vectors is not None and row is not None and row < len(vectors):
+                self._embeddings[key] = vectors[row]
+
+    def save(self):
+        with self._save_lock:  # Saves run one at a time, each writing the latest snapshot
+            with self._lock:
+                entries, vectors = [], []
+                for key, entry in self._entries.items():
+                    record = dict(entry, key=key)
+                    if key in self._embeddings:
+                        record["embedding_row"] = len(vectors)
+                        vectors.append(self._embeddings[key])
+                    entries.append(record)
+                self._unsaved = 0
+            matrix = np.stack(vectors).astype(np.float32) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # The embeddings first, then the entries that point into them (with their digest)
+            with open(self.path + ".npy.tmp", "wb") as f:
+                np.save(f, matrix)
+            os.replace(self.path + ".npy.tmp", self.path + ".npy")
+            with open(self.path + ".json.tmp", "w", encoding="utf-8") as f:
+                json.dump({"entries": entries, "embeddings_digest": _digest(matrix)}, f)
+            os.replace(self.path + ".json.tmp", self.path)
+
+    # --- lookups ---
+
+    def _record(self, intent: str, outcome: str):
+        counters = self._stats.setdefault(intent, {"exact_hits": 0, "semantic_hits": 0, "misses": 0})
+        counters[outcome] += 1
+
+    def _embed(self, query: str):
+        if self.embed_fn is None:
+            return None
+        vector = np.asarray(self.embed_fn(normalize_prompt(query)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _section(self, query: str) -> list | None:
+        section = self.section_fn(query) if self.section_fn else None
+        return list(section) if section else None  # As stored in the JSON file
+
+    def _bucket_id(self, intent: str, title: str, section: list | None) -> tuple:
+        return intent, title.lower(), tuple(section) if section else None
+
+    def _is_expired(self, entry: dict) -> bool:
+        return time.time() - entry["created"] > self.ttl_seconds
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key)
+        self._embeddings.pop(key, None)
+        self._buckets.pop(self._bucket_id(entry["intent"], entry["title"], entry.get("section")), None)
+
+    def _bucket(self, bucket_id: tuple):
+        bucket = self._buckets.get(bucket_id)
+        if bucket is None:
+            keys = [key for key, entry in self._entries.items()
+                    if self._bucket_id(entry["intent"], entry["title"], entry.get("section")) == bucket_id
+                    and key in self._embeddings]
+            matrix = np.stack([self._embeddings[key] for key in keys]) if keys else None
+            bucket = self._buckets[bucket_id] = (keys, matrix)
+        return bucket
+
+    def lookup(self, intent: str, title: str, query: str):
+        """Returns `(response, query_embedding)`; response is None on a miss."""
+        key = _exact_key(intent, title, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_expired(entry):
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._record(intent, "exact_hits")
+                return entry["response"], None
+
+        embedding = self._embed(query)
+        if embedding is not None:
+            with self._lock:
+                keys, matrix = self._bucket(self._bucket_id(intent, title, self._section(query)))
+                if matrix is not None:
+                    similarities = matrix @ embedding
+                    best = int(np.argmax(similarities))
+                    best_key = keys[best]
+                    entry = self._entries.get(best_key)
+                    if (similarities[best] >= self.similarity_threshold
+                            and entry is not None and not self._is_expired(entry)):
+                        self._entries.move_to_end(best_key)
+                        self._record(intent, "semantic_hits")
+                        return entry["response"], embedding
+
+        with self._lock:
+            self._record(intent, "misses")
+        return None, embedding
+
+    def put(self, intent: str, title: str, query: str, response: str, embedding=None):
+        key = _exact_key(intent, title, query)
+        if embedding is None:
+            embedding = self._embed(query)
+        section = self._section(query)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = {
+                "intent": intent,
+                "title": title,
+                "query": query,
+                "section": section,
+                "response": response,
+                "created": time.time(),
+            }
+            if embedding is not None:
+                self._embeddings[key] = embedding
+            self._buckets.pop(self._bucket_id(intent, title, section), None)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+            self._unsaved += 1
+            should_save = self._unsaved >= SAVE_EVERY
+        if should_save:
+            self.save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            per_intent = {}
+            for intent, counters in self._stats.items():
+                total = sum(counters.values())
+                hits = counters["exact_hits"] + counters["semantic_hits"]
+                per_intent[intent] = dict(counters, hit_rate=hits / total if total else 0.0)
+            return {"entries": len(self._entries), "per_intent": per_intent}
@@ -0,0 +1,289 @@
+# orchestrator/summary_tree.py
+#
+# Precomputed map-reduce summaries of whole books. Consecutive chunks are
+# summarized in groups that fill the LLM's context window (the leaves), leaf
+# summaries are combined per chapter (the sections), and section summaries into
+# one summary of the book. Trees are built in the background after ingestion,
+# at the lowest scheduler priority, and stored under data/summaries; a partly
+# built tree is resumed where it stopped. To build one in the foreground:
+#   python -m orchestrator.summary_tree "Pride and Prejudice"
+
+import argparse
+import json
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from mcp_agents.chunker import PART_KINDS, filter_headings, find_headings, parse_number
+from mcp_agents.llm_gateway import LLM_POOL_SIZE, call_llm
+from mcp_agents.llm_scheduler import PRIORITY_BACKGROUND, RequestPreempted, SchedulerQueueFull
+from mcp_agents.prompt import build_combine_summaries_prompt, build_passage_summary_prompt
+from mcp_agents.vector_store import (
+    DATA_DIR, STATUS_COMPLETE, _chunk_ids, _manifest_paths, get_collection, load_manifest,
+)
+from orchestrator.context_packer import CONTEXT_SEPARATOR, group_to_budget
+
+SUMMARY_DIR = os.path.join(DATA_DIR, "summaries")
+SUMMARY_TREE_VERSION = 1
+AUTO_BUILD = os.environ.get("SUMMARY_TREE_AUTO_BUILD", "1") == "1"  # build trees after ingestion
+SUMMARY_WORKERS = LLM_POOL_SIZE + 1  # enough requests to keep every model instance busy (command-line builds)
+# One request per model instance; the scheduler preempts them whenever an interactive request is waiting
+BACKGROUND_SUMMARY_WORKERS = LLM_POOL_SIZE
+SECTION_CHUNKS = 20  # section size for books without recognizable chapter headings
+FETCH_BATCH = 256
+QUEUE_FULL_RETRY_SECONDS = 5
+
+STATUS_BUILDING = "building"
+
+# "summarize chapter 3", "summary of stave two", "what happens in part IV", "part 2, chapter 3"
+SECTION_REQUEST_RE = re.compile(r"\b(chapter|stave|book|part|act)\s+([ivxlcdm]+|\d+|[a-z]+)\b", re.I)
+
+def parse_section_request(user_input: str) -> tuple[str, int, int | None] | None:
+    """
+    Returns `(kind, number, part)` for requests like "summarize chapter 3"
+    (part None) or "chapter 3 of part 2" (part 2), else None.
+    """
+    named = [(match.group(1).lower(), parse_number(match.group(2))) for match in SECTION_REQUEST_RE.finditer(user_input)]
+    named = [(kind, number) for kind, number in named if number is not None]
+    if not named:
+        return None
+    chapters = [section for section in named if section[0] not in PART_KINDS]
+    parts = [section for section in named if section[0] in PART_KINDS]
+    if chapters and parts:
+        return chapters[0][0], chapters[0][1], parts[0][1]
+    return named[0][0], named[0][1], None
+
+def _tree_path(title: str) -> str:
+    return os.path.join(SUMMARY_DIR, os.path.basename(_manifest_paths(title)[0]))
+
+def _matches(tree: dict, manifest: dict) -> bool:
+    """True if the tree was built from the chunks the book's manifest describes."""
+    return (tree.get("version") == SUMMARY_TREE_VERSION and tree.get("chunk_count") == manifest.get("chunk_count")
+            and tree.get("chunker_version") == manifest.get("chunker_version", 1)
+            and tree.get("content_hash") == manifest.get("content_hash"))
+
+def load_tree(title: str) -> dict | None:
+    """The book's summary tree, or None if there is none for its current ingestion."""
+    try:
+        with open(_tree_path(title), "r", encoding="utf-8") as f:
+            tree = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    manifest = load_manifest(title)
+    return tree if manifest is None or _matches(tree, manifest) else None
+
+def _save_tree(tree: dict):
+    path = _tree_path(tree["title"])
+    os.makedirs(SUMMARY_DIR, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(tree, f)
+    os.replace(tmp_path, path)
+
+def get_book_summary(title: str) -> str | None:
+    """The precomputed summary of the whole book, or None if its tree isn't finished."""
+    tree = load_tree(title)
+    return tree["summary"] if tree and tree.get("status") == STATUS_COMPLETE else None
+
+def find_section(tree: dict, kind: str, number: int, part: int | None = None) -> dict | None:
+    """The tree's section for a request; the first match unless `part` is given (see find_chapters)."""
+    for section in tree["sections"]:
+        if section["kind"] == kind and section["number"] == number and part in (None, section.get("part", 0)):
+            return section
+    return None
+
+# --- building ---
+
+def _fetch_chunks(title: str, chunk_count: int) -> tuple[list[str], list[dict]]:
+    chunks, metadatas = [], []
+    for start in range(0, chunk_count, FETCH_BATCH):
+        ids = _chunk_ids(title, start, min(FETCH_BATCH, chunk_count - start))
+        result = get_collection().get(ids=ids, include=["documents", "metadatas"])
+        by_id = {chunk_id: (document, metadata or {})
+                 for chunk_id, document, metadata in zip(result["ids"], result["documents"], result["metadatas"])}
+        for chunk_id in ids:
+            document, metadata = by_id.get(chunk_id, ("", {}))
+            chunks.append(document)
+            metadatas.append(metadata)
+    return chunks, metadatas
+
+def _headings_from_metadata(metadatas: list[dict]) -> list[dict]:
+    headings = []
+    for index, metadata in enumerate(metadatas):
+        chapter = metadata.get("chapter_index", -1)
+        if chapter >= 0 and (not headings or headings[-1]["chapter_index"] != chapter):
+            headings.append({"chunk": index, "chapter_index": chapter, "kind": metadata["chapter_kind"],
+                             "number": metadata["chapter_number"], "part": metadata.get("chapter_part", 0),
+                             "label": metadata["chapter"]})
+    return headings
+
+def _headings_from_text(chunks: list[str]) -> list[dict]:
+    """Heading detection for books chunked before chunks carried chapter metadata."""
+    headings, position = [], 0
+    for index, chunk in enumerate(chunks):
+        for heading in find_headings(chunk):
+            headings.append(dict(heading, chunk=index, position=position + heading["position"]))
+        position += len(chunk)
+    return filter_headings(headings)
+
+def find_sections(chunks: list[str], metadatas: list[dict] | None = None) -> list[dict]:
+    """
+    Splits the book into chapters, using the chapter metadata recorded by the
+    structural chunker (or headings found in the chunk texts), or into runs of
+    SECTION_CHUNKS chunks when there are too few chapters.
+    """
+    if metadatas and any("chapter_index" in metadata for metadata in metadatas):
+        headings = _headings_from_metadata(metadatas)
+    else:
+        headings = _headings_from_text(chunks)
+
+    if len(headings) < 2:
+        return [{"kind": "part", "number": i + 1, "label": f"Part {i + 1}", "first_chunk": start,
+                 "last_chunk": min(start + SECTION_CHUNKS, len(chunks)) - 1}
+                for i, start in enumerate(range(0, len(chunks), SECTION_CHUNKS))]
+
+    sections = []
+    if headings[0]["chunk"] > 0:
+        sections.append({"kind": "opening", "number": None, "label": "Opening", "first_chunk": 0})
+    for heading in headings:
+        if sections and sections[-1]["first_chunk"] == heading["chunk"]:
+            sections.pop()  # Two headings in one chunk; the later one starts the section
+        sections.append({"kind": heading["kind"], "number": heading["number"], "part": heading.get("part", 0),
+                         "label": heading["label"], "first_chunk": heading["chunk"]})
+    for section, following in zip(sections, sections[1:] + [None]):
+        section["last_chunk"] = (following["first_chunk"] if following else len(chunks)) - 1
+    return sections
+
+def _new_tree(title: str, manifest: dict, chunks: list[str], metadatas: list[dict]) -> dict:
+    sections = find_sections(chunks, metadatas)
+    for section in sections:
+        texts = chunks[section["first_chunk"]:section["last_chunk"] + 1]
+        groups = group_to_budget(texts, lambda text: build_passage_summary_prompt(title, text))
+        section["leaves"], start = [], section["first_chunk"]
+        for group in groups:
+            section["leaves"].append({"first_chunk": start, "last_chunk": start + len(group) - 1, "summary": None})
+            start += len(group)
+        section["summary"] = None
+    return {
+        "title": title,
+        "version": SUMMARY_TREE_VERSION,
+        "status": STATUS_BUILDING,
+        "chunker_version": manifest.get("chunker_version", 1),
+        "content_hash": manifest.get("content_hash"),
+        "chunk_count": manifest["chunk_count"],
+        "sections": sections,
+        "summary": None,
+    }
+
+def _summarize(prompt: str) -> str:
+    while True:
+        try:
+            return call_llm(prompt, priority=PRIORITY_BACKGROUND, timeout=None)
+        except SchedulerQueueFull:
+            time.sleep(QUEUE_FULL_RETRY_SECONDS)  # Interactive traffic has the queue full; wait our turn
+        except RequestPreempted:
+            pass  # Gave way to an interactive request; queue again behind it
+
+def _combine(title: str, section: str, summaries: list[str]) -> str:
+    """Reduces consecutive summaries to one, in as few rounds as the context window allows."""
+    while len(summaries) > 1:
+        groups = group_to_budget(summaries, lambda text: build_combine_summaries_prompt(title, section, text))
+        if len(groups) == len(summaries):
+            groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]  # Always make progress
+        summaries = [_summarize(build_combine_summaries_prompt(title, section, CONTEXT_SEPARATOR.join(group)))
+                     if len(group) > 1 else group[0] for group in groups]
+    return summaries[0] if summaries else ""
+
+def build_tree(title: str, workers: int = SUMMARY_WORKERS) -> dict | None:
+    """
+    Builds (or finishes) the summary tree of an ingested book. Every finished
+    node is saved right away, so an interrupted build resumes where it stopped.
+    """
+    manifest = load_manifest(title)
+    if not manifest or manifest.get("status") != STATUS_COMPLETE:
+        print(f"[!] '{title}' is not fully ingested; cannot build its summary tree.")
+        return None
+    tree = load_tree(title)  # None if the book was re-ingested since the tree was started
+    if tree and tree.get("status") == STATUS_COMPLETE:
+        return tree
+
+    started = time.perf_counter()
+    chunks, metadatas = _fetch_chunks(title, manifest["chunk_count"])
+    if not tree:
+        tree = _new_tree(title, manifest, chunks, metadatas)
+        _save_tree(tree)
+    lock = threading.Lock()
+
+    def summarize_leaf(leaf):
+        passage = CONTEXT_SEPARATOR.join(chunks[leaf["first_chunk"]:leaf["last_chunk"] + 1])
+        leaf["summary"] = _summarize(build_passage_summary_prompt(title, passage))
+
+    def summarize_section(section):
+        section["summary"] = _combine(title, section["label"], [leaf["summary"] for leaf in section["leaves"]])
+
+    pending_leaves = [leaf for section in tree["sections"] for leaf in section["leaves"] if leaf["summary"] is None]
+    pending_sections = [section for section in tree["sections"] if section["summary"] is None]
+    print(f"🌳 Building the summary tree of '{title}': {len(pending_leaves)} passages, {len(pending_sections)} sections to go.")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for stage, func, nodes in (("passages", summarize_leaf, pending_leaves),
+                                   ("sections", summarize_section, pending_sections)):
+            futures = [pool.submit(func, node) for node in nodes]
+            for done, future in enumerate(as_completed(futures), start=1):
+                future.result()
+                with lock:
+                    _save_tree(tree)
+                if done % 10 == 0 or done == len(futures):
+                    print(f"   ... {done}/{len(futures)} {stage} of '{title}' summarized")
+
+    tree["summary"] = _combine(title, "the whole book", [section["summary"] for section in tree["sections"]])
+    tree["status"] = STATUS_COMPLETE
+    _save_tree(tree)
+    print(f"🌳 Summary tree of '{title}' finished in {time.perf_counter() - started:.0f}s.")
+    return tree
+
+# --- background builds ---
+
+_build_queue = queue.Queue()
+_scheduled = set()
+_scheduled_lock = threading.Lock()
+_builder = None
+
+def _run_builder():
+    while True:
+        title = _build_queue.get()
+        try:
+            build_tree(title, BACKGROUND_SUMMARY_WORKERS)
+        except Exception as e:
+            print(f"[!] Building the summary tree of '{title}' failed: {e}")
+        finally:
+            with _scheduled_lock:
+                _scheduled.discard(title)
+
+def schedule_build(title: str):
+    """Queues a background build of the book's summary tree (once per book at a time)."""
+    global _builder
+    with _scheduled_lock:
+        if title in _scheduled:
+            return
+        _scheduled.add(title)
+        if _builder is None:
+            _builder = threading.Thread(target=_run_builder, name="summary-tree-builder", daemon=True)
+            _builder.start()
+    _build_queue.put(title)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the hierarchical summaries of ingested books.")
+    parser.add_argument("titles", nargs="+", help="Titles of ingested books")
+    parser.add_argument("--workers", type=int, default=SUMMARY_WORKERS, help="Concurrent LLM requests")
+    args = parser.parse_args()
+    for title in args.titles:
+        tree = build_tree(title, args.workers)
+        if tree:
+            print(f"\n📖 {title}\n{tree['summary']}\n")
+
+if __name__ == "__main__":
+    main()
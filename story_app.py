@@ -1,38 +1,30 @@
 import sys
 import streamlit as st
 import requests
-import json
-import os
 
 print(f"DEBUG: Python executable: {sys.executable}")
 print(f"DEBUG: sys.path: {sys.path}")
 
 # ... rest of your app.py code ...
-# Import your backend logic
-from orchestrator.orchestrator_agent import orchestrate_request, ensure_book_available_and_ingested
-from mcp_agents.gutenberg_api import GutenbergAPI
-
-CHAT_HISTORY_FILE = "chat_history.json"
-DATA_FOLDER = "data"
-os.makedirs(DATA_FOLDER, exist_ok=True) # Ensure data directory exists
-
-# --- Safely load chat threads as a dict ---
-if os.path.exists(CHAT_HISTORY_FILE):
-    try:
-        with open(CHAT_HISTORY_FILE, "r") as f:
-            all_threads = json.load(f)
-        if not isinstance(all_threads, dict):
-            all_threads = {}
-    except json.JSONDecodeError:
-        all_threads = {}
-else:
-    all_threads = {}
-
-# Store all_threads in session state once
-if "all_threads" not in st.session_state:
-    st.session_state.all_threads = all_threads
-
-# Initialize messages if not exists
+# The models live in backend_service.py (one process shared by all Streamlit workers)
+from backend_client import BackendClient, BackendError
+from chat_store import ChatStore, MESSAGES_PAGE_SIZE
+
+@st.cache_resource
+def get_backend():
+    # One pooled client per Streamlit server process, shared by all sessions
+    return BackendClient()
+
+backend = get_backend()
+
+@st.cache_resource
+def get_chat_store():
+    # One store per server process; it imports chat_history.json the first time
+    return ChatStore()
+
+chat_store = get_chat_store()
+
+# Initialize messages if not exists (only the latest page of the current thread)
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
@@ -46,23 +38,24 @@ if "remembered_title" not in st.session_state:
 
 st.set_page_config(page_title="📖 Resume a Story, or Start a New Chapter", layout="centered")
 
+if not backend.is_available():
+    st.error("The book assistant backend isn't running. Start it with `python backend_service.py` and reload this page.")
+    st.stop()
+
 st.sidebar.title("📂 Chat Threads")
 
-thread_names = list(st.session_state.all_threads.keys())
+thread_names = chat_store.list_threads()
 selected_thread = st.sidebar.selectbox("Select a thread", ["➕ New Thread"] + thread_names, key="thread_selector")
 
 # Handle new thread creation
 if selected_thread == "➕ New Thread":
     new_name = st.sidebar.text_input("Enter new thread name:")
     if new_name and st.sidebar.button("Create Thread"):
-        if new_name not in st.session_state.all_threads:
-            st.session_state.all_threads[new_name] = []
+        if chat_store.create_thread(new_name):
             st.session_state.current_thread = new_name
             st.session_state.messages = []
             # Reset remembered_title when starting a new thread
             st.session_state.remembered_title = None 
-            with open(CHAT_HISTORY_FILE, "w") as f:
-                json.dump(st.session_state.all_threads, f)
             st.rerun()
         else:
             st.sidebar.error("Thread name already exists!")
@@ -70,22 +63,23 @@ if selected_thread == "➕ New Thread":
 # Handle thread switching
 if selected_thread != "➕ New Thread" and st.session_state.current_thread != selected_thread:
     st.session_state.current_thread = selected_thread
-    st.session_state.messages = st.session_state.all_threads.get(selected_thread, [])
+    st.session_state.messages = chat_store.load_messages(selected_thread)
     # When switching threads, you might want to reset the remembered_title
     # or load it from the thread history if you store it there.
     # For now, let's keep it simple: assume each thread can imply a different book,
     # so we might reset it or allow the first query to set it.
     # If each thread should remember its book, you'd need to save `remembered_title`
-    # within `all_threads[thread_name]` data structure.
+    # with the thread in the chat store.
     # For simplicity, let's reset it for now.
     st.session_state.remembered_title = None # Reset remembered_title on thread switch
     st.rerun() # Rerun to load messages and potentially the remembered_title
 
-def save_chat_history():
+def add_message(role, content):
+    """Shows a message in the current thread and appends it (alone) to the chat store."""
+    message = {"role": role, "content": content}
     if st.session_state.current_thread and st.session_state.current_thread != "➕ New Thread":
-        st.session_state.all_threads[st.session_state.current_thread] = st.session_state.messages
-        with open(CHAT_HISTORY_FILE, "w") as f:
-            json.dump(st.session_state.all_threads, f)
+        message["id"] = chat_store.append_message(st.session_state.current_thread, role, content)
+    st.session_state.messages.append(message)
 
 # Display title
 current_display_name = st.session_state.current_thread if st.session_state.current_thread else "New Story"
@@ -103,7 +97,11 @@ if not st.session_state.remembered_title:
     if book_search_query:
         # Perform search and store in session state
         # Limiting to top 5 as per your requirement
-        st.session_state.last_search_results = GutenbergAPI.search_books({"title": book_search_query})[:5] 
+        try:
+            st.session_state.last_search_results = backend.search_books(book_search_query)[:5]
+        except BackendError as e:
+            st.error(f"Book search failed: {e}")
+            st.session_state.last_search_results = []
 
         if st.session_state.last_search_results:
             st.subheader("Search Results (Top 5):")
@@ -136,7 +134,11 @@ if not st.session_state.remembered_title:
                 selected_book_info = st.session_state.last_search_results[selected_book_idx]
                 
                 with st.spinner(f"Making '{selected_book_info['title']}' available..."):
-                    verified_title = ensure_book_available_and_ingested(selected_book_info)
+                    try:
+                        verified_title = backend.select_book(selected_book_info)
+                    except BackendError as e:
+                        st.error(f"Book assistant backend error: {e}")
+                        verified_title = None
                     if verified_title:
                         st.session_state.remembered_title = verified_title
                         st.success(f"Successfully loaded '{verified_title}'!")
@@ -155,7 +157,15 @@ elif st.session_state.remembered_title:
     st.info(f"Currently discussing: **{st.session_state.remembered_title}**")
 
 
-# Display chat history
+# Display chat history; older messages are loaded a page at a time
+first_message_id = st.session_state.messages[0].get("id") if st.session_state.messages else None
+if (st.session_state.current_thread and first_message_id is not None
+        and chat_store.has_messages_before(st.session_state.current_thread, first_message_id)):
+    if st.button("⬆️ Load earlier messages", key="load_earlier"):
+        earlier = chat_store.load_messages(st.session_state.current_thread, MESSAGES_PAGE_SIZE, before_id=first_message_id)
+        st.session_state.messages = earlier + st.session_state.messages
+        st.rerun()
+
 chat_placeholder = st.container()
 with chat_placeholder:
     for msg in st.session_state.messages:
@@ -185,28 +195,26 @@ if user_input:
     elif not st.session_state.remembered_title: # Check if a book is selected
         st.error("Please select a book first using the search bar above!")
     else:
-        st.session_state.messages.append({"role": "user", "content": user_input})
-        save_chat_history()
+        add_message("user", user_input)
 
         with chat_placeholder:
             with st.chat_message("user"):
                 st.write(user_input)
             with st.chat_message("assistant"):
-                with st.spinner("Thinking..."): # Add a spinner while processing
-                    try:
-                        # Call your orchestrator backend
-                        response_text, new_remembered_title = orchestrate_request(user_input, st.session_state.remembered_title)
-                        
-                        # Update remembered_title in session state
-                        st.session_state.remembered_title = new_remembered_title
-
-                        st.write(response_text)
-                        st.session_state.messages.append({"role": "assistant", "content": response_text})
-                        save_chat_history()
-                    except Exception as e:
-                        st.error(f"An error occurred: {e}")
-                        import traceback
-                        st.error(traceback.format_exc()) # Show full traceback in UI for debugging
+                try:
+                    with st.spinner("Thinking..."): # Spinner while parsing and retrieving; tokens stream in afterwards
+                        # Call the backend service
+                        response_stream, new_remembered_title = backend.ask_stream(user_input, st.session_state.remembered_title)
+
+                    # Update remembered_title in session state
+                    st.session_state.remembered_title = new_remembered_title
+
+                    response_text = st.write_stream(response_stream)
+                    add_message("assistant", response_text)
+                except Exception as e:
+                    st.error(f"An error occurred: {e}")
+                    import traceback
+                    st.error(traceback.format_exc()) # Show full traceback in UI for debugging
         st.rerun() # Rerun to clear chat input and update display
 
 
@@ -220,43 +228,38 @@ elif uploaded_file:
     else:
         file_content = uploaded_file.read().decode("utf-8")
         truncated_content = file_content[:500] # For display in chat
-        st.session_state.messages.append({"role": "user", "content": f"Uploaded file (first 500 chars): {truncated_content}"})
-        save_chat_history()
+        add_message("user", f"Uploaded file (first 500 chars): {truncated_content}")
 
         with chat_placeholder:
             with st.chat_message("user"):
                 st.write(f"(from file) {truncated_content}{'...' if len(file_content) > 500 else ''}")
             with st.chat_message("assistant"):
-                with st.spinner("Processing file..."): # Add a spinner
-                    try:
+                try:
+                    with st.spinner("Processing file..."): # Spinner while parsing and retrieving; tokens stream in afterwards
                         # For file uploads, you need to decide how your backend handles it.
                         # If the backend is designed to *ingest* a new book from a file,
                         # you'd need a specific orchestrator function for that, or modify orchestrate_request
                         # to detect file upload intent.
                         # For now, let's treat the file content as a long user input/query.
                         # This might hit LLM context limits if the file is very large.
-                        response_text, new_remembered_title = orchestrate_request(file_content, st.session_state.remembered_title)
+                        response_stream, new_remembered_title = backend.ask_stream(file_content, st.session_state.remembered_title)
 
-                        st.session_state.remembered_title = new_remembered_title
+                    st.session_state.remembered_title = new_remembered_title
 
-                        st.write(response_text)
-                        st.session_state.messages.append({"role": "assistant", "content": response_text})
-                        save_chat_history()
-                    except Exception as e:
-                        st.error(f"An error occurred processing file: {e}")
-                        import traceback
-                        st.error(traceback.format_exc()) # Show full traceback in UI for debugging
+                    response_text = st.write_stream(response_stream)
+                    add_message("assistant", response_text)
+                except Exception as e:
+                    st.error(f"An error occurred processing file: {e}")
+                    import traceback
+                    st.error(traceback.format_exc()) # Show full traceback in UI for debugging
         st.rerun() # Rerun to clear file uploader state and update display
 
 
 # Add delete thread functionality
 if st.session_state.current_thread and st.session_state.current_thread != "➕ New Thread":
     if st.sidebar.button("🗑️ Delete Current Thread"):
-        if st.session_state.current_thread in st.session_state.all_threads:
-            del st.session_state.all_threads[st.session_state.current_thread]
-            with open(CHAT_HISTORY_FILE, "w") as f:
-                json.dump(st.session_state.all_threads, f)
-            st.session_state.current_thread = None
-            st.session_state.messages = []
-            st.session_state.remembered_title = None # Reset book on thread delete
-            st.rerun()
\ No newline at end of file
+        chat_store.delete_thread(st.session_state.current_thread)
+        st.session_state.current_thread = None
+        st.session_state.messages = []
+        st.session_state.remembered_title = None # Reset book on thread delete
+        st.rerun()
\ No newline at end of file
@@ -0,0 +1,124 @@
+# tests/test_http_cache.py
+#
+# The HTTP cache against a local stand-in for gutenberg.org that serves ETags
+# and 304s and counts the requests it receives.
+
+import gzip
+import http.server
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from mcp_agents.http_cache import HttpCache
+
+BOOK = b"*** START OF THE PROJECT GUTENBERG EBOOK ***\nIt was a dark and stormy night.\n" * 200
+ETAG = '"v1"'
+
+class StandIn(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.lock = threading.Lock()
+        self.counts = {"200": 0, "304": 0}
+        self.active = 0
+        self.max_active = 0
+        self.delay = 0.0
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.delay)
+            if self.headers.get("If-None-Match") == ETAG:
+                with server.lock:
+                    server.counts["304"] += 1
+                self.send_response(304)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            with server.lock:
+                server.counts["200"] += 1
+            body = BOOK + self.path.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("ETag", ETAG)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+@pytest.fixture
+def server():
+    server = StandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def _url(server, path="/files/1/1-0.txt"):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+def test_fresh_copy_is_served_without_a_request(server, tmp_path):
+    cache = HttpCache(requests.Session(), str(tmp_path))
+    first = cache.get(_url(server), max_age=60)
+    second = cache.get(_url(server), max_age=60)
+    assert not first.from_cache and second.from_cache
+    assert second.content == first.content
+    assert server.counts == {"200": 1, "304": 0}
+
+def test_stale_copy_is_revalidated(server, tmp_path):
+    cache = HttpCache(requests.Session(), str(tmp_path))
+    cache.get(_url(server), max_age=0)
+    revalidated = cache.get(_url(server), max_age=0)
+    assert revalidated.from_cache and revalidated.status_code == 200
+    assert revalidated.content.startswith(BOOK)
+    assert server.counts == {"200": 1, "304": 1}
+    assert cache.stats()["revalidated"] == 1
+
+def test_concurrent_fetches_of_one_url(server, tmp_path):
+    cache = HttpCache(requests.Session(), str(tmp_path))
+    url = _url(server, "/ebooks/search/?query=dracula")
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(lambda _: cache.get(url), range(16)))
+    assert all(r.status_code == 200 and r.content == BOOK + b"/ebooks/search/?query=dracula" for r in responses)
+    assert not list(tmp_path.glob("*.tmp"))
+    assert cache.get(url, max_age=60).from_cache
+
+def test_body_of_another_response_is_not_served(server, tmp_path):
+    cache = HttpCache(requests.Session(), str(tmp_path))
+    cache.get(_url(server), max_age=60)
+    (body_path,) = tmp_path.glob("*.gz")
+    body_path.write_bytes(gzip.compress(b"some other response"))
+    response = cache.get(_url(server), max_age=60)
+    assert not response.from_cache and response.content.startswith(BOOK)
+    assert server.counts["200"] == 2
+
+def test_failed_cache_write_keeps_the_response(server, tmp_path):
+    blocker = tmp_path / "not_a_directory"
+    blocker.write_text("")
+    cache = HttpCache(requests.Session(), str(blocker / "cache"))
+    response = cache.get(_url(server), max_age=60)
+    assert response.status_code == 200 and response.content.startswith(BOOK)
+
+def test_connections_per_host_are_limited(server, tmp_path):
+    server.delay = 0.05
+    cache = HttpCache(requests.Session(), str(tmp_path), max_connections_per_host=2)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: cache.get(_url(server, f"/files/{i}/{i}-0.txt")), range(8)))
+    assert server.counts["200"] == 8
+    assert server.max_active <= 2
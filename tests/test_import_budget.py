@@ -0,0 +1,40 @@
+# tests/test_import_budget.py
+#
+# `import mcp_hub` must stay cheap: the models are loaded lazily, so importing
+# the hub may not pull in torch, sentence-transformers, llama.cpp or ChromaDB.
+
+import json
+import os
+import subprocess
+import sys
+
+from benchmark import IMPORT_RSS_BUDGET_MB, IMPORT_TIME_BUDGET_SECONDS, ROOT
+
+HEAVY_MODULES = ("torch", "sentence_transformers", "llama_cpp", "chromadb", "transformers")
+
+PROBE = f"""
+import json, resource, sys, time
+start = time.perf_counter()
+import mcp_hub
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_mb": rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024,
+    "heavy_modules": [name for name in {HEAVY_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+def _import_mcp_hub(tmp_path) -> dict:
+    env = dict(os.environ, BOOKS_DATA_DIR=str(tmp_path))
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True, timeout=60)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+def test_import_mcp_hub_within_budget(tmp_path):
+    result = _import_mcp_hub(tmp_path)
+    assert result["seconds"] <= IMPORT_TIME_BUDGET_SECONDS, result
+    assert result["rss_mb"] <= IMPORT_RSS_BUDGET_MB, result
+
+def test_import_mcp_hub_loads_no_models(tmp_path):
+    assert _import_mcp_hub(tmp_path)["heavy_modules"] == []